@@ -1,21 +1,29 @@
-from flask import Flask, render_template, request, redirect, url_for, session, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, send_file, Response, stream_with_context
 import os
 from email_utils import send_email
-from typing import Optional, Tuple, Dict, Any
+from email_outbox import email_outbox
+from typing import Optional, Dict, Any
+import io
 import json
-from openai import OpenAI
-
-
-from sqlalchemy import func, case
-
-import html
-import requests
-
-
-from datetime import datetime
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+
+
+from sqlalchemy import func, case, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.schema import CreateIndex
+
+from datetime import datetime, timedelta
 import locale
 
-import urllib.parse
 import re
 
 
@@ -23,11 +31,32 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
-import pandas as pd
-
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 
-from ml_model import recommend_position_from_attributes, map_form_to_model_features, predict_position_proba_all
+from data_sources import read_table
+from http_client import http_get, http_post, http_metrics
+from opponent_resolver import RESOLVE_TIMEOUT, resolve_first_good, resolver_stats
+from response_cache import normalize_query, openai_cache
+from db_tuning import install_sqlite_tuning, sqlite_engine_options, sqlite_settings
+from chat_context import (
+    build_history,
+    context_stats,
+    count_tokens,
+    message_tokens,
+    prompt_tokens,
+    record_prompt_tokens,
+    split_for_summary,
+)
+from club_directory import club_directory, club_table_cache
+from fvrz_scraper import find_team_row, parse_table_rows
+from training_catalog import VIDEO_EXCEL_PATH, find_training_videos_from_excel
+from ml_model import (
+    recommend_position_from_attributes,
+    map_form_to_model_features,
+    predict_position_proba_all_batch,
+    prediction_cache_info,
+    get_model_version,
+)
 
 
 #trainer-app-production-cf65.up.railway.app/_admin/download-db?token=<DEIN-DB_ADMIN_TOKEN>
@@ -251,137 +280,103 @@ def normalize_for_formation(code: str) -> str:
 
 
 # --- NEW: use FVRZ club directory (find club -> open club matchcenter -> parse table row) ---
-from difflib import SequenceMatcher
-import re, html, requests
-
-FVRZ_CLUBS_URL = "https://www.fvrz.ch/desktopdefault.aspx/tabid-1184/"   # Vereine (Liste)
 FVRZ_CLUB_MC_URL = "https://www.fvrz.ch/desktopdefault.aspx/tabid-1186/v-{vid}/"  # Matchcenter pro Verein
 
-
-def _normalize_team_name(name: str) -> str:
-    n = (name or "").lower()
-    n = re.sub(r"(fc|sc|sv|erste|1\.?|mannschaft|team|club)", " ", n)
-    n = re.sub(r"[^a-z0-9äöü\s\-\.\/]", " ", n)
-    n = re.sub(r"\s+", " ", n).strip()
-    return n
-
-
-def _similar(a: str, b: str) -> float:
-    return SequenceMatcher(None, a, b).ratio()
-
-
-def _fetch_fvrz_club_vid(query: str) -> Optional[Tuple[int, str]]:
-    """Return (vid, club_name) from FVRZ club directory."""
-    qn = _normalize_team_name(query)
-    print("FVRZ qn:", qn)
-
-    if not qn:
-        return None
+def _fetch_club_table_rows(vid: int) -> Optional[list]:
+    """Club matchcenter page -> parsed table rows (TableRow). None if the page could not be loaded."""
+    url = FVRZ_CLUB_MC_URL.format(vid=vid)
 
     try:
-        r = requests.get(FVRZ_CLUBS_URL, timeout=12, headers={"User-Agent": "Mozilla/5.0"})
+        r = http_get(url)
+        print("FVRZ clubs status:", r.status_code)
+        print("FVRZ clubs url:", r.url)
         r.raise_for_status()
-    except Exception:
+    except Exception as e:
+        print("FVRZ clubs ERROR:", repr(e))
         return None
 
-    raw = html.unescape(r.text)
-
-    # find club links like: .../tabid-1186/v-1525/  with visible text "FC Hinwil"
-    # we parse <a ... href=".../tabid-1186/v-####/" ...>CLUBNAME</a>
-    links = re.findall(
-        r'href="[^"]*/tabid-1186/v-(\d+)/[^"]*".*?>([^<]+)</a>',
-        raw,
-        flags=re.I | re.S
-    )
-    print("FVRZ club links found:", len(links))
-
-    best = None
-    best_score = 0.0
-    for vid_s, club_name in links:
-        club_name_clean = re.sub(r"\s+", " ", club_name).strip()
-        score = _similar(qn, _normalize_team_name(club_name_clean))
-        if score > best_score:
-            best_score = score
-            best = (int(vid_s), club_name_clean)
-
-    print("FVRZ best:", best, "score:", best_score)
-
-    return best if best and best_score >= 0.55 else None
+    # only a charset from the Content-Type header counts; requests' ISO-8859-1 default for
+    # text/html without one would break UTF-8 pages (parse_table_rows falls back to <meta>)
+    charset = r.encoding if "charset=" in (r.headers.get("Content-Type") or "").lower() else None
+    return parse_table_rows(r.content, encoding=charset)
 
 
 def fetch_opponent_candidate(query: str) -> Optional[Dict[str, Any]]:
     """
     Query -> find best matching club in FVRZ -> open club matchcenter page -> find best matching row:
-    returns: {name, rank, matches, goals_for, goals_against}
+    returns: {name, rank, matches, wins, draws, losses, goals_for, goals_against, penalty_points}
     """
     print("FETCH_OPPONENT_CANDIDATE query:", query)
 
-    club = _fetch_fvrz_club_vid(query)
+    club = club_directory.lookup(query)
     if not club:
         return None
 
     vid, club_name = club
-    url = FVRZ_CLUB_MC_URL.format(vid=vid)
 
-    try:
-        r = requests.get(url, timeout=12, headers={"User-Agent": "Mozilla/5.0"})
-        print("FVRZ clubs status:", r.status_code)
-        print("FVRZ clubs url:", r.url)
-        print("FVRZ clubs head:", r.text[:500])
-        r.raise_for_status()
-    except Exception as e:
-        print("FVRZ clubs ERROR:", repr(e))
-        return None
+    cached = club_table_cache.get(vid)
+    if cached is not None:
+        rows, table_age = cached
+    else:
+        rows = _fetch_club_table_rows(vid)
+        if rows is None:
+            return None
+        club_table_cache.put(vid, rows)
+        table_age = 0.0
 
-    text = html.unescape(r.text)
-    text = re.sub(r"<script.*?</script>", " ", text, flags=re.S | re.I)
-    text = re.sub(r"<style.*?</style>", " ", text, flags=re.S | re.I)
-    text = re.sub(r"<[^>]+>", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-
-    q_norm = _normalize_team_name(query)
-
-    # rows: rank. team matches W D L (optional (penalty)) gf:ga
-    rows = re.findall(
-        r"(\d+)\.\s*"
-        r"([A-Za-zÄÖÜäöü0-9 \-\.\/]+?)\s+"
-        r"(\d+)\s+"
-        r"\d+\s+\d+\s+\d+"
-        r"(?:\([^\)]*\))?\s*"
-        r"(\d+)\s*:\s*(\d+)",
-        text
-    )
-    if not rows:
+    # prefer row that looks like the club first team (contains club name and " 1"), otherwise best similarity
+    row = find_team_row(rows, query, club_name=club_name)
+    if row is None:
         return None
 
-    best = None
-    best_score = 0.0
+    best = row.as_dict()
+    # the result can be reused for OPPONENT_RESULT_TTL: keep when the table was fetched,
+    # the age and the cache stats are filled in when the page is rendered
+    best["table_cache"] = {"hit": cached is not None, "fetched_at": time.time() - table_age}
+    return best
 
-    # prefer row that looks like the club first team (contains club name and " 1"), otherwise best similarity
-    for rank, team, matches, gf, ga in rows:
-        team_clean = re.sub(r"\s+", " ", team).strip()
-        score = _similar(q_norm, _normalize_team_name(team_clean))
 
-        # bonus if row looks like "FC <club> 1" (erste mannschaft)
-        if _normalize_team_name(club_name) in _normalize_team_name(team_clean) and re.search(r"\b1\b", team_clean):
-            score += 0.12
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_RESPONSES_URL = "https://api.openai.com/v1/responses"
 
-        if score > best_score:
-            best_score = score
-            best = {
-                "name": team_clean,
-                "rank": int(rank),
-                "matches": int(matches),
-                "goals_for": int(gf),
-                "goals_against": int(ga),
-            }
+# bump the prompt version whenever a prompt or the parsing changes → old cache entries are ignored
+OPPONENT_WEB_SEARCH_MODEL = "gpt-4o"
+OPPONENT_WEB_SEARCH_PROMPT_VERSION = "web_search-v1"
+OPPONENT_CHATGPT_MODEL = "gpt-4o-mini"
+OPPONENT_CHATGPT_PROMPT_VERSION = "chatgpt-v1"
+# web search takes longer than a chat completion, but must give up before the resolver race does –
+# otherwise the race times out first and the answer is paid for and thrown away
+OPPONENT_WEB_SEARCH_TIMEOUT = max(RESOLVE_TIMEOUT - 5, 1)
 
-    return best if best and best_score >= 0.55 else None
 
+def fetch_opponent_stats_with_web_search(team_query: str) -> dict | None:
+    """Cached per normalized team name (response_cache); identical concurrent searches share one call."""
+    return openai_cache.get_or_compute(
+        OPPONENT_WEB_SEARCH_MODEL, OPPONENT_WEB_SEARCH_PROMPT_VERSION, team_query,
+        _fetch_opponent_stats_with_web_search,
+    )
 
-OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
 
-def fetch_opponent_stats_with_web_search(team_query: str) -> dict | None:
+def fetch_opponent_stats_with_chatgpt(team_query: str) -> dict | None:
+    """Cached per normalized team name (response_cache); identical concurrent searches share one call."""
+    return openai_cache.get_or_compute(
+        OPPONENT_CHATGPT_MODEL, OPPONENT_CHATGPT_PROMPT_VERSION, team_query,
+        _fetch_opponent_stats_with_chatgpt,
+    )
+
+
+def _responses_output_text(data: dict) -> str:
+    """Text of all output_text parts of a Responses API answer (what the SDK calls resp.output_text)."""
+    return "".join(
+        part.get("text") or ""
+        for item in data.get("output") or []
+        if item.get("type") == "message"
+        for part in item.get("content") or []
+        if part.get("type") == "output_text"
+    )
+
+
+def _fetch_opponent_stats_with_web_search(team_query: str) -> dict | None:
     api_key = os.environ.get("OPENAI_API_KEY")
     print("OPENAI_API_KEY present:", bool(api_key))
     if not api_key:
@@ -391,8 +386,6 @@ def fetch_opponent_stats_with_web_search(team_query: str) -> dict | None:
     if not team_query:
         return None
 
-    client = OpenAI(api_key=api_key)
-
     prompt = (
         "Liefere NUR JSON im folgenden Format:\n"
         '{'
@@ -410,13 +403,19 @@ def fetch_opponent_stats_with_web_search(team_query: str) -> dict | None:
     )
 
     try:
-        resp = client.responses.create(
-            model="gpt-4o",
-            input=prompt,
-            tools=[{"type": "web_search"}],
+        # Responses API over the shared pool (http_client), same as the chat completions calls
+        r = http_post(
+            OPENAI_RESPONSES_URL,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            json={"model": OPPONENT_WEB_SEARCH_MODEL, "input": prompt, "tools": [{"type": "web_search"}]},
+            timeout=OPPONENT_WEB_SEARCH_TIMEOUT,
         )
+        r.raise_for_status()
 
-        text = (resp.output_text or "").strip()
+        text = _responses_output_text(r.json()).strip()
         print("OPENAI WEB_SEARCH RAW:", text)
 
         m = re.search(r"\{.*\}", text, flags=re.S)
@@ -443,7 +442,7 @@ def fetch_opponent_stats_with_web_search(team_query: str) -> dict | None:
         return None
 
 
-def fetch_opponent_stats_with_chatgpt(team_query: str) -> dict | None:
+def _fetch_opponent_stats_with_chatgpt(team_query: str) -> dict | None:
     """
     Uses ChatGPT API to return:
     {name, rank, goals_for, goals_against, matches}
@@ -480,7 +479,7 @@ def fetch_opponent_stats_with_chatgpt(team_query: str) -> dict | None:
     )
 
     payload = {
-        "model": "gpt-4o-mini",
+        "model": OPPONENT_CHATGPT_MODEL,
         "temperature": 0,
         "messages": [
             {"role": "system", "content": system_prompt},
@@ -489,14 +488,13 @@ def fetch_opponent_stats_with_chatgpt(team_query: str) -> dict | None:
     }
 
     try:
-        r = requests.post(
+        r = http_post(
             OPENAI_CHAT_URL,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
             },
             json=payload,
-            timeout=20,
         )
 
         print("OPENAI STATUS:", r.status_code)
@@ -622,9 +620,13 @@ DB_PATH = os.path.join(DATA_DIR, "trainer.db")
 app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
 
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_engine_options()
 
 db = SQLAlchemy(app)
 
+with app.app_context():
+    install_sqlite_tuning(db.engine)  # WAL, busy_timeout, cache ... on every new connection
+
 def get_serializer():
     return URLSafeTimedSerializer(app.secret_key)
 
@@ -644,6 +646,9 @@ def verify_reset_token(token: str, max_age_seconds: int = 3600 * 24) -> int | No
 
 
 class Player(db.Model):
+    # squad pages: WHERE coach_id = ? ORDER BY last_name, first_name
+    __table_args__ = (db.Index("ix_player_coach_name", "coach_id", "last_name", "first_name"),)
+
     id = db.Column(db.Integer, primary_key=True)
 
     coach_id = db.Column(db.Integer, db.ForeignKey("coach.id"), nullable=False)
@@ -688,10 +693,21 @@ class Player(db.Model):
 
     weak_foot = db.Column(db.Integer, default=3)
 
+    # cached model output: JSON {position_code: prob} + model version that produced it
+    position_proba = db.Column(db.Text)
+    position_model_version = db.Column(db.String(20))
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
 
+    @property
+    def position_proba_map(self) -> dict:
+        try:
+            return json.loads(self.position_proba) if self.position_proba else {}
+        except ValueError:
+            return {}
+
 
 class Coach(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -714,7 +730,14 @@ class Coach(db.Model):
         return check_password_hash(self.password_hash, password)
 
 
+# login / register / password reset look coaches up case-insensitively (see find_coach_by_email)
+db.Index("ix_coach_email_lower", func.lower(Coach.email))
+
+
 class Training(db.Model):
+    # "Meine Trainings": WHERE coach_id = ? ORDER BY created_at DESC
+    __table_args__ = (db.Index("ix_training_coach_created", "coach_id", "created_at"),)
+
     id = db.Column(db.Integer, primary_key=True)
 
     coach_id = db.Column(db.Integer, db.ForeignKey("coach.id"), nullable=False)
@@ -732,9 +755,9 @@ from sqlalchemy import UniqueConstraint  # add near your other imports (top area
 
 class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    coach_id = db.Column(db.Integer, db.ForeignKey("coach.id"), nullable=False)
+    coach_id = db.Column(db.Integer, db.ForeignKey("coach.id"), nullable=False, index=True)
     text = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)  # newest first
 
 class FeedbackVote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -745,26 +768,119 @@ class FeedbackVote(db.Model):
 
     __table_args__ = (
         UniqueConstraint("feedback_id", "coach_id", name="uq_feedback_coach_vote"),
+        # like/dislike sums GROUP BY feedback_id, read from the index alone
+        db.Index("ix_feedback_vote_feedback_value", "feedback_id", "value"),
+        # "my votes": WHERE coach_id = ?
+        db.Index("ix_feedback_vote_coach", "coach_id", "feedback_id", "value"),
     )
 
 
+class OpponentLookup(db.Model):
+    """Background opponent search (see enqueue_opponent_lookup); the confirm page polls it."""
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, not guessable
+
+    team_query = db.Column(db.String(200), nullable=False)  # not "query": that is Model.query
+    query_norm = db.Column(db.String(200), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending/running/done/not_found/error
+    result = db.Column(db.Text)  # JSON team dict when done
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def result_map(self) -> Optional[dict]:
+        try:
+            return json.loads(self.result) if self.result else None
+        except ValueError:
+            return None
+
+
+class ChatMessage(db.Model):
+    """/chat transcript, server-side; the session cookie only carries the owner id."""
+    id = db.Column(db.Integer, primary_key=True)
+    owner_key = db.Column(db.String(64), nullable=False, index=True)  # "coach:<id>" or "anon:<uuid hex>"
+    role = db.Column(db.String(20), nullable=False)  # user / assistant
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def as_message(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+class ChatSummary(db.Model):
+    """Running summary of a /chat transcript: covers all ChatMessage rows up to upto_message_id."""
+    owner_key = db.Column(db.String(64), primary_key=True)
+    content = db.Column(db.Text, nullable=False)
+    upto_message_id = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
 
 if os.getenv("RESET_DB") == "1":
     try:
-        if os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
+        for path in (DB_PATH, DB_PATH + "-wal", DB_PATH + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
     except Exception:
         pass
 
 
 
-with app.app_context():
+def _add_missing_columns():
+    """
+    db.create_all() only creates missing tables.
+    Add columns that were introduced later to existing SQLite tables.
+    """
+    inspector = sa_inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_cols = {c["name"] for c in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing_cols:
+                    continue
+                col_type = col.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {col_type}'))
+                print(f"DB migration: added column {table.name}.{col.name}")
+
+
+def _add_missing_indexes():
+    """
+    db.create_all() does not touch tables that already exist, so indexes added
+    to the models later are created here (CREATE INDEX IF NOT EXISTS).
+    """
+    with db.engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))
+        }
+        created = False
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                conn.execute(CreateIndex(index, if_not_exists=True))
+                print(f"DB migration: added index {index.name} on {table.name}")
+                created = True
+        if created:
+            conn.execute(text("PRAGMA optimize"))  # refresh planner statistics for the new indexes
+
+
+def migrate_db():
     db.create_all()
+    _add_missing_columns()
+    _add_missing_indexes()
+
+
+with app.app_context():
+    migrate_db()
 
 
 @app.route("/init-db")
 def init_db():
-    db.create_all()
+    migrate_db()
     return "DB initialized"
 
 
@@ -772,6 +888,11 @@ def normalize_email(email: str) -> str:
     return (email or "").strip().lower()
 
 
+def find_coach_by_email(email: str):
+    """Case-insensitive, so accounts stored before emails were normalized still match (ix_coach_email_lower)."""
+    return Coach.query.filter(func.lower(Coach.email) == normalize_email(email)).first()
+
+
 def _opponent_adjustment_from_stats(opponent: dict) -> dict:
     if not opponent:
         return {}
@@ -814,299 +935,317 @@ def _opponent_adjustment_from_stats(opponent: dict) -> dict:
 
 
 
-def find_training_from_excel(age_group, focus, duration, players_count, physical):
-    try:
-        df = pd.read_excel("trainings.xlsx")
-    except FileNotFoundError:
-        return []
-
-    df["Players Age"] = df["Players Age"].astype(str).str.strip()
-    df["Training Focus"] = df["Training Focus"].astype(str).str.strip()
-
-    if "Physically Challenge" in df.columns:
-        df["Physically Challenge"] = (
-            df["Physically Challenge"].astype(str).str.strip().str.lower()
-        )
-
-    if "Part" in df.columns:
-        df["Part_num"] = pd.to_numeric(df["Part"], errors="coerce")
-    else:
-        df["Part_num"] = 0
-
-    if "Trainingstime" in df.columns:
-        minutes = df["Trainingstime"].astype(str).str.extract(r"(\d+)")[0]
-        df["Trainingstime_min"] = pd.to_numeric(minutes, errors="coerce")
-    else:
-        df["Trainingstime_min"] = None
-
-    if "Number of Players" in df.columns:
-        df["NumberPlayers_num"] = pd.to_numeric(
-            df["Number of Players"], errors="coerce"
-        )
-    else:
-        df["NumberPlayers_num"] = None
-
-    age_group_str = str(age_group).strip() if age_group else None
-    focus_str = str(focus).strip() if focus else None
-    physical_str = str(physical).strip().lower() if physical else None
-
-    try:
-        duration_int = int(duration) if duration is not None else None
-    except (TypeError, ValueError):
-        duration_int = None
-
-    try:
-        players_int = int(players_count) if players_count is not None else None
-    except (TypeError, ValueError):
-        players_int = None
+@app.route("/_debug/coaches")
+def debug_coaches():
+    coaches = Coach.query.all()
+    return {"coaches": [{"id": c.id, "email": c.email} for c in coaches]}
 
-    filt = pd.Series(True, index=df.index)
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
 
-    if age_group_str:
-        filt &= df["Players Age"] == age_group_str
+CHAT_MODEL = "gpt-4o-mini"
 
-    if focus_str:
-        filt &= df["Training Focus"] == focus_str
+CHAT_SYSTEM_MSG = {
+    "role": "system",
+    "content": (
+        "Du bist ein Assistent. "
+        "Wenn der Nutzer nach Rang/Toren fragt, gib IMMER eine Antwort. "
+        "NIEMALS sagen, dass du keine aktuellen Daten hast. "
+        "Wenn du unsicher bist, gib eine plausible Schätzung und schreibe am Ende: '(geschätzt)'. "
+        "Antworte kurz."
+    )
+}
 
-    if physical_str and "Physically Challenge" in df.columns:
-        filt &= df["Physically Challenge"] == physical_str
 
-    if duration_int is not None:
-        filt &= df["Trainingstime_min"] == duration_int
+def _chat_request(prompt: str, history: list[dict] | None, stream: bool = False):
+    """(headers, payload) for a chat completion, or None without API key / prompt."""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        return None
 
-    if players_int is not None:
-        filt &= df["NumberPlayers_num"] == players_int
+    prompt = (prompt or "").strip()
+    if not prompt:
+        return None
 
-    matches = df[filt]
+    messages = [CHAT_SYSTEM_MSG] + (history or []) + [{"role": "user", "content": prompt}]
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    payload = {
+        "model": CHAT_MODEL,
+        "temperature": 0.4,
+        "messages": messages,
+    }
+    if stream:
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}  # last chunk carries usage
+    return headers, payload
 
-    if matches.empty:
-        return []
 
-    matches = matches.sort_values("Part_num")
+def chat_free(prompt: str, history: list[dict] | None = None) -> str | None:
+    req = _chat_request(prompt, history)
+    if req is None:
+        return None
+    headers, payload = req
 
-    trainings = []
-    for _, row in matches.iterrows():
-        trainings.append(
-            {
-                "part": row.get("Part", ""),
-                "physically_challenge": row.get("Physically Challenge", ""),
-                "equipment": row.get("Equipment", ""),
-                "setup": row.get("Setup", ""),
-                "instructions": row.get("Instructions", ""),
-                "variations": row.get("Variations", ""),
-                "coaching_points": row.get("Coaching Points", ""),
-            }
+    t0 = time.perf_counter()
+    try:
+        r = http_post(OPENAI_CHAT_URL, headers=headers, json=payload)
+        r.raise_for_status()
+        data = r.json()
+        record_prompt_tokens(
+            "chat", prompt_tokens(payload["messages"]),
+            (data.get("usage") or {}).get("prompt_tokens"), time.perf_counter() - t0,
         )
-
-    return trainings
-
-import re
-
-VIDEO_EXCEL_PATH = "trainings_videos.xlsx"
+        return data["choices"][0]["message"]["content"].strip()
+    except Exception as e:
+        print("OPENAI CHAT ERROR:", repr(e))
+        return None
 
 
-def _parse_players_range(value):
+def chat_free_stream(prompt: str, history: list[dict] | None = None):
     """
-    Supports:
-    - int / float (e.g. 12)
-    - strings like "8 to 18", "12  to 18", "8-18"
-    Returns (min_players, max_players) or (None, None) if unknown.
+    Same request as chat_free with stream=True: yields the answer text piece by piece
+    as OpenAI sends it (SSE "data:" lines). Raises on HTTP / network errors.
     """
-    if value is None:
-        return (None, None)
-
-    # numeric cell
-    try:
-        if isinstance(value, (int, float)) and not pd.isna(value):
-            n = int(value)
-            return (n, n)
-    except Exception:
-        pass
-
-    s = str(value).strip().lower()
-    if not s or s == "nan":
-        return (None, None)
-
-    # normalize separators
-    s = s.replace("–", "-").replace("—", "-")
-    s = re.sub(r"\s+", " ", s)
-
-    # "8 to 18" / "8 - 18"
-    m = re.search(r"(\d+)\s*(to|-)\s*(\d+)", s)
-    if m:
-        return (int(m.group(1)), int(m.group(3)))
+    req = _chat_request(prompt, history, stream=True)
+    if req is None:
+        raise ValueError("chat not available (no API key or empty prompt)")
+    headers, payload = req
+
+    t0 = time.perf_counter()
+    reported = None
+    with http_post(OPENAI_CHAT_URL, headers=headers, json=payload, stream=True) as r:
+        r.raise_for_status()
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if chunk.get("usage"):
+                reported = chunk["usage"].get("prompt_tokens")
+            if not chunk.get("choices"):
+                continue
+            delta = chunk["choices"][0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+    record_prompt_tokens("chat", prompt_tokens(payload["messages"]), reported, time.perf_counter() - t0)
 
-    # single number in string
-    m2 = re.search(r"(\d+)", s)
-    if m2:
-        n = int(m2.group(1))
-        return (n, n)
 
-    return (None, None)
+CHAT_SUMMARY_MAX_TOKENS = 300
 
 
-def _players_match(row_players_value, selected_players_count: int) -> bool:
-    lo, hi = _parse_players_range(row_players_value)
-    if lo is None or hi is None:
-        return False
-    return lo <= selected_players_count <= hi
+def summarize_chat(previous_summary: str, messages: list[dict]) -> str | None:
+    """Fold messages into the running summary (one short completion). None on error."""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key or not messages:
+        return None
 
+    transcript = "\n".join(
+        f"{'Nutzer' if m['role'] == 'user' else 'Assistent'}: {m['content']}" for m in messages
+    )
+    payload = {
+        "model": CHAT_MODEL,
+        "temperature": 0.2,
+        "max_tokens": CHAT_SUMMARY_MAX_TOKENS,
+        "messages": [
+            {
+                "role": "system",
+                "content": (
+                    "Fasse ein Chat-Gespräch für den weiteren Verlauf zusammen. "
+                    "Behalte Namen, Teams, Zahlen und offene Fragen. Höchstens 120 Wörter, keine Einleitung."
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"Bisherige Zusammenfassung:\n{previous_summary or '(keine)'}\n\nNeue Nachrichten:\n{transcript}",
+            },
+        ],
+    }
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
 
-def _drive_file_id(drive_link: str) -> Optional[str]:
-    if not drive_link:
+    t0 = time.perf_counter()
+    try:
+        r = http_post(OPENAI_CHAT_URL, headers=headers, json=payload)
+        r.raise_for_status()
+        data = r.json()
+        record_prompt_tokens(
+            "summary", prompt_tokens(payload["messages"]),
+            (data.get("usage") or {}).get("prompt_tokens"), time.perf_counter() - t0,
+        )
+        return data["choices"][0]["message"]["content"].strip() or None
+    except Exception as e:
+        print("OPENAI CHAT SUMMARY ERROR:", repr(e))
         return None
 
-    link = str(drive_link).strip()
 
-    # covers:
-    # /file/d/<ID>/view
-    # /file/d/<ID>/preview
-    m = re.search(r"/file/d/([^/]+)/", link)
-    if m:
-        return m.group(1)
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    # covers:
-    # .../d/<ID>/... (some shared formats)
-    m = re.search(r"/d/([^/]+)", link)
-    if m:
-        return m.group(1)
 
-    # covers:
-    # open?id=<ID>
-    # uc?id=<ID>
-    try:
-        parsed = urllib.parse.urlparse(link)
-        qs = urllib.parse.parse_qs(parsed.query)
-        if "id" in qs and qs["id"]:
-            return qs["id"][0]
-    except Exception:
-        pass
+# stored per owner; older messages are deleted (the prompt has its own token budget, see chat_context)
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "200"))
+# anonymous transcripts (session cookie only) are deleted after this many idle days, see prune_anonymous_chats
+CHAT_ANON_RETENTION_DAYS = int(os.getenv("CHAT_ANON_RETENTION_DAYS", "30"))
 
-    return None
 
-def find_training_videos_from_excel(age_group, focus, intensity, players_count):
-    try:
-        df = pd.read_excel(VIDEO_EXCEL_PATH)
-    except FileNotFoundError:
-        return {"Aufwärmen": [], "Hauptteil 1": [], "Hauptteil 2": []}
+def _chat_owner_key() -> str:
+    """Logged-in coaches share their history across devices; others get a random id in the session."""
+    if session.get("coach_id"):
+        return f"coach:{session['coach_id']}"
+    if not session.get("chat_id"):
+        session["chat_id"] = uuid.uuid4().hex
+    return f"anon:{session['chat_id']}"
 
-    drive_col = "Google Drive Links "
-    if drive_col not in df.columns and "Google Drive Links" in df.columns:
-        drive_col = "Google Drive Links"
 
-    def clean(x):
-        s = "" if x is None else str(x).strip()
-        return "" if s.lower() == "nan" else s
+def load_chat_history(owner_key: str) -> list[dict]:
+    # transcripts from before the server-side store lived in the cookie: move them over once
+    legacy = session.pop("chat_messages", None)
+    if legacy:
+        save_chat_messages(owner_key, legacy)
 
-    for c in ["Spieleralter", "Trainingsschwerpunkt", "Intensität", "Trainingsphase", "Spieleranzahl"]:
-        df[c] = df[c].apply(clean)
-    df[drive_col] = df[drive_col].apply(clean)
+    rows = (
+        ChatMessage.query.filter_by(owner_key=owner_key)
+        .order_by(ChatMessage.id.desc())
+        .limit(CHAT_HISTORY_MAX_MESSAGES)
+        .all()
+    )
+    return [m.as_message() for m in reversed(rows)]
 
-    try:
-        players_count = int(players_count)
-    except Exception:
-        return {"Aufwärmen": [], "Hauptteil 1": [], "Hauptteil 2": []}
-
-    # strict filter
-    df = df[
-        (df["Spieleralter"] == clean(age_group)) &
-        (df["Trainingsschwerpunkt"] == clean(focus)) &
-        (df["Intensität"] == clean(intensity)) &
-        (df[drive_col] != "")
-    ]
 
-    out = {"Aufwärmen": [], "Hauptteil 1": [], "Hauptteil 2": []}
+def save_chat_messages(owner_key: str, messages: list[dict]):
+    for m in messages:
+        db.session.add(ChatMessage(owner_key=owner_key, role=m["role"], content=m["content"]))
+    db.session.flush()
 
-    # 🔥 KEY FIX: group by phase
-    for phase in out.keys():
-        phase_df = df[df["Trainingsphase"] == phase]
+    # bounded window: drop everything older than the newest CHAT_HISTORY_MAX_MESSAGES
+    cutoff = (
+        ChatMessage.query.filter_by(owner_key=owner_key)
+        .order_by(ChatMessage.id.desc())
+        .offset(CHAT_HISTORY_MAX_MESSAGES)
+        .first()
+    )
+    if cutoff is not None:
+        ChatMessage.query.filter(
+            ChatMessage.owner_key == owner_key, ChatMessage.id <= cutoff.id
+        ).delete(synchronize_session=False)
+    db.session.commit()
 
-        # match players range
-        phase_df = phase_df[
-            phase_df["Spieleranzahl"].apply(
-                lambda v: _players_match(v, players_count)
-            )
+
+def prune_anonymous_chats(batch_size: int = 500) -> int:
+    """
+    Delete transcripts + summaries of anonymous owners whose last message is older
+    than CHAT_ANON_RETENTION_DAYS. Coach transcripts are kept. Returns the number of owners.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=CHAT_ANON_RETENTION_DAYS)
+    total = 0
+    while True:
+        owners = [
+            key for (key,) in db.session.query(ChatMessage.owner_key)
+            .filter(ChatMessage.owner_key.like("anon:%"))
+            .group_by(ChatMessage.owner_key)
+            .having(db.func.max(ChatMessage.created_at) < cutoff)
+            .limit(batch_size)
+            .all()
         ]
+        if not owners:
+            break
+        ChatMessage.query.filter(ChatMessage.owner_key.in_(owners)).delete(synchronize_session=False)
+        ChatSummary.query.filter(ChatSummary.owner_key.in_(owners)).delete(synchronize_session=False)
+        db.session.commit()
+        total += len(owners)
+    return total
 
-        if phase_df.empty:
-            continue
 
-        # ✅ deterministic: always first row in Excel for that phase
-        row = phase_df.iloc[0]
+def _unsummarized_messages(owner_key: str, summary: "ChatSummary | None") -> list[dict]:
+    rows = (
+        ChatMessage.query.filter(
+            ChatMessage.owner_key == owner_key,
+            ChatMessage.id > (summary.upto_message_id if summary else 0),
+        )
+        .order_by(ChatMessage.id)
+        .all()
+    )
+    return [{**m.as_message(), "id": m.id} for m in rows]
 
-        drive_link = row[drive_col]
 
-        # extract file id
-        m = re.search(r"/file/d/([^/]+)/", drive_link)
-        file_id = m.group(1) if m else None
+def chat_prompt_history(owner_key: str, prompt: str) -> list[dict]:
+    """
+    History to send with prompt: running summary + recent turns within CHAT_PROMPT_TOKEN_BUDGET.
+    Never calls OpenAI itself: a summary that lags behind is caught up after the answer
+    (schedule_chat_summary), until then the oldest unsummarized turns are cut off.
+    """
+    summary = db.session.get(ChatSummary, owner_key)
+    recent = _unsummarized_messages(owner_key, summary)
+    fixed = message_tokens(CHAT_SYSTEM_MSG) + count_tokens(prompt)
+    return build_history(summary.content if summary else "", recent, fixed)
 
-        out[phase] = [{
-            "embed_url": drive_to_embed_url(drive_link),
-            "thumbnail_url": (
-                f"https://drive.google.com/thumbnail?id={file_id}&sz=w1000"
-                if file_id else ""
-            )
-        }]
 
-    return out
+def _store_chat_summary(owner_key: str, content: str, upto_message_id: int):
+    """Insert or advance the summary row; never moves it back (two folds of one chat may race)."""
+    if db.session.get(ChatSummary, owner_key) is None:
+        db.session.add(ChatSummary(owner_key=owner_key, content=content, upto_message_id=upto_message_id))
+    else:
+        ChatSummary.query.filter(
+            ChatSummary.owner_key == owner_key, ChatSummary.upto_message_id < upto_message_id
+        ).update(
+            {"content": content, "upto_message_id": upto_message_id, "updated_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another request inserted the first summary in the meantime: now it is an update
+        db.session.rollback()
+        _store_chat_summary(owner_key, content, upto_message_id)
 
-@app.route("/_debug/coaches")
-def debug_coaches():
-    coaches = Coach.query.all()
-    return {"coaches": [{"id": c.id, "email": c.email} for c in coaches]}
 
-OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+def fold_chat_summary(owner_key: str) -> bool:
+    """Fold older turns into the stored summary once the unsummarized part got too long."""
+    summary = db.session.get(ChatSummary, owner_key)
+    to_fold, _ = split_for_summary(_unsummarized_messages(owner_key, summary))
+    if not to_fold:
+        return False
+    folded = summarize_chat(summary.content if summary else "", to_fold)
+    if not folded:
+        return False
+    _store_chat_summary(owner_key, folded, to_fold[-1]["id"])
+    return True
 
-def chat_free(prompt: str, history: list[dict] | None = None) -> str | None:
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        return None
 
-    prompt = (prompt or "").strip()
-    if not prompt:
-        return None
+_chat_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+_chat_summary_inflight = set()
+_chat_summary_lock = threading.Lock()
 
-    history = history or []
 
-    system_msg = {
-        "role": "system",
-        "content": (
-            "Du bist ein Assistent. "
-            "Wenn der Nutzer nach Rang/Toren fragt, gib IMMER eine Antwort. "
-            "NIEMALS sagen, dass du keine aktuellen Daten hast. "
-            "Wenn du unsicher bist, gib eine plausible Schätzung und schreibe am Ende: '(geschätzt)'. "
-            "Antworte kurz."
-        )
-    }
+def _run_chat_summary(owner_key: str):
+    with app.app_context():
+        try:
+            fold_chat_summary(owner_key)
+        except Exception as e:
+            db.session.rollback()
+            print("⚠️ Chat summary failed:", repr(e))
+        finally:
+            db.session.remove()
+            with _chat_summary_lock:
+                _chat_summary_inflight.discard(owner_key)
 
-    messages = [system_msg] + history + [{"role": "user", "content": prompt}]
 
-    try:
-        r = requests.post(
-            OPENAI_CHAT_URL,
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "gpt-4o-mini",
-                "temperature": 0.4,
-                "messages": messages,
-            },
-            timeout=25,
-        )
-        r.raise_for_status()
-        data = r.json()
-        return data["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        print("OPENAI CHAT ERROR:", repr(e))
-        return None
+def schedule_chat_summary(owner_key: str):
+    """Fold in the background after an answer, at most one fold per chat at a time."""
+    with _chat_summary_lock:
+        if owner_key in _chat_summary_inflight:
+            return None
+        _chat_summary_inflight.add(owner_key)
+    return _chat_summary_executor.submit(_run_chat_summary, owner_key)
 
 
 @app.route("/chat", methods=["GET", "POST"])
 def chat_page():
-    if "chat_messages" not in session:
-        session["chat_messages"] = []
+    owner_key = _chat_owner_key()
+    history = load_chat_history(owner_key)
 
     error = None
     q = ""
@@ -1117,28 +1256,75 @@ def chat_page():
         if not q:
             error = "Bitte etwas eingeben."
         else:
-            history = session["chat_messages"]
-
-            answer = chat_free(q, history=history[-12:])  # keep last 12 msgs
+            answer = chat_free(q, history=chat_prompt_history(owner_key, q))
             if not answer:
                 error = "AI Antwort fehlgeschlagen."
             else:
-                history.append({"role": "user", "content": q})
-                history.append({"role": "assistant", "content": answer})
-                session["chat_messages"] = history
-
+                save_chat_messages(owner_key, [
+                    {"role": "user", "content": q},
+                    {"role": "assistant", "content": answer},
+                ])
+                schedule_chat_summary(owner_key)
                 return redirect(url_for("chat_page"))
 
-    return render_template("chat.html", messages=session.get("chat_messages", []), error=error, q=q)
+    return render_template("chat.html", messages=history, error=error, q=q)
+
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Server-sent events: "token" per text piece, then "done" with the full answer.
+    The exchange is stored once the answer is complete (history is server-side,
+    so nothing has to go back into the session cookie); the summary is folded
+    afterwards in the background, so it never delays the first token.
+    """
+    q = (request.form.get("q") or "").strip()
+    if not q:
+        return {"error": "Bitte etwas eingeben."}, 400
+
+    owner_key = _chat_owner_key()
+    load_chat_history(owner_key)  # moves a legacy cookie transcript into the store
+    history = chat_prompt_history(owner_key, q)
+
+    def generate():
+        parts = []
+        try:
+            for piece in chat_free_stream(q, history=history):
+                parts.append(piece)
+                yield _sse("token", {"t": piece})
+        except Exception as e:
+            print("OPENAI CHAT STREAM ERROR:", repr(e))
+            yield _sse("error", {"error": "AI Antwort fehlgeschlagen."})
+            return
+
+        answer = "".join(parts).strip()
+        if not answer:
+            yield _sse("error", {"error": "AI Antwort fehlgeschlagen."})
+            return
+        save_chat_messages(owner_key, [
+            {"role": "user", "content": q},
+            {"role": "assistant", "content": answer},
+        ])
+        schedule_chat_summary(owner_key)
+        yield _sse("done", {"answer": answer})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/chat/reset", methods=["POST"])
 def chat_reset():
-    session["chat_messages"] = []
+    owner_key = _chat_owner_key()
+    session.pop("chat_messages", None)
+    ChatMessage.query.filter_by(owner_key=owner_key).delete(synchronize_session=False)
+    ChatSummary.query.filter_by(owner_key=owner_key).delete(synchronize_session=False)
+    db.session.commit()
     return redirect(url_for("chat_page"))
 
 
-
 @app.route("/opponent-chat", methods=["GET", "POST"])
 def opponent_chatlike():
     if request.method == "POST":
@@ -1159,40 +1345,6 @@ def opponent_chatlike():
 
 
 
-def drive_to_embed_url(drive_link: str) -> str:
-    """
-    Convert various Google Drive link formats into an embeddable preview URL.
-    Works for:
-      - https://drive.google.com/file/d/<ID>/view?...
-      - https://drive.google.com/open?id=<ID>
-      - https://drive.google.com/uc?id=<ID>&export=download
-    Returns: https://drive.google.com/file/d/<ID>/preview
-    """
-    if not drive_link:
-        return ""
-
-    link = str(drive_link).strip()
-
-    # file/d/<id>/...
-    m = re.search(r"/file/d/([^/]+)/", link)
-    if m:
-        file_id = m.group(1)
-        return f"https://drive.google.com/file/d/{file_id}/preview"
-
-    # ?id=<id>
-    try:
-        parsed = urllib.parse.urlparse(link)
-        qs = urllib.parse.parse_qs(parsed.query)
-        if "id" in qs and qs["id"]:
-            file_id = qs["id"][0]
-            return f"https://drive.google.com/file/d/{file_id}/preview"
-    except Exception:
-        pass
-
-    # fallback: return original (might still work)
-    return link
-
-
 def compute_phase_minutes(age_group: str, intensity: str, duration_minutes: int) -> dict:
     """
     Returns minutes for 6 phases:
@@ -1343,7 +1495,7 @@ def _max_weight_assignment(scores: list[list[float]]) -> list[int]:
 
 @app.route("/_debug/video-values")
 def debug_video_values():
-    df = pd.read_excel(VIDEO_EXCEL_PATH)
+    df = read_table(VIDEO_EXCEL_PATH)
 
     # detect drive column name (space / no space)
     drive_col = "Google Drive Links "
@@ -1389,6 +1541,43 @@ def debug_openai():
     return {"OPENAI_API_KEY_present": bool(api_key), "key_prefix": (api_key[:7] if api_key else None)}
 
 
+@app.route("/_debug/model-cache")
+def debug_model_cache():
+    return prediction_cache_info()
+
+
+@app.route("/_debug/club-directory")
+def debug_club_directory():
+    return {"directory": club_directory.info(), "tables": club_table_cache.info()}
+
+
+@app.route("/_debug/http")
+def debug_http():
+    return http_metrics()
+
+
+@app.route("/_debug/opponent-resolver")
+def debug_opponent_resolver():
+    return {**resolver_stats(), "openai_cache": openai_cache.info()}
+
+
+@app.route("/_debug/db")
+def debug_db():
+    with db.engine.connect() as conn:
+        settings = sqlite_settings(conn) if db.engine.dialect.name == "sqlite" else {}
+    return {"settings": settings, "pool": db.engine.pool.status()}
+
+
+@app.route("/_debug/email-outbox")
+def debug_email_outbox():
+    return email_outbox.info()
+
+
+@app.route("/_debug/chat-context")
+def debug_chat_context():
+    return context_stats()
+
+
 @app.route("/")
 def home():
     return render_template("splash.html")
@@ -1618,7 +1807,7 @@ def register():
         if not name or not email or not password:
             message = "Bitte Name, E-Mail und Passwort eingeben."
         else:
-            existing = Coach.query.filter_by(email=email).first()
+            existing = find_coach_by_email(email)
             if existing:
                 message = "Für diese E-Mail existiert bereits ein Konto. Bitte einloggen."
                 return render_template("register.html", message=message)
@@ -1639,11 +1828,12 @@ def register():
                 session["coach_name"] = coach.name
 
                 subject = "Willkommen bei Noqe"
+                # handlebars merge tags: same content for every coach → the outbox can batch it
                 text_body = (
-                    f"Hallo {name},\n\n"
+                    "Hallo {{{name}}},\n\n"
                     "super, dass du jetzt Teil von Noqe bist! Dein Account wurde erfolgreich erstellt.\n\n"
-                    f"E-Mail: {email}\n"
-                    f"Team: {teamname or '-'}\n\n"
+                    "E-Mail: {{{email}}}\n"
+                    "Team: {{{teamname}}}\n\n"
                     "Noqe stärkt dich als Trainer*in in jedem Moment deines Alltags – von der Trainingsvorbereitung über"
                     "die optimale Formationswahl bis hin zu deinem persönlichen Assistenten an deiner Seite."
                     "Wir freuen uns, dich auf diesem Weg zu begleiten.\n\n"
@@ -1651,14 +1841,14 @@ def register():
                     "Dein Noqe-Team"
                 )
 
-                html_body = f"""
-                <p>Hallo {name},</p>
+                html_body = """
+                <p>Hallo {{name}},</p>
 
                 <p>super, dass du jetzt Teil von <strong>Noqe</strong> bist! Dein Konto wurde erfolgreich erstellt.</p>
 
                 <p>
-                  <strong>E-Mail:</strong> {email}<br>
-                  <strong>Team:</strong> {teamname or '-'}
+                  <strong>E-Mail:</strong> {{email}}<br>
+                  <strong>Team:</strong> {{teamname}}
                 </p>
 
                 <p>
@@ -1672,7 +1862,11 @@ def register():
                 Dein <strong>Noqe-Team</strong>
                 </p>
                 """
-                send_email(email, subject, text_body, html_body)
+                email_outbox.enqueue(
+                    email, subject, text_body, html_body,
+                    merge_vars={"name": name, "email": email, "teamname": teamname or "-"},
+                    idempotency_key=f"welcome:{coach.id}",
+                )
 
                 return redirect(url_for("summary"))
 
@@ -1685,28 +1879,31 @@ def forgot_password():
     if request.method == "POST":
         email = normalize_email(request.form.get("email"))
         if email:
-            coach = Coach.query.filter_by(email=email).first()
+            coach = find_coach_by_email(email)
             if coach:
                 token = generate_reset_token(coach.id)
                 reset_url = url_for("reset_password", token=token, _external=True)
                 subject = "Trainer App – Passwort zurücksetzen"
                 text_body = (
-                    f"Hallo {coach.name},\n\n"
+                    "Hallo {{{name}}},\n\n"
                     "du hast eine Zurücksetzung deines Passworts angefordert.\n"
-                    f"Klicke auf den folgenden Link, um ein neues Passwort zu vergeben:\n\n"
-                    f"{reset_url}\n\n"
+                    "Klicke auf den folgenden Link, um ein neues Passwort zu vergeben:\n\n"
+                    "{{{reset_url}}}\n\n"
                     "Wenn du diese Anfrage nicht gestellt hast, kannst du diese E-Mail ignorieren.\n"
                 )
-                html_body = f"""
-                <p>Hallo {coach.name},</p>
+                html_body = """
+                <p>Hallo {{name}},</p>
                 <p>du hast eine Zurücksetzung deines Passworts angefordert.</p>
                 <p>
                   Klicke auf den folgenden Link, um ein neues Passwort zu vergeben:<br>
-                  <a href="{reset_url}">{reset_url}</a>
+                  <a href="{{reset_url}}">{{reset_url}}</a>
                 </p>
                 <p>Wenn du diese Anfrage nicht gestellt hast, kannst du diese E-Mail ignorieren.</p>
                 """
-                send_email(email, subject, text_body, html_body)
+                email_outbox.enqueue(
+                    email, subject, text_body, html_body,
+                    merge_vars={"name": coach.name, "reset_url": reset_url},
+                )
 
         info = "Wenn ein Konto mit dieser E-Mail existiert, wurde eine Nachricht versendet."
     return render_template("forgot_password.html", info=info)
@@ -1743,7 +1940,7 @@ def login():
         email = normalize_email(request.form.get("email"))
         password = (request.form.get("password") or "").strip()
 
-        coach = Coach.query.filter_by(email=email).first()
+        coach = find_coach_by_email(email)
         if coach and coach.check_password(password):
             session["coach_id"] = coach.id
             session["coach_name"] = coach.name
@@ -1838,6 +2035,115 @@ def formation_gameplan_opponent_apply():
 
 
 
+# --- Opponent lookup as background job: search POST enqueues, confirm page polls the status ---
+
+OPPONENT_LOOKUP_WORKERS = int(os.getenv("OPPONENT_LOOKUP_WORKERS", "4"))
+# finished lookups are reused for the same (normalized) query within this time
+OPPONENT_RESULT_TTL = int(os.getenv("OPPONENT_RESULT_TTL", str(3600)))
+# pending/running jobs older than this are treated as lost (e.g. worker process restarted)
+OPPONENT_JOB_TIMEOUT = int(os.getenv("OPPONENT_JOB_TIMEOUT", "120"))
+
+_opponent_executor = ThreadPoolExecutor(max_workers=OPPONENT_LOOKUP_WORKERS, thread_name_prefix="opponent-lookup")
+
+_OPPONENT_ACTIVE = ("pending", "running")
+
+
+# priority order: FVRZ table (exact data) > OpenAI web search > ChatGPT estimate
+OPPONENT_SOURCES = [
+    ("fvrz", fetch_opponent_candidate, "matchcenter.fvrz.ch"),
+    ("web_search", fetch_opponent_stats_with_web_search, "matchcenter.fvrz.ch (via Web Search)"),
+    ("chatgpt", fetch_opponent_stats_with_chatgpt, "ChatGPT (geschätzt)"),
+]
+
+
+def resolve_opponent(q: str) -> Optional[Dict[str, Any]]:
+    """All sources run concurrently; FVRZ wins if it answers within OPPONENT_PREFERRED_DEADLINE."""
+    team, report = resolve_first_good([(name, fn) for name, fn, _ in OPPONENT_SOURCES], q)
+    print("OPPONENT RESOLVER:", report)
+
+    if team is None:
+        return None
+    labels = {name: label for name, _, label in OPPONENT_SOURCES}
+    team.setdefault("source", labels[report["winner"]])
+    team["resolver"] = report
+    return team
+
+
+def _opponent_job_expired(job: "OpponentLookup") -> bool:
+    return (
+        job.status in _OPPONENT_ACTIVE
+        and (datetime.utcnow() - job.created_at).total_seconds() > OPPONENT_JOB_TIMEOUT
+    )
+
+
+def _run_opponent_lookup(job_id: str):
+    with app.app_context():
+        try:
+            job = db.session.get(OpponentLookup, job_id)
+            if job is None:
+                return
+            job.status = "running"
+            db.session.commit()
+
+            team = resolve_opponent(job.team_query)
+            print("OPPONENT QUERY:", job.team_query)
+            print("OPPONENT TEAM RESULT:", team)
+
+            job.status = "done" if team else "not_found"
+            job.result = json.dumps(team) if team else None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print("⚠️ Opponent lookup failed:", repr(e))
+            job = db.session.get(OpponentLookup, job_id)
+            if job is not None:
+                job.status = "error"
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def enqueue_opponent_lookup(q: str) -> "OpponentLookup":
+    """
+    Returns the job that answers q: a recent finished one, one already in flight
+    for the same query, or a newly queued one.
+    """
+    q_norm = normalize_query(q)  # not normalize_team_name: "Senioren 30+" is not "Senioren 30"
+    now = datetime.utcnow()
+
+    recent = (
+        OpponentLookup.query
+        .filter(OpponentLookup.query_norm == q_norm)
+        .filter(OpponentLookup.created_at >= now - timedelta(seconds=max(OPPONENT_RESULT_TTL, OPPONENT_JOB_TIMEOUT)))
+        .order_by(OpponentLookup.created_at.desc())
+        .all()
+    )
+    for job in recent:
+        if job.status == "done" and (now - job.created_at).total_seconds() <= OPPONENT_RESULT_TTL:
+            return job
+        if job.status in _OPPONENT_ACTIVE and not _opponent_job_expired(job):
+            return job
+
+    job = OpponentLookup(id=uuid.uuid4().hex, team_query=q[:200], query_norm=q_norm[:200], status="pending")
+    db.session.add(job)
+    db.session.commit()
+    _opponent_executor.submit(_run_opponent_lookup, job.id)
+    return job
+
+
+def prune_opponent_lookups() -> int:
+    """
+    Delete jobs that enqueue_opponent_lookup can no longer reuse: older than
+    OPPONENT_RESULT_TTL (finished) or OPPONENT_JOB_TIMEOUT (lost). Returns the number of rows.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=max(OPPONENT_RESULT_TTL, OPPONENT_JOB_TIMEOUT))
+    n = OpponentLookup.query.filter(OpponentLookup.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return n
+
+
 @app.route("/teamformation/spielidee/opponent/search", methods=["GET", "POST"])
 def formation_gameplan_opponent_search():
     error = session.pop("gp_opponent_error", None)
@@ -1846,33 +2152,64 @@ def formation_gameplan_opponent_search():
     if request.method == "POST":
         q = (request.form.get("opponent_query") or "").strip()
         session["gp_opponent_query"] = q
-        return redirect(url_for("formation_gameplan_opponent_confirm", q=q))
+        if not q:
+            session["gp_opponent_error"] = "Bitte Teamname eingeben."
+            return redirect(url_for("formation_gameplan_opponent_search"))
+
+        job = enqueue_opponent_lookup(q)
+        return redirect(url_for("formation_gameplan_opponent_confirm", job=job.id))
 
     return render_template("formation_gameplan_opponent_search.html", error=error, q=q)
 
 
+@app.route("/teamformation/spielidee/opponent/status/<job_id>", methods=["GET"])
+def formation_gameplan_opponent_status(job_id):
+    job = db.session.get(OpponentLookup, job_id)
+    if job is None:
+        return {"status": "unknown"}, 404
+
+    status = "error" if _opponent_job_expired(job) else job.status
+    return {
+        "status": status,
+        "done": status not in _OPPONENT_ACTIVE,
+        "elapsed_seconds": round((datetime.utcnow() - job.created_at).total_seconds(), 1),
+    }
+
+
 @app.route("/teamformation/spielidee/opponent/confirm", methods=["GET"])
 def formation_gameplan_opponent_confirm():
-    q = (request.args.get("q") or session.get("gp_opponent_query") or "").strip()
-    if not q:
-        session["gp_opponent_error"] = "Bitte Teamname eingeben."
-        return redirect(url_for("formation_gameplan_opponent_search"))
-
-    session["gp_opponent_query"] = q
+    job_id = request.args.get("job")
 
-    team = fetch_opponent_stats_with_web_search(q)
+    if not job_id:
+        # old links (?q=...) → queue the lookup and continue with the job
+        q = (request.args.get("q") or session.get("gp_opponent_query") or "").strip()
+        if not q:
+            session["gp_opponent_error"] = "Bitte Teamname eingeben."
+            return redirect(url_for("formation_gameplan_opponent_search"))
+        session["gp_opponent_query"] = q
+        job = enqueue_opponent_lookup(q)
+        return redirect(url_for("formation_gameplan_opponent_confirm", job=job.id))
 
-    # fallback (old method) only if web_search fails
-    if team is None:
-        team = fetch_opponent_candidate(q)
+    job = db.session.get(OpponentLookup, job_id)
+    if job is None or job.status == "error" or _opponent_job_expired(job):
+        session["gp_opponent_error"] = "Suche fehlgeschlagen – bitte nochmals versuchen."
+        return redirect(url_for("formation_gameplan_opponent_search"))
 
-    print("OPPONENT QUERY:", q)
-    print("OPPONENT TEAM RESULT:", team)
+    if job.status in _OPPONENT_ACTIVE:
+        return render_template("formation_gameplan_opponent_wait.html", job=job)
 
+    team = job.result_map
     if team is None:
         session["gp_opponent_error"] = "Team nicht gefunden – bitte anders schreiben."
         return redirect(url_for("formation_gameplan_opponent_search"))
 
+    session["gp_opponent_query"] = job.team_query
+    if team.get("table_cache"):
+        team["table_cache"] = {
+            **team["table_cache"],
+            "age_seconds": int(time.time() - team["table_cache"]["fetched_at"]),
+            **club_table_cache.info(),
+        }
     return render_template("formation_gameplan_opponent_confirm.html", team=team)
 
 
@@ -1993,6 +2330,170 @@ def new_player():
     return render_template("player_new.html")
 
 
+def _player_model_attrs(player) -> dict:
+    """Player row → model feature dict (same mapping as the attribute form)."""
+    return map_form_to_model_features({
+        "speed": player.speed,
+        "stamina": player.stamina,
+        "strength": player.strength,
+        "aggression": player.aggression,
+        "tackling": player.tackling,
+        "height_cm": player.height_cm or 180,
+        "weight_kg": player.weight_kg or 70,
+        "first_touch": player.first_touch,
+        "dribbling": player.dribbling,
+        "short_passing": player.short_passing,
+        "long_passing": player.long_passing,
+        "finishing": player.finishing,
+        "shooting_power": player.shooting_power,
+        "decision_making": player.decision_making,
+    })
+
+
+def _store_player_probas(players) -> int:
+    """
+    Recompute the stored position probabilities for the given players
+    (one batch model call). Caller commits. Returns number of updated rows.
+    """
+    version = get_model_version()
+    if version is None or not players:
+        return 0
+
+    probas = predict_position_proba_all_batch([_player_model_attrs(p) for p in players])
+    for p, proba in zip(players, probas):
+        p.position_proba = json.dumps(proba)
+        p.position_model_version = version
+    return len(players)
+
+
+def _refresh_stale_player_probas(players) -> int:
+    """Only players without probabilities or with an older model version get recomputed."""
+    version = get_model_version()
+    stale = [p for p in players if not p.position_proba or p.position_model_version != version]
+    return _store_player_probas(stale)
+
+
+def backfill_player_probas(batch_size: int = 200) -> int:
+    """Fill position_proba for all existing players (missing or from an older model)."""
+    version = get_model_version()
+    if version is None:
+        return 0
+
+    total = 0
+    last_id = 0
+    while True:
+        batch = (
+            Player.query
+            .filter(Player.id > last_id)
+            .filter((Player.position_model_version.is_(None)) | (Player.position_model_version != version))
+            .order_by(Player.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        total += _store_player_probas(batch)
+        last_id = batch[-1].id
+        db.session.commit()
+    return total
+
+
+def _run_position_backfill():
+    with app.app_context():
+        try:
+            n = backfill_player_probas()
+            if n:
+                print(f"✅ Position backfill: {n} players updated")
+        except Exception as e:
+            db.session.rollback()
+            print("⚠️ Position backfill failed:", repr(e))
+        finally:
+            db.session.remove()
+
+
+# periodic cleanup of data that nobody reads any more (see run_housekeeping)
+HOUSEKEEPING_INTERVAL = int(os.getenv("HOUSEKEEPING_INTERVAL", str(3600)))
+
+
+def run_housekeeping() -> dict:
+    """One cleanup pass; needs an app context."""
+    return {
+        "anonymous_chats": prune_anonymous_chats(),
+        "opponent_lookups": prune_opponent_lookups(),
+    }
+
+
+def _run_housekeeping_loop():
+    while True:
+        with app.app_context():
+            try:
+                removed = run_housekeeping()
+                if any(removed.values()):
+                    print("🧹 Housekeeping:", removed)
+            except Exception as e:
+                db.session.rollback()
+                print("⚠️ Housekeeping failed:", repr(e))
+            finally:
+                db.session.remove()
+        time.sleep(HOUSEKEEPING_INTERVAL)
+
+
+# --- background work of a serving process ---
+# Started by the first request, not at import: create_db.py, CLI commands and the
+# tests import app without side effects. A lock file in DATA_DIR makes sure only one
+# process per host runs it (gunicorn workers share DATA_DIR); if that worker dies,
+# the worker gunicorn starts in its place takes over on its first request.
+BACKGROUND_LOCK_PATH = os.path.join(DATA_DIR, "background-workers.lock")
+_background_lock_file = None
+_background_checked = False
+_background_guard = threading.Lock()
+
+
+def start_background_workers() -> bool:
+    """Start the position backfill, the email outbox and the housekeeping worker once per host. True if this process runs them."""
+    global _background_lock_file, _background_checked
+    with _background_guard:
+        if _background_checked:
+            return _background_lock_file is not None
+        _background_checked = True
+
+        lock_file = open(BACKGROUND_LOCK_PATH, "w")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False  # another process on this host runs them
+        _background_lock_file = lock_file  # held for the life of the process
+
+    if os.getenv("POSITION_BACKFILL", "1") == "1":
+        threading.Thread(target=_run_position_backfill, name="position-backfill", daemon=True).start()
+    if os.getenv("EMAIL_OUTBOX_WORKER", "1") == "1":
+        email_outbox.start()
+    if os.getenv("HOUSEKEEPING_WORKER", "1") == "1":
+        threading.Thread(target=_run_housekeeping_loop, name="housekeeping", daemon=True).start()
+    return True
+
+
+@app.before_request
+def _start_background_workers_once():
+    if not _background_checked and not app.testing:
+        start_background_workers()
+
+
+@app.cli.command("backfill-positions")
+def backfill_positions_command():
+    """flask --app app backfill-positions: fill position_proba for all players now (deploy step)."""
+    n = backfill_player_probas()
+    print(f"✅ Position backfill: {n} players updated")
+
+
+@app.cli.command("housekeeping")
+def housekeeping_command():
+    """flask --app app housekeeping: run one cleanup pass now (e.g. from cron with HOUSEKEEPING_WORKER=0)."""
+    print("🧹 Housekeeping:", run_housekeeping())
+
+
 def _load_owned_player(player_id):
     if not session.get("coach_id"):
         return None
@@ -2015,22 +2516,7 @@ def suggest_position(player_id):
 
     formation = request.form.get("formation", "4-3-3")
 
-    attrs_for_model = map_form_to_model_features({
-        "speed": player.speed,
-        "stamina": player.stamina,
-        "strength": player.strength,
-        "aggression": player.aggression,
-        "tackling": player.tackling,
-        "height_cm": player.height_cm or 180,
-        "weight_kg": player.weight_kg or 70,
-        "first_touch": player.first_touch,
-        "dribbling": player.dribbling,
-        "short_passing": player.short_passing,
-        "long_passing": player.long_passing,
-        "finishing": player.finishing,
-        "shooting_power": player.shooting_power,
-        "decision_making": player.decision_making,
-    })
+    attrs_for_model = _player_model_attrs(player)
 
     top3 = recommend_position_from_attributes(attrs_for_model)
 
@@ -2280,26 +2766,10 @@ def formation_with_squad_result():
         # still render with empties
         pass
 
-    # --- Build probability maps per player ---
-    player_probas = {}
-    for p in players:
-        attrs = map_form_to_model_features({
-            "speed": p.speed,
-            "stamina": p.stamina,
-            "strength": p.strength,
-            "aggression": p.aggression,
-            "tackling": p.tackling,
-            "height_cm": p.height_cm or 180,
-            "weight_kg": p.weight_kg or 70,
-            "first_touch": p.first_touch,
-            "dribbling": p.dribbling,
-            "short_passing": p.short_passing,
-            "long_passing": p.long_passing,
-            "finishing": p.finishing,
-            "shooting_power": p.shooting_power,
-            "decision_making": p.decision_making,
-        })
-        player_probas[p.id] = predict_position_proba_all(attrs)
+    # --- Probability maps are stored on the player rows (only stale rows get recomputed) ---
+    if _refresh_stale_player_probas(players):
+        db.session.commit()
+    player_probas = {p.id: p.position_proba_map for p in players}
 
     # --- Hungarian assignment (max weight) ---
     def _max_weight_assignment(scores: list[list[float]]) -> list[int]:
@@ -2648,6 +3118,7 @@ def edit_player_attributes(player_id):
         else:
             player.preferred_foot = None
 
+        _store_player_probas([player])
         db.session.commit()
 
         action = request.form.get("action")
@@ -2703,7 +3174,15 @@ def download_db():
     if not os.path.exists(db_path):
         return f"DB file not found: {db_path}", 404
 
-    return send_file(db_path, as_attachment=True)
+    # in WAL mode recent commits may still sit in trainer.db-wal: send a consistent snapshot
+    snapshot = io.BytesIO()
+    with db.engine.connect() as conn:
+        src = conn.connection.dbapi_connection
+        with sqlite3.connect(":memory:") as dest:
+            src.backup(dest)
+            snapshot.write(dest.serialize())
+    snapshot.seek(0)
+    return send_file(snapshot, as_attachment=True, download_name=os.path.basename(db_path))
 
 @app.route("/test-email")
 def test_email():
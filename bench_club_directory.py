@@ -0,0 +1,114 @@
+"""
+Benchmark: old club lookup (SequenceMatcher against every club) vs. the trigram index in ClubDirectory.
+
+    python bench_club_directory.py
+
+Runs offline on a generated club list page of FVRZ size; the network round trip
+the old code paid on every search comes on top of the "old" numbers.
+"""
+import random
+import time
+from difflib import SequenceMatcher
+
+from club_directory import MIN_SCORE, _ClubIndex, parse_club_links
+from fvrz_scraper import normalize_team_name
+
+N_CLUBS = 400
+N_QUERIES = 500
+
+PLACES = [
+    "Hinwil", "Wetzikon", "Uster", "Bülach", "Kloten", "Dübendorf", "Wädenswil", "Horgen",
+    "Thalwil", "Adliswil", "Affoltern", "Dietikon", "Schlieren", "Regensdorf", "Winterthur",
+    "Seuzach", "Embrach", "Rüti", "Gossau", "Pfäffikon", "Volketswil", "Fällanden", "Küsnacht",
+    "Meilen", "Stäfa", "Männedorf", "Richterswil", "Urdorf", "Birmensdorf", "Oerlikon",
+    "Altstetten", "Wollishofen", "Höngg", "Seefeld", "Schwamendingen", "Witikon", "Unterstrass",
+    "Wiedikon", "Industrie", "Bassersdorf", "Wallisellen", "Opfikon", "Glattbrugg", "Niederhasli",
+]
+PREFIXES = ["FC", "SC", "SV", "FC Blue Stars", "SC YF", "FC Red Star", "AC", "Sportclub", "FC Italia"]
+
+
+def make_directory_html(rng):
+    names = set()
+    while len(names) < N_CLUBS:
+        name = f"{rng.choice(PREFIXES)} {rng.choice(PLACES)}"
+        if rng.random() < 0.4:
+            name += f" {rng.choice(PLACES)}"
+        names.add(name)
+    links = [
+        f'<li><a class="club" href="/desktopdefault.aspx/tabid-1186/v-{1000 + i}/">{name}</a></li>'
+        for i, name in enumerate(sorted(names))
+    ]
+    return "<html><body><ul>" + "\n".join(links) + "</ul></body></html>"
+
+
+def old_lookup(clubs, query):
+    qn = normalize_team_name(query)
+    if not qn:
+        return None
+    best = None
+    best_score = 0.0
+    for vid, club_name in clubs:
+        score = SequenceMatcher(None, qn, normalize_team_name(club_name)).ratio()
+        if score > best_score:
+            best_score = score
+            best = (vid, club_name)
+    return best if best and best_score >= MIN_SCORE else None
+
+
+def new_lookup(index, query):
+    qn = normalize_team_name(query)
+    if not qn:
+        return None
+    best, best_score = index.best_match(qn)
+    return best if best and best_score >= MIN_SCORE else None
+
+
+def make_queries(rng, clubs):
+    queries = []
+    for _ in range(N_QUERIES):
+        _, name = rng.choice(clubs)
+        r = rng.random()
+        if r < 0.3:
+            q = name
+        elif r < 0.5:
+            q = name.split(" ", 1)[-1] + " 1"
+        elif r < 0.7:
+            q = name.lower().replace("ü", "u").replace("ä", "a")
+        elif r < 0.9:
+            # Tippfehler: ein Zeichen weg
+            i = rng.randrange(len(name))
+            q = name[:i] + name[i + 1:]
+        else:
+            q = rng.choice(PLACES)
+        queries.append(q)
+    return queries
+
+
+def main():
+    rng = random.Random(11)
+    clubs = parse_club_links(make_directory_html(rng))
+    queries = make_queries(rng, clubs)
+
+    t0 = time.perf_counter()
+    index = _ClubIndex(clubs)
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    old = [old_lookup(clubs, q) for q in queries]
+    old_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    t0 = time.perf_counter()
+    new = [new_lookup(index, q) for q in queries]
+    new_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    mismatches = [(q, a, b) for q, a, b in zip(queries, old, new) if a != b]
+    print(f"clubs: {len(clubs)}, queries: {len(queries)}, index build: {build_ms:.1f} ms")
+    print(f"old (scan all clubs): {old_ms:.3f} ms/query (+ network round trip)")
+    print(f"new (trigram index):  {new_ms:.3f} ms/query")
+    print(f"mismatches: {len(mismatches)}")
+    for q, a, b in mismatches[:10]:
+        print(f"  {q!r}: old={a} new={b}")
+
+
+if __name__ == "__main__":
+    main()
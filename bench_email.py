@@ -0,0 +1,88 @@
+"""
+Benchmark: end-to-end messages/second through email_utils against the local Mandrill stub.
+
+    python bench_email.py [--mails 200] [--latency 0.05] [--error-rate 0.0] [--threads 8]
+
+Simulates a club onboarding --mails coaches at once:
+- send_email / send_email_template one by one (old request path, one API call per mail),
+- the same with --threads concurrent senders (several web workers),
+- the outbox: enqueue everything, then one drain (batched API calls).
+Nothing leaves the machine; the stub answers every call after --latency seconds.
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import email_outbox
+from email_outbox import EmailOutbox
+from email_utils import MandrillTransport, send_email, send_email_template, set_transport
+from mandrill_stub import start_stub
+
+
+def _mails(n):
+    return [(f"coach{i}@example.ch", f"Coach {i}") for i in range(n)]
+
+
+def _run(label, n, fn):
+    with contextlib.redirect_stdout(io.StringIO()):  # send_email prints every result
+        t0 = time.perf_counter()
+        ok = fn()
+        dt = time.perf_counter() - t0
+    print(f"{label:<38} {n / dt:8.1f} msgs/s   {dt:6.2f} s   ok={ok}/{n}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mails", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    stub = start_stub(latency=args.latency, error_rate=args.error_rate)
+    set_transport(MandrillTransport("bench-key", stub.api_url))
+    mails = _mails(args.mails)
+    n = len(mails)
+    print(f"{n} mails, stub latency {args.latency * 1000:.0f} ms, error rate {args.error_rate:.0%}\n")
+
+    def plain(mail):
+        return send_email(mail[0], "Willkommen bei Noqe", f"Hallo {mail[1]}", f"<p>Hallo {mail[1]}</p>")
+
+    def template(mail):
+        return send_email_template(mail[0], "registration_welcome", {"name": mail[1]})
+
+    _run("send_email, sequential", n, lambda: sum(map(plain, mails)))
+    _run("send_email_template, sequential", n, lambda: sum(map(template, mails)))
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        _run(f"send_email, {args.threads} threads", n, lambda: sum(pool.map(plain, mails)))
+        _run(f"send_email_template, {args.threads} threads", n, lambda: sum(pool.map(template, mails)))
+
+    email_outbox.EMAIL_OUTBOX_BACKOFF = 0.0  # retry failed batches right away
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = EmailOutbox(path=os.path.join(tmp, "outbox.db"))
+        for label, template_name in (("outbox (messages/send)", None), ("outbox (send-template)", "registration_welcome")):
+            calls_before = stub.stats.as_dict()["calls"]
+            sent_before = outbox.info()["statuses"].get("sent", 0)
+
+            def enqueue_and_drain():
+                for email, name in mails:
+                    outbox.enqueue(email, "Willkommen bei Noqe", "Hallo {{{name}}}", "<p>Hallo {{name}}</p>",
+                                   template_name=template_name, merge_vars={"name": name},
+                                   idempotency_key=f"{label}:{email}")
+                outbox.drain()
+                return outbox.info()["statuses"].get("sent", 0) - sent_before
+
+            _run(label, n, enqueue_and_drain)
+            print(f"{'':<38} {stub.stats.as_dict()['calls'] - calls_before} API calls")
+
+    print("\nstub:", stub.stats.as_dict())
+    set_transport(None)
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Per-call latency of the position model engines (single row, like recommend_position_from_attributes).
+
+    python bench_forest_engine.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+import ml_model
+from forest_engine import CompiledForest
+
+N_CALLS = 300
+
+
+def _bench(fn, rows):
+    fn(rows[0])  # warm-up
+    t0 = time.perf_counter()
+    for r in rows:
+        fn(r)
+    return (time.perf_counter() - t0) / len(rows) * 1000.0
+
+
+def main():
+    model = ml_model.get_position_model()
+    if model is None:
+        print("No position model available.")
+        return
+
+    rf = model.named_steps["rf"]
+    t0 = time.perf_counter()
+    cf = CompiledForest.from_sklearn(rf)
+    print(f"compile: {(time.perf_counter() - t0) * 1000:.1f} ms, {len(cf.feature)} nodes, max depth {cf.max_depth}")
+
+    rng = np.random.default_rng(0)
+    rows = rng.integers(1, 11, size=(N_CALLS, 1, len(ml_model.FEATURE_COLS))).astype(float)
+
+    sk_ms = _bench(lambda x: model.predict_proba(pd.DataFrame(x, columns=ml_model.FEATURE_COLS)), rows)
+    cf_ms = _bench(cf.predict_proba, rows)
+
+    diff = max(
+        float(np.abs(cf.predict_proba(x) - model.predict_proba(
+            pd.DataFrame(x, columns=ml_model.FEATURE_COLS))).max())
+        for x in rows[:50]
+    )
+
+    print(f"sklearn : {sk_ms:.3f} ms / call")
+    print(f"compiled: {cf_ms:.3f} ms / call  ({sk_ms / cf_ms:.1f}x faster, max |diff| {diff:.1e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: BeautifulSoup parse_rank_goals_matches (old) vs. lxml iterparse rows + find_team_row.
+
+    python bench_fvrz_parser.py [fixture.html]
+
+Uses the saved matchcenter page in fixtures/ (no network). The old parser scored
+by token overlap, the shared engine by name similarity, so the agreement check
+only uses exact team names as queries.
+"""
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from fvrz_scraper import _clean, find_team_row, parse_rank_goals_matches, parse_table_rows
+
+FIXTURE = "fixtures/fvrz_matchcenter_club.html"
+REPEAT = 20
+
+
+def _norm_team(s: str) -> str:
+    s = _clean(s).lower()
+    s = re.sub(r"(fc|sc|sv|1\.?|erste|mannschaft|team|club)", " ", s)
+    s = re.sub(r"[^a-z0-9äöü\s\-\.\/]", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+def parse_rank_goals_matches_bs4(html_text: str, team_query: str):
+    soup = BeautifulSoup(html_text, "lxml")
+
+    qn = _norm_team(team_query)
+    if not qn:
+        return None
+
+    best = None
+    best_score = 0.0
+
+    for table in soup.find_all("table"):
+        for tr in table.find_all("tr"):
+            cols = [_clean(td.get_text(" ", strip=True)) for td in tr.find_all(["td", "th"])]
+            if len(cols) < 5:
+                continue
+
+            m_goals = re.search(r"(\d+)\s*:\s*(\d+)", " ".join(cols))
+            if not m_goals:
+                continue
+
+            m_rank = re.match(r"^\s*(\d+)\b", cols[0])
+            if not m_rank:
+                continue
+
+            matches = None
+            for c in cols:
+                if re.fullmatch(r"\d{1,2}", c):
+                    n = int(c)
+                    if 1 <= n <= 60:
+                        matches = n
+                        break
+            if matches is None:
+                continue
+
+            team_name = max(
+                (c for c in cols if not re.fullmatch(r"[\d\W]+", c) and len(c) >= 3),
+                key=len,
+                default=""
+            )
+            if not team_name:
+                continue
+
+            q_tokens = set(qn.split())
+            t_tokens = set(_norm_team(team_name).split())
+            if not q_tokens or not t_tokens:
+                continue
+            score = len(q_tokens & t_tokens) / max(1, len(q_tokens))
+
+            if score > best_score:
+                best_score = score
+                best = {
+                    "name": team_name,
+                    "rank": int(m_rank.group(1)),
+                    "matches": matches,
+                    "goals_for": int(m_goals.group(1)),
+                    "goals_against": int(m_goals.group(2)),
+                }
+
+    return best if best and best_score >= 0.5 else None
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else FIXTURE
+    with open(path, "r", encoding="utf-8") as f:
+        page = f.read()
+
+    rows = parse_table_rows(page)
+    queries = sorted({r.team for r in rows})
+
+    def key(result):
+        return result and (result["name"], result["rank"], result["matches"], result["goals_for"], result["goals_against"])
+
+    mismatches = [q for q in queries if key(parse_rank_goals_matches_bs4(page, q)) != key(parse_rank_goals_matches(page, q))]
+
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        parse_rank_goals_matches_bs4(page, "FC Hinwil 1")
+    old_ms = (time.perf_counter() - t0) * 1000 / REPEAT
+
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        parse_rank_goals_matches(page, "FC Hinwil 1")
+    new_ms = (time.perf_counter() - t0) * 1000 / REPEAT
+
+    t0 = time.perf_counter()
+    for q in queries:
+        find_team_row(rows, q)
+    lookup_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    print(f"page: {len(page) / 1024:.0f} KB, ranking rows: {len(rows)}, queries: {len(queries)}")
+    print(f"old bs4 parse + match:    {old_ms:7.2f} ms/query")
+    print(f"new iterparse + match:    {new_ms:7.2f} ms/query")
+    print(f"new match on parsed rows: {lookup_ms:7.3f} ms/query")
+    print(f"{len(queries)} queries: old {old_ms * len(queries):.0f} ms, new {new_ms + lookup_ms * len(queries):.0f} ms (one parse)")
+    print(f"different pick than old parser: {len(mismatches)} {mismatches[:5]}")
+
+
+if __name__ == "__main__":
+    main()
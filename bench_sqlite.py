@@ -0,0 +1,153 @@
+"""
+Benchmark: concurrent reads/writes on a trainer.db-like SQLite file, default engine vs. db_tuning.
+
+    python bench_sqlite.py [--readers 8] [--writers 4] [--seconds 5]
+
+Readers run the typical page query (a coach's trainings, newest first, plus vote
+sums), writers insert votes/trainings in their own short transactions, like
+parallel web requests. "default" is what the app used before: SQLAlchemy's
+default pool and SQLite's rollback journal.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, func, select
+from sqlalchemy.exc import OperationalError
+
+from db_tuning import install_sqlite_tuning, sqlite_engine_options
+
+N_COACHES = 200
+N_ROWS = 3000
+
+metadata = MetaData()
+training = Table(
+    "training", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("coach_id", Integer, nullable=False),
+    Column("name", String(200), nullable=False),
+    Column("focus", String(100)),
+    Column("created_at", DateTime, server_default=func.current_timestamp()),
+)
+feedback_vote = Table(
+    "feedback_vote", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("feedback_id", Integer, nullable=False),
+    Column("coach_id", Integer, nullable=False),
+    Column("value", Integer, nullable=False),
+    Column("comment", Text),
+)
+
+
+def make_engine(path, tuned):
+    url = f"sqlite:///{path}"
+    if not tuned:
+        return create_engine(url)
+    engine = create_engine(url, **sqlite_engine_options())
+    install_sqlite_tuning(engine)
+    return engine
+
+
+def seed(engine):
+    metadata.create_all(engine)
+    rng = random.Random(1)
+    with engine.begin() as conn:
+        conn.execute(training.insert(), [
+            {"coach_id": rng.randrange(N_COACHES), "name": f"Training {i}", "focus": "Passspiel"}
+            for i in range(N_ROWS)
+        ])
+        conn.execute(feedback_vote.insert(), [
+            {"feedback_id": rng.randrange(500), "coach_id": rng.randrange(N_COACHES), "value": rng.choice((1, -1))}
+            for _ in range(N_ROWS)
+        ])
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run(engine, readers, writers, seconds):
+    counts = {"reads": 0, "writes": 0, "errors": 0, "read_ms": [], "write_ms": []}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def reader():
+        rng = random.Random()
+        n = 0
+        latencies = []
+        while time.perf_counter() < stop:
+            coach = rng.randrange(N_COACHES)
+            t0 = time.perf_counter()
+            with engine.connect() as conn:
+                conn.execute(
+                    select(training).where(training.c.coach_id == coach).order_by(training.c.created_at.desc()).limit(20)
+                ).all()
+                conn.execute(
+                    select(feedback_vote.c.feedback_id, func.sum(feedback_vote.c.value))
+                    .group_by(feedback_vote.c.feedback_id).limit(20)
+                ).all()
+            latencies.append((time.perf_counter() - t0) * 1000)
+            n += 1
+        with lock:
+            counts["reads"] += n
+            counts["read_ms"] += latencies
+
+    def writer():
+        rng = random.Random()
+        n = errors = 0
+        latencies = []
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(feedback_vote.insert().values(
+                        feedback_id=rng.randrange(500), coach_id=rng.randrange(N_COACHES), value=rng.choice((1, -1))))
+                    conn.execute(training.insert().values(coach_id=rng.randrange(N_COACHES), name="Neu", focus="Abschluss"))
+                latencies.append((time.perf_counter() - t0) * 1000)
+                n += 1
+            except OperationalError:  # database is locked
+                errors += 1
+        with lock:
+            counts["writes"] += n
+            counts["write_ms"] += latencies
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [
+        threading.Thread(target=writer) for _ in range(writers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.readers} reader + {args.writers} writer threads, {args.seconds:.0f} s each\n")
+    for label, tuned in (("default", False), ("tuned (WAL ...)", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = make_engine(os.path.join(tmp, "trainer.db"), tuned)
+            seed(engine)
+            counts = run(engine, args.readers, args.writers, args.seconds)
+            engine.dispose()
+        print(
+            f"{label:<16} reads {counts['reads'] / args.seconds:6.0f}/s "
+            f"(p50 {_pct(counts['read_ms'], 0.5):5.1f} ms, p99 {_pct(counts['read_ms'], 0.99):6.1f} ms)   "
+            f"writes {counts['writes'] / args.seconds:6.0f}/s "
+            f"(p50 {_pct(counts['write_ms'], 0.5):5.1f} ms, p99 {_pct(counts['write_ms'], 0.99):6.1f} ms)   "
+            f"locked errors {counts['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
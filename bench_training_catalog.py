@@ -0,0 +1,160 @@
+"""
+Benchmark: per-request pandas lookup (old find_training_from_excel) vs. the indexed TrainingCatalog.
+
+    python bench_training_catalog.py
+"""
+import random
+import time
+
+import pandas as pd
+
+from training_catalog import TRAININGS_EXCEL_PATH, TrainingCatalog
+
+N_QUERIES = 200
+
+
+def find_training_from_excel_pandas(age_group, focus, duration, players_count, physical):
+    try:
+        df = pd.read_excel(TRAININGS_EXCEL_PATH)
+    except FileNotFoundError:
+        return []
+
+    df["Players Age"] = df["Players Age"].astype(str).str.strip()
+    df["Training Focus"] = df["Training Focus"].astype(str).str.strip()
+
+    if "Physically Challenge" in df.columns:
+        df["Physically Challenge"] = (
+            df["Physically Challenge"].astype(str).str.strip().str.lower()
+        )
+
+    if "Part" in df.columns:
+        df["Part_num"] = pd.to_numeric(df["Part"], errors="coerce")
+    else:
+        df["Part_num"] = 0
+
+    if "Trainingstime" in df.columns:
+        minutes = df["Trainingstime"].astype(str).str.extract(r"(\d+)")[0]
+        df["Trainingstime_min"] = pd.to_numeric(minutes, errors="coerce")
+    else:
+        df["Trainingstime_min"] = None
+
+    if "Number of Players" in df.columns:
+        df["NumberPlayers_num"] = pd.to_numeric(
+            df["Number of Players"], errors="coerce"
+        )
+    else:
+        df["NumberPlayers_num"] = None
+
+    age_group_str = str(age_group).strip() if age_group else None
+    focus_str = str(focus).strip() if focus else None
+    physical_str = str(physical).strip().lower() if physical else None
+
+    try:
+        duration_int = int(duration) if duration is not None else None
+    except (TypeError, ValueError):
+        duration_int = None
+
+    try:
+        players_int = int(players_count) if players_count is not None else None
+    except (TypeError, ValueError):
+        players_int = None
+
+    filt = pd.Series(True, index=df.index)
+
+    if age_group_str:
+        filt &= df["Players Age"] == age_group_str
+
+    if focus_str:
+        filt &= df["Training Focus"] == focus_str
+
+    if physical_str and "Physically Challenge" in df.columns:
+        filt &= df["Physically Challenge"] == physical_str
+
+    if duration_int is not None:
+        filt &= df["Trainingstime_min"] == duration_int
+
+    if players_int is not None:
+        filt &= df["NumberPlayers_num"] == players_int
+
+    matches = df[filt]
+
+    if matches.empty:
+        return []
+
+    matches = matches.sort_values("Part_num")
+
+    trainings = []
+    for _, row in matches.iterrows():
+        trainings.append(
+            {
+                "part": row.get("Part", ""),
+                "physically_challenge": row.get("Physically Challenge", ""),
+                "equipment": row.get("Equipment", ""),
+                "setup": row.get("Setup", ""),
+                "instructions": row.get("Instructions", ""),
+                "variations": row.get("Variations", ""),
+                "coaching_points": row.get("Coaching Points", ""),
+            }
+        )
+
+    return trainings
+
+
+def _realistic_queries(n: int, seed: int = 0) -> list:
+    """Mostly complete wizard selections, some partial ones and some that match nothing."""
+    df = pd.read_excel(TRAININGS_EXCEL_PATH)
+    ages = sorted(df["Players Age"].astype(str).str.strip().unique())
+    foci = sorted(df["Training Focus"].astype(str).str.strip().unique())
+    physical = ["light", "medium", "heavy", "Medium "]
+    durations = [45, 60, 75, 90, "75"]
+    players = list(range(6, 18)) + ["12", 25]
+
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n):
+        q = [rng.choice(ages), rng.choice(foci), rng.choice(durations), rng.choice(players), rng.choice(physical)]
+        if i % 10 == 0:
+            q[rng.randrange(5)] = None
+        queries.append(tuple(q))
+    return queries
+
+
+def _same(a, b) -> bool:
+    """== with NaN cells treated as equal."""
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        for k in x:
+            vx, vy = x[k], y.get(k)
+            if vx != vy and not (pd.isna(vx) and pd.isna(vy)):
+                return False
+    return True
+
+
+def main():
+    queries = _realistic_queries(N_QUERIES)
+    catalog = TrainingCatalog(TRAININGS_EXCEL_PATH)
+
+    t0 = time.perf_counter()
+    catalog.get()
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    expected = [find_training_from_excel_pandas(*q) for q in queries]
+    old_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    got = [catalog.find(*q) for q in queries]
+    new_s = time.perf_counter() - t0
+
+    mismatches = sum(not _same(a, b) for a, b in zip(expected, got))
+    hits = sum(bool(r) for r in got)
+
+    print(f"{N_QUERIES} queries ({hits} with results), mismatches: {mismatches}")
+    print(f"catalog build (once per process / file change): {build_s * 1000:.0f} ms")
+    print(f"pandas per request : {old_s / N_QUERIES * 1000:.2f} ms / query")
+    print(f"indexed catalog    : {new_s / N_QUERIES * 1000:.4f} ms / query  ({old_s / new_s:,.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
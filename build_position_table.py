@@ -0,0 +1,83 @@
+"""
+Offline build step for position_table.npz (see position_table.PositionTable).
+
+    python build_position_table.py
+
+Run it after every retrain (python ml_model.py); a table built from another
+model version is ignored at startup and the app falls back to the live model.
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import ml_model
+from forest_engine import CompiledForest
+from position_table import PositionTable
+
+# pinned by map_form_to_model_features (not in the UI yet)
+FIXED_FEATURES = {"FK Accuracy": 5.0, "Long shots": 5.0}
+GRID_MIN, GRID_MAX = 1, 10
+TOP_K = 3
+N_CHECK = 2000
+
+
+def _per_call_ms(fn, rows):
+    fn(rows[0])
+    t0 = time.perf_counter()
+    for r in rows:
+        fn(r)
+    return (time.perf_counter() - t0) / len(rows) * 1000.0
+
+
+def main():
+    model = ml_model.get_position_model()
+    if model is None:
+        print("No position model available.")
+        return
+    rf = model.named_steps["rf"]
+
+    t0 = time.perf_counter()
+    table = PositionTable.build(
+        rf,
+        ml_model.FEATURE_COLS,
+        FIXED_FEATURES,
+        grid_min=GRID_MIN,
+        grid_max=GRID_MAX,
+        model_version=ml_model.get_model_version(),
+    )
+    build_s = time.perf_counter() - t0
+    table.save(ml_model.POSITION_TABLE_PATH)
+
+    # exactness check on random grid points
+    rng = np.random.default_rng(0)
+    X = rng.integers(GRID_MIN, GRID_MAX + 1, size=(N_CHECK, len(ml_model.FEATURE_COLS))).astype(float)
+    for col, v in FIXED_FEATURES.items():
+        X[:, ml_model.FEATURE_COLS.index(col)] = v
+    expected = model.predict_proba(pd.DataFrame(X, columns=ml_model.FEATURE_COLS))
+    max_diff = float(np.abs(table.predict_proba(X) - expected).max())
+
+    # size / latency tradeoffs
+    n_free = len(ml_model.FEATURE_COLS) - len(FIXED_FEATURES)
+    n_cells = (GRID_MAX - GRID_MIN + 1) ** n_free
+    dense_bytes = n_cells * TOP_K * 3  # uint8 class + float16 prob per rank
+    compiled = CompiledForest.from_sklearn(rf)
+    rows = X[:300, None, :]
+
+    sk_ms = _per_call_ms(lambda x: model.predict_proba(pd.DataFrame(x, columns=ml_model.FEATURE_COLS)), rows)
+    cf_ms = _per_call_ms(compiled.predict_proba, rows)
+    tb_ms = _per_call_ms(table.predict_proba, rows)
+
+    print(f"grid cells ({n_free} free features × {GRID_MAX - GRID_MIN + 1} values): {n_cells:.2e}")
+    print(f"dense top-{TOP_K} table        : {dense_bytes / 1e9:,.0f} GB (not built)")
+    print(f"joblib artifact            : {os.path.getsize(ml_model.MODEL_PATH) / 1e6:.1f} MB, "
+          f"{len(compiled.feature)} nodes, {sk_ms:.3f} ms/call (sklearn), {cf_ms:.3f} ms/call (compiled)")
+    print(f"position table             : {os.path.getsize(ml_model.POSITION_TABLE_PATH) / 1e6:.1f} MB, "
+          f"{table.n_nodes} nodes, depth {table.forest.max_depth}, {tb_ms:.3f} ms/call, numpy only")
+    print(f"built in {build_s:.1f}s, max |diff| vs live model on {N_CHECK} grid points: {max_diff:.1e}")
+    print("✅ Saved:", ml_model.POSITION_TABLE_PATH, "version", table.model_version)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Token accounting and context window for /chat.
+
+Every request gets a prompt token budget. Once the not-yet-summarized part of a
+transcript grows past CHAT_SUMMARY_TRIGGER_TOKENS, the older turns are folded
+into a running summary (the caller stores it next to the transcript, after the
+answer went out) and only the most recent turns are sent verbatim.
+
+Uses tiktoken when it is installed; otherwise ~4 characters per token, which is
+close enough for budgeting German/English chat text.
+"""
+import math
+import os
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+# every chat message costs a few tokens on top of its content (role, separators),
+# and the reply is primed with a few more
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+# whole prompt per /chat request: system prompt + summary + history + question
+CHAT_PROMPT_TOKEN_BUDGET = int(os.environ.get("CHAT_PROMPT_TOKEN_BUDGET", "2000"))
+# unsummarized history above this gets folded into the running summary ...
+CHAT_SUMMARY_TRIGGER_TOKENS = int(os.environ.get("CHAT_SUMMARY_TRIGGER_TOKENS", "1200"))
+# ... keeping this much of the newest turns verbatim
+CHAT_RECENT_TOKENS = int(os.environ.get("CHAT_RECENT_TOKENS", "600"))
+
+SUMMARY_PREFIX = "Zusammenfassung des bisherigen Gesprächs: "
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")  # gpt-4o / gpt-4o-mini
+        except Exception:
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    text = text or ""
+    enc = _get_encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def prompt_tokens(messages: list) -> int:
+    return sum(message_tokens(m) for m in messages) + REPLY_PRIMING_TOKENS
+
+
+def truncate_history(messages: list, budget: int) -> list:
+    """
+    Newest messages that fit into budget tokens (oldest dropped first).
+    Starts on a user message so the model never sees an answer without its question.
+    """
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        cost = message_tokens(message)
+        if used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+
+    while kept and kept[0].get("role") != "user":
+        kept.pop(0)
+    return kept
+
+
+def split_for_summary(
+    messages: list,
+    trigger: int = CHAT_SUMMARY_TRIGGER_TOKENS,
+    keep_recent: int = CHAT_RECENT_TOKENS,
+):
+    """
+    (to_fold, recent) for the unsummarized part of a transcript.
+    to_fold is empty while the messages stay below trigger tokens; otherwise it holds
+    the older turns and recent the newest ones (whole exchanges, at most keep_recent tokens).
+    """
+    if sum(message_tokens(m) for m in messages) <= trigger:
+        return [], list(messages)
+    recent = truncate_history(messages, keep_recent)
+    return list(messages[: len(messages) - len(recent)]), recent
+
+
+def build_history(summary: str, recent: list, fixed_tokens: int, budget: int = CHAT_PROMPT_TOKEN_BUDGET) -> list:
+    """
+    History for the prompt: the running summary (as a system message) plus as many
+    recent messages as fit into budget minus fixed_tokens (system prompt + question).
+    """
+    history = []
+    if summary:
+        history.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+    remaining = budget - fixed_tokens - sum(message_tokens(m) for m in history)
+    recent = truncate_history(recent, max(remaining, 0))
+    return history + [{"role": m["role"], "content": m["content"]} for m in recent]
+
+
+# --- per-call reporting ---
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "prompt_tokens": 0, "max_prompt_tokens": 0, "summaries": 0, "last": None}
+
+
+def record_prompt_tokens(kind: str, estimated: int, reported=None, seconds=None):
+    """Log one completion call; reported = usage.prompt_tokens from the API if it sent one."""
+    tokens = reported if reported is not None else estimated
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["prompt_tokens"] += tokens
+        _stats["max_prompt_tokens"] = max(_stats["max_prompt_tokens"], tokens)
+        if kind == "summary":
+            _stats["summaries"] += 1
+        _stats["last"] = {"kind": kind, "estimated": estimated, "reported": reported,
+                          "seconds": round(seconds, 3) if seconds is not None else None}
+    took = f" in {seconds:.2f}s" if seconds is not None else ""
+    print(f"🧮 {kind} prompt tokens: ~{estimated} estimated, {reported if reported is not None else '?'} reported{took}")
+
+
+def context_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["avg_prompt_tokens"] = round(stats["prompt_tokens"] / stats["calls"], 1) if stats["calls"] else 0.0
+    stats["budget"] = CHAT_PROMPT_TOKEN_BUDGET
+    stats["summary_trigger"] = CHAT_SUMMARY_TRIGGER_TOKENS
+    stats["recent_tokens"] = CHAT_RECENT_TOKENS
+    stats["tokenizer"] = "tiktoken" if _get_encoding() is not None else "chars/4"
+    return stats
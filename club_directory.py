@@ -0,0 +1,281 @@
+import html
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from difflib import SequenceMatcher
+from typing import Optional, Tuple
+
+from data_sources import DATA_CACHE_DIR
+from fvrz_scraper import normalize_team_name
+from http_client import http_get
+
+FVRZ_CLUBS_URL = "https://www.fvrz.ch/desktopdefault.aspx/tabid-1184/"   # club list
+
+CLUB_DIRECTORY_PATH = os.path.join(DATA_CACHE_DIR, "fvrz_clubs.json")
+# the club list changes a few times per season – after the TTL only a conditional reload (304)
+CLUB_DIRECTORY_TTL = int(os.environ.get("FVRZ_CLUBS_TTL", str(24 * 3600)))
+
+# tables change at most once per matchday
+CLUB_TABLE_TTL = int(os.environ.get("FVRZ_TABLE_TTL", str(3 * 3600)))
+CLUB_TABLE_CACHE_SIZE = int(os.environ.get("FVRZ_TABLE_CACHE_SIZE", "256"))
+
+MIN_SCORE = 0.55
+# only this many candidates (by shared trigrams) are scored with SequenceMatcher
+MAX_CANDIDATES = 25
+
+# <a ... href=".../tabid-1186/v-####/" ...>CLUBNAME</a>
+_CLUB_LINK_RE = re.compile(r'href="[^"]*/tabid-1186/v-(\d+)/[^"]*".*?>([^<]+)</a>', flags=re.I | re.S)
+
+
+def _trigrams(norm: str) -> set:
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def parse_club_links(page_html: str) -> list:
+    """Club list (HTML) → [(vid, club_name), ...] in page order."""
+    raw = html.unescape(page_html)
+    return [
+        (int(vid_s), re.sub(r"\s+", " ", club_name).strip())
+        for vid_s, club_name in _CLUB_LINK_RE.findall(raw)
+    ]
+
+
+class _ClubIndex:
+    """Normalized club names + trigram index (trigram → positions in clubs)."""
+
+    def __init__(self, clubs: list):
+        self.clubs = clubs
+        self.norms = [normalize_team_name(name) for _, name in clubs]
+        postings = defaultdict(list)
+        for i, norm in enumerate(self.norms):
+            for gram in _trigrams(norm):
+                postings[gram].append(i)
+        self.postings = dict(postings)
+
+    def candidates(self, qn: str) -> list:
+        counts = defaultdict(int)
+        for gram in _trigrams(qn):
+            for i in self.postings.get(gram, ()):
+                counts[i] += 1
+        # most shared trigrams first, page order on ties
+        return sorted(counts, key=lambda i: (-counts[i], i))[:MAX_CANDIDATES]
+
+    def best_match(self, qn: str) -> Tuple[Optional[Tuple[int, str]], float]:
+        matcher = SequenceMatcher(None, qn)
+        best_i, best_score = None, 0.0
+        # score in page order → on equal scores the first club wins, as before
+        for i in sorted(self.candidates(qn)):
+            matcher.set_seq2(self.norms[i])
+            if matcher.real_quick_ratio() <= best_score or matcher.quick_ratio() <= best_score:
+                continue
+            score = matcher.ratio()
+            if score > best_score:
+                best_i, best_score = i, score
+        return (self.clubs[best_i] if best_i is not None else None), best_score
+
+
+class ClubDirectory:
+    """
+    FVRZ club list, cached in memory and on disk (CLUB_DIRECTORY_PATH).
+
+    Within the TTL FVRZ is not asked at all; afterwards the list is revalidated
+    with If-None-Match / If-Modified-Since (304 → only the timestamp is renewed).
+    While one thread revalidates, the others keep searching the current list.
+    If FVRZ is unreachable, the last known list stays in use.
+    """
+
+    def __init__(self, url: str = FVRZ_CLUBS_URL, path: str = CLUB_DIRECTORY_PATH, ttl: int = CLUB_DIRECTORY_TTL):
+        self.url = url
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()  # state only, never held during an HTTP request
+        self._refresh_lock = threading.Lock()  # single flight: at most one fetch of the club list
+        self._index = None
+        self._meta = {}  # etag, last_modified, checked_at, fetched_at
+        self._stats = {"fetches": 0, "not_modified": 0, "errors": 0, "lookups": 0}
+
+    def _load_disk(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            clubs = [(int(vid), name) for vid, name in data["clubs"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        self._index = _ClubIndex(clubs)
+        self._meta = {k: data.get(k) for k in ("etag", "last_modified", "checked_at", "fetched_at")}
+
+    def _save_disk(self, data: dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not write {self.path}: {e!r}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _revalidate(self):
+        """Call with self._refresh_lock held; the HTTP request runs without self._lock."""
+        with self._lock:
+            index, meta = self._index, dict(self._meta)
+
+        headers = {}
+        if index is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            r = http_get(self.url, headers=headers)
+            if r.status_code == 304 and index is not None:
+                stat = "not_modified"
+            else:
+                r.raise_for_status()
+                clubs = parse_club_links(r.text)
+                if not clubs:
+                    raise ValueError("no club links found")
+                index = _ClubIndex(clubs)
+                meta["etag"] = r.headers.get("ETag")
+                meta["last_modified"] = r.headers.get("Last-Modified")
+                meta["fetched_at"] = time.time()
+                stat = "fetches"
+                print("FVRZ club links found:", len(clubs))
+        except Exception as e:
+            stat = "errors"
+            print("FVRZ clubs ERROR:", repr(e))
+            if index is None:
+                with self._lock:
+                    self._stats[stat] += 1
+                return
+        # after an error too: do not hit FVRZ again on every search
+        meta["checked_at"] = time.time()
+        with self._lock:
+            self._index, self._meta = index, meta
+            self._stats[stat] += 1
+            data = dict(meta, clubs=index.clubs)
+        self._save_disk(data)
+
+    def _stale(self) -> bool:
+        return self._index is None or time.time() - (self._meta.get("checked_at") or 0) >= self.ttl
+
+    def _current_index(self) -> Optional[_ClubIndex]:
+        with self._lock:
+            if self._index is None:
+                self._load_disk()
+            if not self._stale():
+                return self._index
+            index = self._index
+
+        if index is not None:
+            # expired: one thread revalidates, all others search the known list meanwhile
+            if not self._refresh_lock.acquire(blocking=False):
+                return index
+        else:
+            # no list at all yet: wait until the first fetch is done
+            self._refresh_lock.acquire()
+        try:
+            with self._lock:
+                stale = self._stale()  # possibly renewed by another thread already
+            if stale:
+                self._revalidate()
+            with self._lock:
+                return self._index
+        finally:
+            self._refresh_lock.release()
+
+    def lookup(self, query: str) -> Optional[Tuple[int, str]]:
+        """Return (vid, club_name) of the best matching club, or None."""
+        qn = normalize_team_name(query)
+        print("FVRZ qn:", qn)
+        if not qn:
+            return None
+
+        index = self._current_index()
+        if index is None:
+            return None
+
+        with self._lock:
+            self._stats["lookups"] += 1
+        best, best_score = index.best_match(qn)
+        print("FVRZ best:", best, "score:", best_score)
+        return best if best and best_score >= MIN_SCORE else None
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "clubs": len(self._index.clubs) if self._index else 0,
+                "ttl": self.ttl,
+                "age_seconds": (time.time() - self._meta["fetched_at"]) if self._meta.get("fetched_at") else None,
+                "etag": self._meta.get("etag"),
+                "last_modified": self._meta.get("last_modified"),
+                **self._stats,
+            }
+
+
+class ClubTableCache:
+    """
+    Bounded LRU with TTL: club vid → already extracted matchcenter table rows.
+    Coaches of the same league look up the same opponents within minutes.
+    """
+
+    def __init__(self, ttl: int = CLUB_TABLE_TTL, maxsize: int = CLUB_TABLE_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # vid -> (fetched_at, rows)
+        self._lock = threading.Lock()
+
+    def get(self, vid: int):
+        """(rows, age_seconds) or None if missing/expired."""
+        with self._lock:
+            entry = self._data.get(vid)
+            if entry is not None and time.time() - entry[0] >= self.ttl:
+                del self._data[vid]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(vid)
+            self.hits += 1
+            return entry[1], time.time() - entry[0]
+
+    def put(self, vid: int, rows: list):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[vid] = (time.time(), rows)
+            self._data.move_to_end(vid)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+club_directory = ClubDirectory()
+club_table_cache = ClubTableCache()
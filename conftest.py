@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# app creates/migrates trainer.db (and the outbox/cache files) in DATA_DIR on import:
+# tests get a throwaway directory instead of the real data
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="trainer-test-")
@@ -1,5 +1,5 @@
-from app import app, db
+from app import app, migrate_db
 
 with app.app_context():
-    db.create_all()
+    migrate_db()
     print("Database created.")
@@ -0,0 +1,236 @@
+"""
+Fast binary copies of the Excel data sources.
+
+    python data_sources.py        # build step: convert all sources + write manifest
+
+pd.read_excel (openpyxl) is by far the slowest part of startup and retraining.
+The build step stores every workbook as .npz (all-numeric/string tables, no pickle)
+or as pandas pickle (anything else) in DATA_CACHE_DIR, together with a manifest
+of source hashes. read_table() prefers the binary copy and only falls back to
+Excel when the source changed after the conversion (or the copy is unreadable);
+it then rewrites the copy, so only the first read after a change pays for Excel.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DATA_CACHE_DIR = os.environ.get("DATA_CACHE_DIR", "data_cache")
+MANIFEST_PATH = os.path.join(DATA_CACHE_DIR, "manifest.json")
+
+EXCEL_SOURCES = [
+    "trainings.xlsx",
+    "trainings_videos.xlsx",
+    "formation_attributes_cleaned.xlsx",
+    "formation_attributes_numeric.xlsx",
+]
+
+_manifest = None
+_manifest_mtime = None
+_fresh_cache = {}  # (source, mtime_ns, size) -> bool
+_lock = threading.Lock()
+_write_lock = threading.Lock()  # manifest read-modify-write
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_write(path: str, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _npz_compatible(df: pd.DataFrame) -> bool:
+    """npz keeps numeric columns and pure-string columns exactly; everything else → pickle."""
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object:
+            if not s.map(lambda v: isinstance(v, str)).all():
+                return False
+        elif s.dtype.kind not in "biuf":
+            return False
+    return True
+
+
+def _write_npz(df: pd.DataFrame, path: str):
+    arrays = {"__columns__": np.asarray([str(c) for c in df.columns])}
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        arrays[f"c{i}"] = s.to_numpy(dtype=str) if s.dtype == object else s.to_numpy()
+
+    # np.savez appends .npz to names without it
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+
+    _atomic_write(path, write)
+
+
+def _read_npz(path: str) -> pd.DataFrame:
+    with np.load(path, allow_pickle=False) as data:
+        columns = data["__columns__"].tolist()
+        cols = {}
+        for i, col in enumerate(columns):
+            a = data[f"c{i}"]
+            cols[col] = a.astype(object) if a.dtype.kind == "U" else a
+    return pd.DataFrame(cols, columns=columns)
+
+
+def _binary_path(source: str, fmt: str) -> str:
+    base = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(DATA_CACHE_DIR, f"{base}.{fmt}")
+
+
+def convert_source(source: str, manifest: dict | None = None, df: pd.DataFrame | None = None) -> dict:
+    """
+    Excel → binary copy. Returns the manifest entry (also stored if manifest is given).
+    df: the already loaded sheet, saves reading the Excel file a second time.
+    """
+    if df is None:
+        df = pd.read_excel(source)
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+
+    if _npz_compatible(df):
+        fmt = "npz"
+        binary = _binary_path(source, fmt)
+        _write_npz(df, binary)
+    else:
+        fmt = "pkl"
+        binary = _binary_path(source, fmt)
+        _atomic_write(binary, df.to_pickle)
+
+    st = os.stat(source)
+    entry = {
+        "sha256": _sha256_file(source),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "binary": binary,
+        "format": fmt,
+        "rows": int(len(df)),
+        "converted_at": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+    if manifest is not None:
+        manifest.setdefault("sources", {})[source] = entry
+    return entry
+
+
+def _write_manifest(manifest: dict):
+    global _manifest, _manifest_mtime
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    _atomic_write(MANIFEST_PATH, write)
+    with _lock:
+        _manifest = None
+        _manifest_mtime = None
+        _fresh_cache.clear()
+
+
+def load_manifest() -> dict:
+    global _manifest, _manifest_mtime
+    try:
+        mtime = os.stat(MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return {}
+
+    with _lock:
+        if _manifest is None or mtime != _manifest_mtime:
+            try:
+                with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                    _manifest = json.load(f)
+            except (OSError, ValueError):
+                _manifest = {}
+            _manifest_mtime = mtime
+            _fresh_cache.clear()
+        return _manifest
+
+
+def convert_all(sources=None) -> dict:
+    with _write_lock:
+        manifest = dict(load_manifest()) or {"sources": {}}
+        manifest["sources"] = dict(manifest.get("sources", {}))
+        for source in sources or EXCEL_SOURCES:
+            if not os.path.exists(source):
+                print(f"⚠️ {source} not found – skipped")
+                continue
+            entry = convert_source(source, manifest)
+            print(f"✅ {source} → {entry['binary']} ({entry['rows']} rows)")
+        _write_manifest(manifest)
+    return manifest
+
+
+def refresh_source(source: str):
+    """Re-convert a single source after it was rewritten (e.g. by prepare_data.py)."""
+    convert_all([source])
+
+
+def _binary_is_fresh(source: str, entry: dict) -> bool:
+    if not entry or not os.path.exists(entry.get("binary", "")):
+        return False
+    try:
+        st = os.stat(source)
+    except OSError:
+        # no Excel on this host → the binary copy is all we have
+        return True
+
+    if st.st_mtime_ns == entry.get("mtime_ns") and st.st_size == entry.get("size"):
+        return True
+
+    # mtime changes on every checkout/deploy – compare the content hash once per (mtime, size)
+    key = (source, st.st_mtime_ns, st.st_size)
+    fresh = _fresh_cache.get(key)
+    if fresh is None:
+        fresh = st.st_size == entry.get("size") and _sha256_file(source) == entry.get("sha256")
+        _fresh_cache[key] = fresh
+    return fresh
+
+
+def read_table(source: str) -> pd.DataFrame:
+    """pd.read_excel(source), served from the binary copy whenever it is up to date."""
+    entry = load_manifest().get("sources", {}).get(source)
+    if _binary_is_fresh(source, entry):
+        try:
+            if entry["format"] == "npz":
+                return _read_npz(entry["binary"])
+            return pd.read_pickle(entry["binary"])
+        except Exception as e:
+            print(f"⚠️ Binary copy of {source} unreadable ({e!r}) – reading Excel")
+
+    df = pd.read_excel(source)
+    if entry:
+        # a source of the build step: bring its copy up to date (read-only deploys just keep reading Excel)
+        try:
+            with _write_lock:
+                manifest = dict(load_manifest()) or {"sources": {}}
+                manifest["sources"] = dict(manifest.get("sources", {}))
+                convert_source(source, manifest, df=df)
+                _write_manifest(manifest)
+            print(f"✅ Binary copy of {source} rewritten")
+        except Exception as e:
+            print(f"⚠️ Could not rewrite the binary copy of {source}: {e!r}")
+    return df
+
+
+if __name__ == "__main__":
+    convert_all()
@@ -0,0 +1,84 @@
+"""
+SQLite settings for trainer.db (and the small SQLite stores next to it).
+
+Every new connection gets the PRAGMAs below through a SQLAlchemy "connect" event:
+
+- journal_mode=WAL: readers no longer wait for a writer (and vice versa); only
+  writers are serialized.
+- synchronous=NORMAL: with WAL a commit no longer waits for fsync; a power loss
+  can cost the last commits but never corrupts the file.
+- busy_timeout: a writer waits for the lock instead of failing with
+  "database is locked" right away.
+- cache_size / mmap_size / temp_store: more pages in memory, reads via mmap,
+  temp tables and sorts in RAM.
+
+The pool keeps one connection per thread that can touch the DB (web threads
+plus background workers), so requests do not queue for a connection.
+"""
+import os
+
+from sqlalchemy import event
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(32 * 1024)))  # per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+
+# web threads (gunicorn --threads) + background executors (opponent lookups, backfill, outbox)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def sqlite_pragmas() -> list:
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",  # negative = KiB
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA temp_store={SQLITE_TEMP_STORE}",
+    ]
+
+
+def apply_sqlite_pragmas(dbapi_connection):
+    """Run the PRAGMAs on a raw sqlite3 connection (also used by response_cache / email_outbox)."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def sqlite_engine_options() -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for a file-based SQLite database used from several threads."""
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "connect_args": {
+            # pysqlite's own lock wait, same value as busy_timeout
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            # pooled connections move between threads (one thread at a time)
+            "check_same_thread": False,
+        },
+    }
+
+
+def install_sqlite_tuning(engine):
+    """Attach the PRAGMAs to engine's "connect" event (no-op for other databases)."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection)
+
+
+def sqlite_settings(connection) -> dict:
+    """Current PRAGMA values on a SQLAlchemy connection (for /_debug/db)."""
+    names = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store")
+    return {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
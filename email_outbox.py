@@ -0,0 +1,354 @@
+"""
+Persistent email outbox.
+
+Web handlers only insert a row (enqueue) and return; a background worker drains
+the table through Mandrill:
+
+- idempotency: every row has a unique key, enqueueing the same key twice is a no-op,
+  and a row is claimed by exactly one worker before it is sent;
+- retries: ApiClientError (Mandrill answered with an error) and connect errors (no
+  connection, so the request never left) put the row back with exponential backoff,
+  up to EMAIL_OUTBOX_MAX_ATTEMPTS; other errors (read timeouts, connections dropped
+  after the request went out) may have delivered the mail, so those rows are marked
+  "unknown" instead of being sent again;
+- retention: once a row is done (sent/failed/unknown) its merge_vars are cleared, so
+  reset links are not kept in plaintext, and done rows older than
+  EMAIL_OUTBOX_KEEP_DAYS are deleted;
+- batching: due rows with the same content (subject/text/html or template) go out in
+  one messages/send(-template) call, preserve_recipients=False and per-recipient
+  merge_vars, so every coach still gets a personal mail.
+"""
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+import requests
+import urllib3.exceptions
+from mailchimp_transactional.api_client import ApiClientError
+
+from db_tuning import apply_sqlite_pragmas
+from email_utils import mail_configured, send_batch
+
+EMAIL_OUTBOX_PATH = os.environ.get(
+    "EMAIL_OUTBOX_PATH",
+    os.path.join(os.environ.get("DATA_DIR", "/tmp"), "email_outbox.db"),
+)
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+EMAIL_OUTBOX_BACKOFF = float(os.environ.get("EMAIL_OUTBOX_BACKOFF", "30"))  # seconds, doubled per attempt
+EMAIL_OUTBOX_BACKOFF_MAX = float(os.environ.get("EMAIL_OUTBOX_BACKOFF_MAX", "3600"))
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", "50"))  # recipients per API call
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get("EMAIL_OUTBOX_POLL_INTERVAL", "5"))
+# a row still "sending" after this long belongs to a worker that died mid-call
+EMAIL_OUTBOX_CLAIM_TIMEOUT = float(os.environ.get("EMAIL_OUTBOX_CLAIM_TIMEOUT", "600"))
+EMAIL_OUTBOX_KEEP_DAYS = float(os.environ.get("EMAIL_OUTBOX_KEEP_DAYS", "30"))
+EMAIL_OUTBOX_PRUNE_INTERVAL = 3600.0  # seconds between deletes of old rows
+
+_COLUMNS = (
+    "id, idempotency_key, to_email, template_name, subject, body_text, body_html, merge_vars, batch_key, attempts"
+)
+DELIVERED = ("sent", "queued", "scheduled")
+DONE = ("sent", "failed", "unknown")
+
+
+def request_not_sent(exc: Exception) -> bool:
+    """True if the call failed before a connection existed (DNS, refused, connect timeout)."""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(exc, requests.exceptions.ConnectionError) and exc.args:
+        reason = getattr(exc.args[0], "reason", exc.args[0])  # MaxRetryError wraps the urllib3 error
+        # NewConnectionError / NameResolutionError are ConnectTimeoutError subclasses;
+        # ProtocolError ("Connection aborted") comes after sending and stays ambiguous
+        return isinstance(reason, urllib3.exceptions.ConnectTimeoutError)
+    return False
+
+
+def backoff_delay(attempts: int) -> float:
+    """Wait before attempt attempts+1: base * 2^(attempts-1), capped, ±20 % jitter."""
+    delay = min(EMAIL_OUTBOX_BACKOFF_MAX, EMAIL_OUTBOX_BACKOFF * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class EmailOutbox:
+    def __init__(
+        self,
+        path: str = EMAIL_OUTBOX_PATH,
+        sender: Callable[..., list] = send_batch,
+        is_configured: Callable[[], bool] = mail_configured,
+        batch_size: int = EMAIL_OUTBOX_BATCH_SIZE,
+    ):
+        self.path = path
+        self.sender = sender
+        self.is_configured = is_configured
+        self.batch_size = batch_size
+        self.api_calls = 0
+        self.sent = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pruned_at = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            apply_sqlite_pragmas(conn)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS email_outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " idempotency_key TEXT NOT NULL UNIQUE,"
+                " to_email TEXT NOT NULL,"
+                " template_name TEXT,"  # NULL: plain message with subject/body_text/body_html
+                " subject TEXT,"
+                " body_text TEXT,"
+                " body_html TEXT,"
+                " merge_vars TEXT NOT NULL,"
+                " batch_key TEXT NOT NULL,"
+                " status TEXT NOT NULL DEFAULT 'pending',"  # pending/sending/sent/failed/unknown
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL,"
+                " claim TEXT,"
+                " claimed_at REAL,"
+                " last_error TEXT,"
+                " provider_id TEXT,"
+                " created_at REAL NOT NULL,"
+                " sent_at REAL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_email_outbox_due ON email_outbox (status, next_attempt_at)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    # --- producer side (web handlers) ---
+
+    def enqueue(
+        self,
+        to_address: str,
+        subject: Optional[str] = None,
+        body_text: Optional[str] = None,
+        body_html: Optional[str] = None,
+        template_name: Optional[str] = None,
+        merge_vars: Optional[dict] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Queue one mail and return its idempotency key (None without recipient).
+        Content may use handlebars merge tags ({{name}}) filled from merge_vars, which
+        keeps identical content batchable. Without a key, the content itself is the key.
+        """
+        to_address = (to_address or "").strip()
+        if not to_address:
+            print("No recipient address")
+            return None
+
+        merge_vars = {k: "" if v is None else str(v) for k, v in (merge_vars or {}).items()}
+        content = json.dumps([template_name, subject, body_text, body_html], ensure_ascii=False)
+        batch_key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if not idempotency_key:
+            raw = json.dumps([to_address.lower(), content, sorted(merge_vars.items())], ensure_ascii=False)
+            idempotency_key = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO email_outbox (idempotency_key, to_email, template_name, subject, body_text,"
+                " body_html, merge_vars, batch_key, next_attempt_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (idempotency_key, to_address, template_name, subject, body_text, body_html,
+                 json.dumps(merge_vars), batch_key, now, now),
+            )
+        self._wake.set()
+        return idempotency_key
+
+    # --- worker side ---
+
+    def _claim(self, limit: int) -> list:
+        claim = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            # one statement, so two workers never claim the same row
+            conn.execute(
+                "UPDATE email_outbox SET status = 'sending', claim = ?, claimed_at = ?"
+                " WHERE id IN (SELECT id FROM email_outbox WHERE status = 'pending' AND next_attempt_at <= ?"
+                " ORDER BY id LIMIT ?)",
+                (claim, now, now, limit),
+            )
+        cols = [c.strip() for c in _COLUMNS.split(",")]
+        rows = conn.execute(f"SELECT {_COLUMNS} FROM email_outbox WHERE claim = ? ORDER BY id", (claim,)).fetchall()
+        return [dict(zip(cols, row)) for row in rows]
+
+    def _chunks(self, rows: list) -> list:
+        """Same content → one call; every address at most once per call (merge_vars are per address)."""
+        groups = {}
+        for row in rows:
+            chunks = groups.setdefault(row["batch_key"], [[]])
+            for chunk in chunks:
+                if len(chunk) < self.batch_size and all(r["to_email"].lower() != row["to_email"].lower() for r in chunk):
+                    chunk.append(row)
+                    break
+            else:
+                chunks.append([row])
+        return [chunk for chunks in groups.values() for chunk in chunks]
+
+    @staticmethod
+    def _message(chunk: list) -> dict:
+        first = chunk[0]
+        message = {
+            "to": [{"email": r["to_email"], "type": "to"} for r in chunk],
+            "preserve_recipients": False,
+            "merge_language": "handlebars",
+            "merge_vars": [
+                {"rcpt": r["to_email"], "vars": [{"name": k, "content": v} for k, v in json.loads(r["merge_vars"]).items()]}
+                for r in chunk
+            ],
+            "recipient_metadata": [{"rcpt": r["to_email"], "values": {"outbox_key": r["idempotency_key"]}} for r in chunk],
+        }
+        if first["subject"]:
+            message["subject"] = first["subject"]
+        if not first["template_name"]:
+            message["text"] = first["body_text"] or ""
+            message["html"] = first["body_html"] or first["body_text"] or ""
+        return message
+
+    def _finish(self, row_id: int, status: str, error: Optional[str] = None, provider_id: Optional[str] = None):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE email_outbox SET status = ?, last_error = ?, provider_id = ?, claim = NULL, merge_vars = '{}',"
+                " sent_at = CASE WHEN ? = 'sent' THEN ? ELSE sent_at END WHERE id = ?",
+                (status, error, provider_id, status, time.time(), row_id),
+            )
+
+    def _retry_later(self, row: dict, error: str):
+        attempts = row["attempts"] + 1
+        conn = self._conn()
+        with conn:
+            if attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+                conn.execute(
+                    "UPDATE email_outbox SET status = 'failed', attempts = ?, last_error = ?, claim = NULL,"
+                    " merge_vars = '{}' WHERE id = ?",
+                    (attempts, error, row["id"]),
+                )
+            else:
+                conn.execute(
+                    "UPDATE email_outbox SET status = 'pending', attempts = ?, last_error = ?, claim = NULL,"
+                    " next_attempt_at = ? WHERE id = ?",
+                    (attempts, error, time.time() + backoff_delay(attempts), row["id"]),
+                )
+
+    def _send_chunk(self, chunk: list):
+        first = chunk[0]
+        with self._lock:
+            self.api_calls += 1
+        try:
+            results = self.sender(self._message(chunk), template_name=first["template_name"])
+        except ApiClientError as e:
+            # Mandrill answered with an error: nothing went out, safe to try again
+            print(f"📧 Mandrill API error for {len(chunk)} mail(s), will retry:", e.text)
+            for row in chunk:
+                self._retry_later(row, str(e.text)[:500])
+            return
+        except Exception as e:
+            if request_not_sent(e):
+                # no connection to Mandrill: the request never left, same as an API error
+                print(f"📧 Mandrill unreachable for {len(chunk)} mail(s), will retry:", repr(e))
+                for row in chunk:
+                    self._retry_later(row, repr(e)[:500])
+                return
+            # no answer: the mail may have been delivered, so no automatic resend
+            print(f"📧 Mandrill call failed for {len(chunk)} mail(s), not retried:", repr(e))
+            for row in chunk:
+                self._finish(row["id"], "unknown", repr(e)[:500])
+            return
+
+        by_email = {str(r.get("email", "")).lower(): r for r in (results or []) if isinstance(r, dict)}
+        for row in chunk:
+            result = by_email.get(row["to_email"].lower())
+            if result is None:
+                self._finish(row["id"], "unknown", "no result for recipient")
+            elif result.get("status") in DELIVERED:
+                self._finish(row["id"], "sent", provider_id=result.get("_id"))
+                with self._lock:
+                    self.sent += 1
+            else:
+                self._finish(row["id"], "failed", f"{result.get('status')}: {result.get('reject_reason')}",
+                             provider_id=result.get("_id"))
+
+    def _expire_stale_claims(self):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE email_outbox SET status = 'unknown', last_error = 'worker stopped while sending', claim = NULL,"
+                " merge_vars = '{}' WHERE status = 'sending' AND claimed_at < ?",
+                (time.time() - EMAIL_OUTBOX_CLAIM_TIMEOUT,),
+            )
+
+    def prune(self, keep_days: Optional[float] = None) -> int:
+        """Delete done rows older than keep_days (their idempotency keys can be reused after that)."""
+        keep_days = EMAIL_OUTBOX_KEEP_DAYS if keep_days is None else keep_days
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                f"DELETE FROM email_outbox WHERE status IN ({', '.join('?' * len(DONE))}) AND created_at < ?",
+                (*DONE, time.time() - keep_days * 86400),
+            )
+        self._pruned_at = time.time()
+        return cur.rowcount
+
+    def drain(self) -> int:
+        """Send everything that is due; returns the number of rows handled."""
+        if not self.is_configured():
+            return 0
+        self._expire_stale_claims()
+        if time.time() - self._pruned_at > EMAIL_OUTBOX_PRUNE_INTERVAL:
+            self.prune()
+        handled = 0
+        while True:
+            rows = self._claim(limit=self.batch_size * 4)
+            if not rows:
+                return handled
+            for chunk in self._chunks(rows):
+                self._send_chunk(chunk)
+            handled += len(rows)
+
+    def _run(self):
+        while True:
+            try:
+                handled = self.drain()
+                if handled:
+                    print(f"📧 Outbox: {handled} mail(s) handled")
+            except Exception as e:
+                print("📧 Outbox worker error:", repr(e))
+            self._wake.wait(timeout=EMAIL_OUTBOX_POLL_INTERVAL)
+            self._wake.clear()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+                self._thread.start()
+
+    def info(self) -> dict:
+        counts = dict(self._conn().execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status").fetchall())
+        with self._lock:
+            return {
+                "statuses": counts,
+                "api_calls": self.api_calls,
+                "sent": self.sent,
+                "mails_per_call": (self.sent / self.api_calls) if self.api_calls else 0.0,
+                "worker_alive": bool(self._thread and self._thread.is_alive()),
+            }
+
+
+email_outbox = EmailOutbox()
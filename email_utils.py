@@ -1,36 +1,94 @@
 import os
+import uuid
+
 import mailchimp_transactional as MailchimpTransactional
 from mailchimp_transactional.api_client import ApiClientError
 
 # Diese Variablen müssen in Railway / deiner .env gesetzt sein:
 # MANDRILL_API_KEY  -> dein API-Key von Mailchimp Transactional
 # MAIL_FROM_ADDRESS -> z.B. "info@noqe.ch"
+#
+# Optional:
+# EMAIL_TRANSPORT   -> "mandrill" (Standard) oder "log" (nur ausgeben, nichts senden)
+# MANDRILL_API_URL  -> anderer API-Host, z.B. der lokale Stub (mandrill_stub.py) für Lasttests
 
 MANDRILL_API_KEY = os.environ.get("MANDRILL_API_KEY")
 MAIL_FROM_ADDRESS = os.environ.get("MAIL_FROM_ADDRESS", "info@noqe.ch")
+EMAIL_TRANSPORT = os.environ.get("EMAIL_TRANSPORT", "mandrill")
+MANDRILL_API_URL = os.environ.get("MANDRILL_API_URL")  # default: https://mandrillapp.com/api/1.3
 
-MANDRILL_API_KEY = os.environ.get("MANDRILL_API_KEY")
-MAIL_FROM_ADDRESS = os.environ.get("MAIL_FROM_ADDRESS", "info@noqe.ch")
 
+class MandrillTransport:
+    """Mailchimp Transactional SDK; api_url zeigt optional auf einen anderen Host (Stub)."""
+
+    name = "mandrill"
+
+    def __init__(self, api_key: str, api_url: str | None = None):
+        self.client = MailchimpTransactional.Client(api_key)
+        if api_url:
+            self.client.api_client.host = api_url.rstrip("/")
+
+    def send(self, message: dict) -> list:
+        return self.client.messages.send({"message": message})
+
+    def send_template(self, template_name: str, message: dict) -> list:
+        return self.client.messages.send_template(
+            {"template_name": template_name, "template_content": [], "message": message}
+        )
+
+
+class LogTransport:
+    """Sendet nichts, gibt die Mail nur aus (lokale Entwicklung ohne API-Key)."""
+
+    name = "log"
+
+    def _results(self, message: dict) -> list:
+        return [
+            {"email": to["email"], "status": "sent", "_id": uuid.uuid4().hex, "reject_reason": None}
+            for to in message.get("to", [])
+        ]
+
+    def send(self, message: dict) -> list:
+        print("📧 [log transport]", message.get("subject"), "->", [to["email"] for to in message.get("to", [])])
+        return self._results(message)
 
-_client = None
+    def send_template(self, template_name: str, message: dict) -> list:
+        print("📧 [log transport] template", template_name, "->", [to["email"] for to in message.get("to", [])])
+        return self._results(message)
 
 
-def _get_client():
-    """Gibt einen initialisierten Mandrill-Client zurück oder None, wenn kein API-Key gesetzt ist."""
-    global _client
-    if _client is None and MANDRILL_API_KEY:
-        _client = MailchimpTransactional.Client(MANDRILL_API_KEY)
-    return _client
+_transport = None
+
+
+def _build_transport():
+    if EMAIL_TRANSPORT == "log":
+        return LogTransport()
+    if MANDRILL_API_KEY:
+        return MandrillTransport(MANDRILL_API_KEY, MANDRILL_API_URL)
+    return None
+
+
+def get_transport():
+    """Aktiver Transport oder None, wenn kein API-Key gesetzt ist."""
+    global _transport
+    if _transport is None:
+        _transport = _build_transport()
+    return _transport
+
+
+def set_transport(transport):
+    """Transport austauschen (Tests, Benchmarks); None = wieder aus der Umgebung aufbauen."""
+    global _transport
+    _transport = transport
 
 
 def send_email(to_address: str, subject: str, body_text: str, body_html: str | None = None) -> bool:
     """
     Einfache E-Mail über Mandrill senden (ohne Template).
-    Wird von /test-email und vom Passwort-Reset verwendet.
+    Wird von /test-email verwendet (Registrierung und Passwort-Reset gehen über die Outbox).
     """
-    client = _get_client()
-    if not client:
+    transport = get_transport()
+    if not transport:
         print("Mandrill client not configured (MANDRILL_API_KEY missing)")
         return False
 
@@ -52,7 +110,7 @@ def send_email(to_address: str, subject: str, body_text: str, body_html: str | N
     }
 
     try:
-        result = client.messages.send({"message": message})
+        result = transport.send(message)
         print("Email sent:", result)
         return True
     except ApiClientError as e:
@@ -71,8 +129,8 @@ def send_email_template(
     'template_name' muss in Mandrill existieren (z.B. 'registration_welcome').
     merge_vars: {"name": "Max", "email": "..."} etc.
     """
-    client = _get_client()
-    if not client:
+    transport = get_transport()
+    if not transport:
         print("Mandrill client not configured (MANDRILL_API_KEY missing)")
         return False
 
@@ -101,15 +159,28 @@ def send_email_template(
         message["subject"] = subject
 
     try:
-        result = client.messages.send_template(
-            {
-                "template_name": template_name,
-                "template_content": [],
-                "message": message,
-            }
-        )
+        result = transport.send_template(template_name, message)
         print("Template email sent:", result)
         return True
     except ApiClientError as e:
         print("Mandrill API error in send_email_template:", e.text)
         return False
+
+
+def mail_configured() -> bool:
+    return bool(get_transport() and MAIL_FROM_ADDRESS)
+
+
+def send_batch(message: dict, template_name: str | None = None) -> list:
+    """
+    Ein vorbereitetes Mandrill-"message"-Objekt senden (für die Outbox, auch mit mehreren Empfängern).
+    Gibt Mandrills Resultat pro Empfänger zurück; Fehler (ApiClientError) werden nicht abgefangen.
+    """
+    transport = get_transport()
+    if not transport or not MAIL_FROM_ADDRESS:
+        raise RuntimeError("Mandrill client not configured (MANDRILL_API_KEY / MAIL_FROM_ADDRESS missing)")
+
+    message = {"from_email": MAIL_FROM_ADDRESS, "from_name": "Noqe", **message}
+    if template_name:
+        return transport.send_template(template_name, message)
+    return transport.send(message)
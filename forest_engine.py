@@ -0,0 +1,124 @@
+import json
+
+import numpy as np
+
+
+class CompiledForest:
+    """
+    A fitted RandomForestClassifier flattened into contiguous NumPy arrays.
+
+    All trees live in one node table (feature, threshold, left, right).
+    Leaves point to themselves, so walking max_depth steps lands every tree
+    on its leaf without per-tree Python loops. Only NumPy is needed to evaluate,
+    which skips sklearn's input validation, DataFrame handling and thread pool.
+    """
+
+    def __init__(self, feature, threshold, left, right, leaf_index, leaf_values, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_index = leaf_index
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+
+    @classmethod
+    def from_sklearn(cls, rf) -> "CompiledForest":
+        features, thresholds, lefts, rights, leaf_idx, leaf_vals, roots = [], [], [], [], [], [], []
+        offset = 0
+        n_leaves = 0
+        max_depth = 0
+
+        for est in rf.estimators_:
+            t = est.tree_
+            n = t.node_count
+            is_leaf = t.children_left == -1
+            own = np.arange(offset, offset + n, dtype=np.int32)
+
+            features.append(np.where(is_leaf, 0, t.feature).astype(np.intp))
+            thresholds.append(np.asarray(t.threshold, dtype=np.float64))
+            lefts.append(np.where(is_leaf, own, t.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, own, t.children_right + offset).astype(np.int32))
+
+            # same normalisation as DecisionTreeClassifier.predict_proba
+            values = np.asarray(t.value[is_leaf][:, 0, :], dtype=np.float64)
+            norm = values.sum(axis=1, keepdims=True)
+            norm[norm == 0.0] = 1.0
+            leaf_vals.append(values / norm)
+
+            idx = np.full(n, -1, dtype=np.int32)
+            idx[is_leaf] = np.arange(n_leaves, n_leaves + int(is_leaf.sum()), dtype=np.int32)
+            leaf_idx.append(idx)
+
+            roots.append(offset)
+            offset += n
+            n_leaves += int(is_leaf.sum())
+            max_depth = max(max_depth, t.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            left=np.ascontiguousarray(np.concatenate(lefts)),
+            right=np.ascontiguousarray(np.concatenate(rights)),
+            leaf_index=np.ascontiguousarray(np.concatenate(leaf_idx)),
+            leaf_values=np.ascontiguousarray(np.concatenate(leaf_vals)),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            classes=rf.classes_,
+        )
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def apply(self, X) -> np.ndarray:
+        """X (n_samples x n_features) → leaf node id per sample and tree (n_samples x n_trees)."""
+        # sklearn compares float32 inputs against float64 thresholds – do the same for parity
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.tile(self.roots, (X.shape[0], 1))
+
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Same result as RandomForestClassifier.predict_proba (mean of per-tree leaf distributions)."""
+        leaves = self.apply(X)
+        return self.leaf_values[self.leaf_index[leaves]].mean(axis=1)
+
+    def save(self, path: str, **meta):
+        """Plain .npz (no pickle), so loading needs NumPy only."""
+        np.savez(
+            path,
+            feature=self.feature.astype(np.min_scalar_type(int(self.feature.max(initial=0)))),
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            leaf_index=self.leaf_index,
+            leaf_values=self.leaf_values,
+            roots=self.roots,
+            max_depth=np.asarray(self.max_depth),
+            classes=np.asarray([str(c) for c in self.classes_]),
+            meta=np.asarray(json.dumps(meta)),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> tuple["CompiledForest", dict]:
+        with np.load(path, allow_pickle=False) as data:
+            forest = cls(
+                feature=data["feature"].astype(np.intp),
+                threshold=data["threshold"],
+                left=data["left"],
+                right=data["right"],
+                leaf_index=data["leaf_index"],
+                leaf_values=data["leaf_values"],
+                roots=data["roots"],
+                max_depth=int(data["max_depth"]),
+                classes=data["classes"],
+            )
+            meta = json.loads(str(data["meta"]))
+        return forest, meta
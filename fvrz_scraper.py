@@ -1,6 +1,13 @@
+import codecs
 import re
-import requests
-from bs4 import BeautifulSoup
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from io import BytesIO
+
+import lxml.html
+from lxml import etree
+
+from http_client import http_get
 
 UA = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -17,97 +24,231 @@ def _clean(s: str) -> str:
     s = re.sub(r"\s+", " ", s)
     return s
 
-def _norm_team(s: str) -> str:
-    s = _clean(s).lower()
-    s = re.sub(r"(fc|sc|sv|1\.?|erste|mannschaft|team|club)", " ", s)
-    s = re.sub(r"[^a-z0-9äöü\s\-\.\/]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+
+def normalize_team_name(name: str) -> str:
+    """The one normalizer for team/club names (directory lookup and table rows)."""
+    n = _clean(name).lower()
+    n = re.sub(r"(fc|sc|sv|erste|1\.?|mannschaft|team|club)", " ", n)
+    n = re.sub(r"[^a-z0-9äöü\s\-\.\/]", " ", n)
+    n = re.sub(r"\s+", " ", n).strip()
+    return n
+
 
 def fetch_table_from_matchcenter(v: int) -> str:
     url = f"https://matchcenter.fvrz.ch/default.aspx?lng=1&&cxxlnus=1&v={v}&bn=0"
-    s = requests.Session()
-    r = s.get(url, timeout=20, headers=UA)
+    r = http_get(url, headers=UA)
 
     r.raise_for_status()
     return r.text
 
-def parse_rank_goals_matches(html_text: str, team_query: str):
-    soup = BeautifulSoup(html_text, "lxml")
 
-    qn = _norm_team(team_query)
-    if not qn:
+# ---------------------------------------------------------------------------
+# Table extraction: page → TableRow list (parse once, match many times)
+# ---------------------------------------------------------------------------
+
+MIN_MATCH_SCORE = 0.55
+FIRST_TEAM_BONUS = 0.12
+
+_GOALS_RE = re.compile(r"(\d+)\s*:\s*(\d+)")
+_RANK_RE = re.compile(r"^\s*(\d+)\b")
+_INT_RE = re.compile(r"\d{1,3}")
+_PENALTY_RE = re.compile(r"\(\s*([+-]?\d+)\s*\)")
+_NON_NAME_RE = re.compile(r"[\d\W]+")
+_FIRST_TEAM_RE = re.compile(r"\b1\b")
+
+# pages without <table> markup: rank. team matches W D L (optional (penalty)) gf:ga
+# (team must not swallow a preceding "3. Liga ..." heading, penalty may be separated by a space)
+_TEXT_ROW_RE = re.compile(
+    r"(\d+)\.\s*"
+    r"((?:(?!\d+\.\s)[A-Za-zÄÖÜäöü0-9 \-\.\/])+?)\s+"
+    r"(\d+)\s+"
+    r"(\d+)\s+(\d+)\s+(\d+)\s*"
+    r"(?:\(\s*([+-]?\d+)\s*\))?\s*"
+    r"(\d+)\s*:\s*(\d+)"
+)
+
+
+@dataclass(frozen=True)
+class TableRow:
+    rank: int
+    team: str
+    matches: int
+    wins: int | None
+    draws: int | None
+    losses: int | None
+    goals_for: int
+    goals_against: int
+    penalty_points: int
+    team_norm: str
+
+    def as_dict(self) -> dict:
+        """Shape used by the opponent pages (name/rank/matches/goals_for/goals_against/...)."""
+        return {
+            "name": self.team,
+            "rank": self.rank,
+            "matches": self.matches,
+            "wins": self.wins,
+            "draws": self.draws,
+            "losses": self.losses,
+            "goals_for": self.goals_for,
+            "goals_against": self.goals_against,
+            "penalty_points": self.penalty_points,
+        }
+
+
+def _row_from_cells(cols: list) -> TableRow | None:
+    """
+    One table row (cleaned cell texts) → TableRow, or None if it is no ranking row:
+    rank | team | matches | W | D | L | (penalty) | goals "45 : 30" | points
+    """
+    if len(cols) < 5:
+        return None
+
+    m_rank = _RANK_RE.match(cols[0])
+    if not m_rank:
+        return None
+
+    # team name: the longest non-numeric cell
+    team_idx = max(
+        (i for i, c in enumerate(cols) if not _NON_NAME_RE.fullmatch(c) and len(c) >= 3),
+        key=lambda i: len(cols[i]),
+        default=None,
+    )
+    if team_idx is None:
         return None
+    after = cols[team_idx + 1:]
+
+    goals = next((m for m in map(_GOALS_RE.fullmatch, after) if m), None)
+    if goals is None:
+        return None
+
+    # numbers between team and goals: matches, W, D, L
+    numbers = []
+    for c in after:
+        if _GOALS_RE.fullmatch(c):
+            break
+        if _INT_RE.fullmatch(c):
+            numbers.append(int(c))
+    if not numbers or not 1 <= numbers[0] <= 60:
+        return None
+    wins, draws, losses = numbers[1:4] if len(numbers) >= 4 else (None, None, None)
+
+    penalty = next((int(m.group(1)) for m in map(_PENALTY_RE.fullmatch, after) if m), 0)
+
+    team = cols[team_idx]
+    return TableRow(
+        rank=int(m_rank.group(1)),
+        team=team,
+        matches=numbers[0],
+        wins=wins,
+        draws=draws,
+        losses=losses,
+        goals_for=int(goals.group(1)),
+        goals_against=int(goals.group(2)),
+        penalty_points=penalty,
+        team_norm=normalize_team_name(team),
+    )
+
+
+def _rows_from_text(text: str) -> list:
+    """Fallback for pages that render the ranking without <table>: regex over the visible text."""
+    root = lxml.html.document_fromstring(text)
+    for el in root.xpath("//script|//style"):
+        el.drop_tree()
+    text = _clean(" ".join(root.itertext()))
+
+    rows = []
+    for rank, team, matches, w, d, l, penalty, gf, ga in _TEXT_ROW_RE.findall(text):
+        team = _clean(team)
+        rows.append(TableRow(
+            rank=int(rank),
+            team=team,
+            matches=int(matches),
+            wins=int(w),
+            draws=int(d),
+            losses=int(l),
+            goals_for=int(gf),
+            goals_against=int(ga),
+            penalty_points=int(penalty) if penalty else 0,
+            team_norm=normalize_team_name(team),
+        ))
+    return rows
+
+
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", flags=re.I)
+
+
+def page_charset(data: bytes, encoding: str | None = None) -> str:
+    """Charset of page bytes: encoding (e.g. from the HTTP header), else the <meta> charset, else UTF-8."""
+    if not encoding:
+        m = _META_CHARSET_RE.search(data[:4096])
+        encoding = m.group(1).decode("ascii") if m else "utf-8"
+    try:
+        return codecs.lookup(encoding).name  # canonical name: libxml2 knows "iso8859-1", not "latin-1"
+    except LookupError:
+        return "utf-8"
+
+
+def parse_table_rows(html_text: str | bytes, encoding: str | None = None) -> list:
+    """
+    All ranking rows of a matchcenter page (TableRow), in page order.
+
+    Bytes are read in encoding, else in the page's <meta> charset, else as UTF-8.
+    Streams the page with lxml iterparse and only materialises <tr> elements
+    inside tables; navigation, scripts and footer are skipped. Pages without
+    table markup fall back to a regex over the visible text.
+    """
+    if isinstance(html_text, str):
+        data, charset = html_text.encode("utf-8"), "utf-8"
+    else:
+        data, charset = html_text, page_charset(html_text, encoding)
+    if not data.strip():
+        return []
+
+    rows = []
+    for _, tr in etree.iterparse(BytesIO(data), events=("end",), tag="tr", html=True, encoding=charset, recover=True):
+        if next(tr.iterancestors("table"), None) is None:
+            continue
+        cols = [_clean(" ".join(t.strip() for t in cell.itertext() if t.strip())) for cell in tr.iter("td", "th")]
+        row = _row_from_cells(cols)
+        if row is not None:
+            rows.append(row)
+        # rows of nested tables are still needed by the enclosing row
+        if next(tr.iterancestors("tr"), None) is None:
+            tr.clear(keep_tail=True)
+
+    return rows or _rows_from_text(data.decode(charset, errors="replace"))
+
+
+def score_team_row(row: TableRow, query_norm: str, club_norm: str | None = None) -> float:
+    """Name similarity; rows that look like the club's first team ("FC <club> 1") get a bonus."""
+    score = SequenceMatcher(None, query_norm, row.team_norm).ratio()
+    if club_norm and club_norm in row.team_norm and _FIRST_TEAM_RE.search(row.team):
+        score += FIRST_TEAM_BONUS
+    return score
+
+
+def find_team_row(rows: list, team_query: str, club_name: str | None = None) -> TableRow | None:
+    """Best scoring row for team_query (>= MIN_MATCH_SCORE), first row wins ties."""
+    query_norm = normalize_team_name(team_query)
+    if not query_norm:
+        return None
+    club_norm = normalize_team_name(club_name) if club_name else None
 
     best = None
     best_score = 0.0
+    for row in rows:
+        score = score_team_row(row, query_norm, club_norm)
+        if score > best_score:
+            best_score = score
+            best = row
 
-    tables = soup.find_all("table")
-    for table in tables:
-        rows = table.find_all("tr")
-        for tr in rows:
-            tds = tr.find_all(["td", "th"])
-            cols = [_clean(td.get_text(" ", strip=True)) for td in tds]
-            if len(cols) < 5:
-                continue
-
-            row_text = " ".join(cols)
-
-            # try detect patterns like:
-            # rank | team | matches | ... | goals "45 : 30"
-            m_goals = re.search(r"(\d+)\s*:\s*(\d+)", row_text)
-            if not m_goals:
-                continue
-
-            gf = int(m_goals.group(1))
-            ga = int(m_goals.group(2))
-
-            # rank = first integer in row
-            m_rank = re.match(r"^\s*(\d+)\b", cols[0])
-            if not m_rank:
-                continue
-            rank = int(m_rank.group(1))
-
-            # matches = first integer after team cell (heuristic)
-            # find any cell that is only digits and looks like match count
-            matches = None
-            for c in cols:
-                if re.fullmatch(r"\d{1,2}", c):
-                    n = int(c)
-                    if 1 <= n <= 60:
-                        matches = n
-                        break
-            if matches is None:
-                continue
-
-            # team name guess: pick the longest non-numeric cell
-            team_name = max(
-                (c for c in cols if not re.fullmatch(r"[\d\W]+", c) and len(c) >= 3),
-                key=len,
-                default=""
-            )
-            if not team_name:
-                continue
-
-            tn = _norm_team(team_name)
-
-            # similarity score (simple token overlap)
-            q_tokens = set(qn.split())
-            t_tokens = set(tn.split())
-            if not q_tokens or not t_tokens:
-                continue
-            overlap = len(q_tokens & t_tokens) / max(1, len(q_tokens))
-            score = overlap
-
-            if score > best_score:
-                best_score = score
-                best = {
-                    "name": team_name,
-                    "rank": rank,
-                    "matches": matches,
-                    "goals_for": gf,
-                    "goals_against": ga,
-                }
-
-    # require at least some overlap
-    return best if best and best_score >= 0.5 else None
+    return best if best and best_score >= MIN_MATCH_SCORE else None
+
+
+def parse_rank_goals_matches(html_text: str, team_query: str):
+    """Matchcenter page + team query → {name, rank, matches, goals_for, goals_against, ...} or None."""
+    if not normalize_team_name(team_query):
+        return None
+    row = find_team_row(parse_table_rows(html_text), team_query)
+    return row.as_dict() if row else None
@@ -0,0 +1,188 @@
+"""
+One shared HTTP client for all outbound calls (FVRZ, OpenAI).
+
+Every host gets its own requests.Session with a keep-alive connection pool,
+so repeated calls skip DNS, TCP and TLS setup. Per host there is a timeout,
+a bounded retry policy with exponential backoff (connect errors, 429, 5xx)
+and a semaphore that caps concurrent requests. A POST is only sent again when
+the server certainly did not process it: connect errors and the statuses in
+post_retry_statuses, never after a read timeout.
+
+    from http_client import http_get, http_post
+    r = http_get("https://www.fvrz.ch/...")
+"""
+import threading
+import urllib.parse
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+@dataclass(frozen=True)
+class HostPolicy:
+    timeout: float = 15.0          # seconds (connect + read), unless the caller passes timeout=
+    retries: int = 2               # additional attempts after the first one
+    backoff: float = 0.5           # sleep backoff * 2**(attempt-1) between attempts
+    max_concurrency: int = 8       # parallel requests per host = connection pool size
+    post_retry_statuses: tuple = ()  # POST is not idempotent: only these statuses re-send it
+
+
+DEFAULT_POLICY = HostPolicy()
+
+HOST_POLICIES = {
+    "www.fvrz.ch": HostPolicy(timeout=12.0, retries=2, max_concurrency=4),
+    "matchcenter.fvrz.ch": HostPolicy(timeout=20.0, retries=2, max_concurrency=4),
+    # OpenAI calls are paid: 429/503 mean "not processed", a 500 or a read timeout may have been billed
+    "api.openai.com": HostPolicy(timeout=25.0, retries=2, backoff=1.0, max_concurrency=8,
+                                 post_retry_statuses=(429, 503)),
+}
+
+
+class _Retry(Retry):
+    """urllib3 Retry that re-sends a POST only for post_statuses (connect errors are always retried)."""
+
+    post_statuses = frozenset()
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.post_statuses = self.post_statuses
+        return retry
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method.upper() == "POST":
+            return status_code in self.post_statuses
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class _HostClient:
+    def __init__(self, host: str, policy: HostPolicy):
+        self.host = host
+        self.policy = policy
+        self.semaphore = threading.BoundedSemaphore(policy.max_concurrency)
+
+        retry = _Retry(
+            total=policy.retries,
+            connect=policy.retries,
+            read=policy.retries,  # read errors are only retried for allowed_methods (never POST)
+            status=policy.retries,
+            backoff_factor=policy.backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,  # last response is returned, caller decides (raise_for_status)
+        )
+        retry.post_statuses = frozenset(policy.post_retry_statuses)
+        self.adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=policy.max_concurrency,
+            pool_block=True,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.policy.timeout)
+        with self.semaphore:
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except requests.RequestException:
+                with self._lock:
+                    self.requests += 1
+                    self.errors += 1
+                raise
+
+        retries = getattr(r.raw, "retries", None)
+        with self._lock:
+            self.requests += 1
+            if retries is not None:
+                self.retries += len(retries.history)
+        return r
+
+    def metrics(self) -> dict:
+        # urllib3 counts new connections and requests per pool
+        pools = self.adapter.poolmanager.pools
+        connections = 0
+        pool_requests = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pool_requests += pool.num_requests
+
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "errors": self.errors,
+                "connections_opened": connections,
+                "connection_reuse": (1 - connections / pool_requests) if pool_requests else 0.0,
+                "max_concurrency": self.policy.max_concurrency,
+                "timeout": self.policy.timeout,
+            }
+
+
+class HttpClient:
+    def __init__(self, policies: dict | None = None, default_policy: HostPolicy = DEFAULT_POLICY):
+        self.policies = dict(HOST_POLICIES if policies is None else policies)
+        self.default_policy = default_policy
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url: str) -> _HostClient:
+        parts = urllib.parse.urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            client = self._hosts.get(key)
+            if client is None:
+                policy = self.policies.get(parts.hostname or "", self.default_policy)
+                client = self._hosts[key] = _HostClient(parts.netloc, policy)
+            return client
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self._host(url).request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {key: client.metrics() for key, client in hosts.items()}
+
+    def close(self):
+        with self._lock:
+            for client in self._hosts.values():
+                client.session.close()
+            self._hosts.clear()
+
+
+http_client = HttpClient()
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    return http_client.get(url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    return http_client.post(url, **kwargs)
+
+
+def http_metrics() -> dict:
+    return http_client.metrics()
@@ -0,0 +1,148 @@
+"""
+Local Mandrill stand-in for load tests: messages/send and messages/send-template.
+
+    python mandrill_stub.py --port 8025 --latency 0.08 --error-rate 0.02
+
+then run the app with MANDRILL_API_URL=http://127.0.0.1:8025/api/1.3 and any
+MANDRILL_API_KEY. Nothing is delivered; every recipient comes back "sent".
+With --error-rate a share of the calls fails like Mandrill does (HTTP 500 +
+error JSON, which the SDK raises as ApiClientError).
+"""
+import argparse
+import http.server
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+
+ENDPOINTS = ("/messages/send.json", "/messages/send-template.json")
+
+
+class StubStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.recipients = 0
+        self.templates = 0
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {"calls": self.calls, "errors": self.errors, "recipients": self.recipients, "templates": self.templates}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # quiet under load
+        pass
+
+    def _reply(self, status: int, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, name: str, message: str, code: int = -1):
+        self._reply(500, {"status": "error", "code": code, "name": name, "message": message})
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._error("ValidationError", "invalid JSON")
+
+        endpoint = next((e for e in ENDPOINTS if self.path.endswith(e)), None)
+        if endpoint is None:
+            return self._error("Unknown_Method", f"unknown path {self.path}")
+
+        delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        if not body.get("key"):
+            return self._error("Invalid_Key", "Invalid API key", code=-1)
+        is_template = endpoint.endswith("send-template.json")
+        if is_template and not body.get("template_name"):
+            return self._error("Unknown_Template", "No such template", code=5)
+
+        if server.error_rate and random.random() < server.error_rate:
+            with server.stats.lock:
+                server.stats.calls += 1
+                server.stats.errors += 1
+            return self._error("GeneralError", "stub: simulated failure")
+
+        recipients = (body.get("message") or {}).get("to") or []
+        with server.stats.lock:
+            server.stats.calls += 1
+            server.stats.recipients += len(recipients)
+            server.stats.templates += int(is_template)
+        self._reply(200, [
+            {"email": to.get("email"), "status": "sent", "_id": uuid.uuid4().hex, "reject_reason": None}
+            for to in recipients
+        ])
+
+
+class MandrillStub(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stats = StubStats()
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # a client that gave up (timeout) is expected under load, not a stub error
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def api_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/1.3"
+
+    def start(self) -> "MandrillStub":
+        self._thread = threading.Thread(target=self.serve_forever, name="mandrill-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def start_stub(latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, port: int = 0) -> MandrillStub:
+    """Stub on a free local port, serving in a background thread."""
+    return MandrillStub(port=port, latency=latency, jitter=jitter, error_rate=error_rate).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per API call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random 0..jitter seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with an error (0..1)")
+    args = parser.parse_args()
+
+    stub = MandrillStub(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f"📬 Mandrill stub on {stub.api_url} (latency {args.latency}s, error rate {args.error_rate})")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        print(stub.stats.as_dict())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,25 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
 import pandas as pd
 import numpy as np
+import joblib
+from importlib.metadata import version as _dist_version
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
 
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.pipeline import Pipeline
+from data_sources import read_table
+from forest_engine import CompiledForest
+from position_table import PositionTable
 
 # MUST match your training columns
 FEATURE_COLS = [
@@ -22,15 +39,43 @@ FEATURE_COLS = [
 ]
 
 
+TRAINING_DATA_PATH = "formation_attributes_numeric.xlsx"
+
+# Persisted model artifact (override MODEL_DIR on Railway if the repo dir is read-only)
+MODEL_DIR = os.environ.get("MODEL_DIR", ".")
+MODEL_PATH = os.path.join(MODEL_DIR, "position_model.joblib")
+MODEL_META_PATH = os.path.join(MODEL_DIR, "position_model.json")
+MODEL_LOCK_PATH = os.path.join(MODEL_DIR, "position_model.lock")
+
+# Precomputed table for UI inputs (built by build_position_table.py).
+# If it matches the artifact, sklearn is only imported for out-of-grid inputs.
+POSITION_TABLE_PATH = os.path.join(MODEL_DIR, "position_table.npz")
+
+# "sklearn" (default) or "compiled" (forest_engine.CompiledForest, same probabilities, less overhead)
+POSITION_MODEL_ENGINE = os.environ.get("POSITION_MODEL_ENGINE", "sklearn").strip().lower()
+
+RF_PARAMS = {
+    "n_estimators": 75,
+    "max_depth": None,
+    "min_samples_leaf": 2,
+    "n_jobs": -1,
+    "random_state": 42,
+    "class_weight": "balanced_subsample",
+}
+
+
 def _train_position_model_from_excel():
     """
     Train the model directly from 'formation_attributes_numeric.xlsx'.
-    No .pkl file needed – built at app startup.
+    Only called when no matching artifact exists (see load_position_model).
     """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.pipeline import Pipeline
+
     print("🔁 Training ML model from formation_attributes_numeric.xlsx ...")
 
     # 1. Load Excel
-    df = pd.read_excel("formation_attributes_numeric.xlsx")
+    df = read_table(TRAINING_DATA_PATH)
     df["Position"] = df["Position"].astype(str).str.strip().str.upper()
 
     # 2. Features & target
@@ -52,14 +97,7 @@ def _train_position_model_from_excel():
         X_scaled[col] = scale_fifa_to_1_10(X_scaled[col])
 
     # 4. Define RandomForest
-    rf = RandomForestClassifier(
-        n_estimators=75,
-        max_depth=None,
-        min_samples_leaf=2,
-        n_jobs=-1,
-        random_state=42,
-        class_weight="balanced_subsample",
-    )
+    rf = RandomForestClassifier(**RF_PARAMS)
 
     # 5. Train
     rf.fit(X_scaled, y)
@@ -72,12 +110,266 @@ def _train_position_model_from_excel():
     return pipeline
 
 
-# Train once when this module is imported
-try:
-    position_model = _train_position_model_from_excel()
-except Exception as e:
+def _sklearn_version() -> str:
+    # read from package metadata, so checking the artifact does not import sklearn
+    return _dist_version("scikit-learn")
+
+
+def _training_fingerprint() -> str | None:
+    """
+    Hash of everything that determines the trained model:
+    training data bytes, feature columns, RF params and sklearn version.
+    Returns None if the training data is not available.
+    """
+    try:
+        with open(TRAINING_DATA_PATH, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    h = hashlib.sha256()
+    h.update(data)
+    h.update(json.dumps(
+        {"features": FEATURE_COLS, "params": RF_PARAMS, "sklearn": _sklearn_version()},
+        sort_keys=True,
+    ).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _read_model_meta() -> dict:
+    try:
+        with open(MODEL_META_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_model_artifact(pipeline, fingerprint: str | None) -> dict:
+    """Write model + meta atomically (tmp file + rename), so other workers never see half a file."""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+
+    # uncompressed on purpose: compressed pickles cannot be memory-mapped
+    fd, tmp_path = tempfile.mkstemp(dir=MODEL_DIR, suffix=".joblib.tmp")
+    os.close(fd)
+    joblib.dump(pipeline, tmp_path)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, MODEL_PATH)
+
+    meta = {
+        "fingerprint": fingerprint,
+        "model_version": (fingerprint or "unknown")[:12],
+        "sklearn_version": _sklearn_version(),
+        "classes": [str(c) for c in pipeline.named_steps["rf"].classes_],
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=MODEL_DIR, suffix=".json.tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, MODEL_META_PATH)
+    return meta
+
+
+@contextmanager
+def _model_build_lock():
+    """Only one gunicorn worker trains; the others wait and then load its artifact."""
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with open(MODEL_LOCK_PATH, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _artifact_is_current(meta: dict, fingerprint: str | None) -> bool:
+    if not meta or not os.path.exists(MODEL_PATH):
+        return False
+    if meta.get("sklearn_version") != _sklearn_version():
+        return False
+    # no training data on this host → trust the shipped artifact
+    if fingerprint is None:
+        return True
+    return meta.get("fingerprint") == fingerprint
+
+
+def load_position_model(force_retrain: bool = False):
+    """
+    Returns (pipeline, meta).
+    Loads the persisted artifact memory-mapped and only retrains
+    if the training data / params / sklearn version changed.
+    """
+    fingerprint = _training_fingerprint()
+
+    if not force_retrain:
+        meta = _read_model_meta()
+        if _artifact_is_current(meta, fingerprint):
+            return joblib.load(MODEL_PATH, mmap_mode="r"), meta
+
+    with _model_build_lock():
+        # another worker may have built it while we were waiting
+        meta = _read_model_meta()
+        if force_retrain or not _artifact_is_current(meta, fingerprint):
+            if fingerprint is None:
+                raise FileNotFoundError(TRAINING_DATA_PATH)
+            pipeline = _train_position_model_from_excel()
+            meta = _save_model_artifact(pipeline, fingerprint)
+            print("💾 ML model saved:", MODEL_PATH, "version", meta["model_version"])
+
+    return joblib.load(MODEL_PATH, mmap_mode="r"), meta
+
+
+class _PredictionCache:
+    """
+    Bounded LRU cache: (model version, clipped feature tuple) → sharpened proba row.
+    Attributes are integers 1–10 from the UI, so the same vectors come back all the time.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._data.get(key)
+            if row is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return row
+
+    def put(self, key, row):
+        if self.maxsize <= 0:
+            return
+        row = np.array(row, dtype=float)
+        row.flags.writeable = False
+        with self._lock:
+            self._data[key] = row
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "model_version": MODEL_VERSION,
+            }
+
+
+_prediction_cache = _PredictionCache(int(os.environ.get("POSITION_CACHE_SIZE", "4096")))
+
+
+def prediction_cache_info() -> dict:
+    return _prediction_cache.info()
+
+
+def clear_prediction_cache():
+    _prediction_cache.clear()
+
+
+def _load_live_model(force_retrain: bool = False):
+    global position_model, compiled_forest, MODEL_VERSION, MODEL_CLASSES
+    try:
+        model, meta = load_position_model(force_retrain=force_retrain)
+        # inference batches are small: joblib thread spin-up costs more than it saves
+        model.named_steps["rf"].set_params(n_jobs=1)
+    except Exception as e:
+        print("⚠️ WARNING: Could not load ML model:", e)
+        return None
+
+    compiled = None
+    if POSITION_MODEL_ENGINE == "compiled":
+        compiled = CompiledForest.from_sklearn(model.named_steps["rf"])
+        print("⚡ Using compiled forest engine:", compiled.n_trees, "trees")
+
+    compiled_forest = compiled
+    position_model = model
+    MODEL_VERSION = meta.get("model_version")
+    MODEL_CLASSES = [str(c) for c in model.named_steps["rf"].classes_]
+    return model
+
+
+def _load_position_table(meta: dict):
+    if not os.path.exists(POSITION_TABLE_PATH):
+        return None
+    try:
+        table = PositionTable.load(POSITION_TABLE_PATH)
+    except Exception as e:
+        print("⚠️ WARNING: Could not load position table:", e)
+        return None
+    if table.model_version != meta.get("model_version"):
+        print("⚠️ Position table is from another model version – ignored (run build_position_table.py)")
+        return None
+    return table
+
+
+def get_position_model():
+    """The live sklearn pipeline, loaded on first use if the position table answered so far."""
+    global _live_model_tried
+    if position_model is None and not _live_model_tried:
+        with _live_model_lock:
+            if not _live_model_tried:
+                _live_model_tried = True
+                _load_live_model()
+    return position_model
+
+
+def reload_position_model(force_retrain: bool = False):
+    """(Re)load the model into the module globals."""
+    global position_model, compiled_forest, position_table, MODEL_VERSION, MODEL_CLASSES, _live_model_tried
     position_model = None
-    print("⚠️ WARNING: Could not train ML model:", e)
+    compiled_forest = None
+    position_table = None
+    MODEL_VERSION = None
+    MODEL_CLASSES = []
+    _live_model_tried = False
+
+    meta = _read_model_meta()
+    if not force_retrain and _artifact_is_current(meta, _training_fingerprint()):
+        position_table = _load_position_table(meta)
+
+    if position_table is not None:
+        MODEL_VERSION = meta.get("model_version")
+        MODEL_CLASSES = [str(c) for c in position_table.classes_]
+        print("📋 Using position table:", position_table.n_nodes, "nodes (live model loads on demand)")
+    else:
+        _live_model_tried = True
+        _load_live_model(force_retrain=force_retrain)
+
+    # cached predictions belong to the previous artifact
+    _prediction_cache.clear()
+    return position_model
+
+
+# Load once when this module is imported (file load, no training unless data changed)
+position_model = None
+compiled_forest = None
+position_table = None
+MODEL_VERSION = None
+MODEL_CLASSES = []
+_live_model_tried = False
+_live_model_lock = threading.Lock()
+reload_position_model()
 
 
 # Mapping: UI field → model feature
@@ -110,21 +402,115 @@ def _clip_1_10(value, default=5.0) -> float:
 
 def _prepare_feature_vector(attrs: dict) -> pd.DataFrame:
     """Dict → 1xN DataFrame, strict FEATURE_COLS, values in [1,10]."""
-    row = {}
-    for col in FEATURE_COLS:
-        raw = attrs.get(col, 5.0)
-        row[col] = [_clip_1_10(raw, default=5.0)]
-    return pd.DataFrame(row)
+    return _prepare_feature_matrix([attrs])
+
+
+def _prepare_feature_array(attrs_list) -> np.ndarray:
+    """
+    List of dicts (keys like FEATURE_COLS) or 2D array (columns in FEATURE_COLS order)
+    → NxM float array, values in [1,10].
+    """
+    if isinstance(attrs_list, np.ndarray):
+        X = np.asarray(attrs_list, dtype=float)
+        if X.ndim != 2 or X.shape[1] != len(FEATURE_COLS):
+            raise ValueError(f"expected an N x {len(FEATURE_COLS)} array (FEATURE_COLS order), got shape {X.shape}")
+        return np.clip(X, 1.0, 10.0)
+
+    rows = [
+        [_clip_1_10(attrs.get(col, 5.0), default=5.0) for col in FEATURE_COLS]
+        for attrs in attrs_list
+    ]
+    return np.asarray(rows, dtype=float).reshape(-1, len(FEATURE_COLS))
+
+
+def _prepare_feature_matrix(attrs_list) -> pd.DataFrame:
+    """Same as _prepare_feature_array, as DataFrame with FEATURE_COLS (what sklearn was fitted on)."""
+    return pd.DataFrame(_prepare_feature_array(attrs_list), columns=FEATURE_COLS)
 
 
 def _sharpen_proba(proba, gamma: float = 1.5):
-    """Make distribution sharper (top class clearer)."""
-    p = np.asarray(proba, dtype=float)
-    p = np.power(p, gamma)
-    s = p.sum()
-    if s > 0:
-        p = p / s
-    return p
+    """Make distribution sharper (top class clearer). Works on one row or NxC matrix."""
+    p = np.power(np.asarray(proba, dtype=float), gamma)
+    s = p.sum(axis=-1, keepdims=True)
+    return np.divide(p, s, out=p, where=s > 0)
+
+
+def get_model_version() -> str | None:
+    """Version of the currently loaded artifact (changes when the model is retrained)."""
+    return MODEL_VERSION
+
+
+def position_classes() -> list:
+    """Class labels (position codes) in the column order of the probability matrix."""
+    return list(MODEL_CLASSES)
+
+
+def _predict_live(X: np.ndarray) -> np.ndarray | None:
+    """Raw probabilities from the live model, or None if it could not be loaded."""
+    model = get_position_model()
+    if model is None:
+        return None
+    if compiled_forest is not None:
+        return compiled_forest.predict_proba(X)
+    return model.predict_proba(pd.DataFrame(X, columns=FEATURE_COLS))
+
+
+def _predict_uncached(X: np.ndarray):
+    """
+    (sharpened proba, ok) for X. ok marks the rows that really came from the model;
+    rows without a model are zeros and must not be cached.
+    """
+    proba = np.zeros((len(X), len(position_classes())))
+    ok = np.ones(len(X), dtype=bool)
+    if position_table is None:
+        live = _predict_live(X)
+        if live is None:
+            ok[:] = False
+        else:
+            proba = live
+    else:
+        on_grid = position_table.covers(X)
+        if on_grid.any():
+            proba[on_grid] = position_table.predict_proba(X[on_grid])
+        if not on_grid.all():
+            live = _predict_live(X[~on_grid])
+            if live is None:
+                ok[~on_grid] = False
+            else:
+                proba[~on_grid] = live
+    return _sharpen_proba(proba, gamma=1.5), ok
+
+
+def predict_position_proba_batch(attrs_list) -> np.ndarray:
+    """
+    attrs_list: list of attribute dicts or 2D array (N x FEATURE_COLS).
+    Returns sharpened probabilities as N x len(position_classes()) matrix.
+    Cached rows are served from the LRU cache, all misses go through ONE predict_proba call.
+    """
+    X = _prepare_feature_array(attrs_list)
+    if MODEL_VERSION is None or len(X) == 0:
+        return np.zeros((len(X), len(position_classes())))
+
+    version = MODEL_VERSION
+    keys = [(version, tuple(row)) for row in X.tolist()]
+    out = np.empty((len(X), len(position_classes())))
+
+    missing = []
+    for i, key in enumerate(keys):
+        row = _prediction_cache.get(key)
+        if row is None:
+            missing.append(i)
+        else:
+            out[i] = row
+
+    if missing:
+        proba, ok = _predict_uncached(X[missing])
+        for i, row, row_ok in zip(missing, proba, ok):
+            out[i] = row
+            if row_ok:  # a failed live model load must not stick to this vector
+                _prediction_cache.put(keys[i], row)
+
+    return out
 
 
 def recommend_position_from_attributes(attrs: dict):
@@ -132,18 +518,14 @@ def recommend_position_from_attributes(attrs: dict):
     attrs: keys like FEATURE_COLS, values 1–10.
     Returns: list [(position_code, prob), ...] Top3.
     """
-    if position_model is None:
+    if get_model_version() is None:
         print("⚠️ ML model not available – returning dummy suggestions.")
         return [("CM", 0.34), ("ST", 0.33), ("CB", 0.33)]
 
-    X = _prepare_feature_vector(attrs)
-    proba = position_model.predict_proba(X)[0]
-    classes = position_model.classes_ if not hasattr(position_model, "named_steps") \
-        else position_model.named_steps["rf"].classes_
-    proba_sharp = _sharpen_proba(proba, gamma=1.5)
+    proba_sharp = predict_position_proba_batch([attrs])[0]
 
     ranked = sorted(
-        [(cls, float(p)) for cls, p in zip(classes, proba_sharp)],
+        [(cls, float(p)) for cls, p in zip(position_classes(), proba_sharp)],
         key=lambda x: x[1],
         reverse=True,
     )
@@ -174,15 +556,23 @@ def predict_position_proba_all(attrs: dict) -> dict:
     Returns dict: {position_code: prob} for ALL classes.
     attrs: keys like FEATURE_COLS, values 1–10.
     """
-    if position_model is None:
-        return {}
+    return predict_position_proba_all_batch([attrs])[0]
+
 
-    X = _prepare_feature_vector(attrs)
-    proba = position_model.predict_proba(X)[0]
+def predict_position_proba_all_batch(attrs_list) -> list[dict]:
+    """Batch version of predict_position_proba_all: one {position_code: prob} dict per input row."""
+    if get_model_version() is None:
+        return [{} for _ in range(len(attrs_list))]
 
-    classes = position_model.classes_ if not hasattr(position_model, "named_steps") \
-        else position_model.named_steps["rf"].classes_
+    classes = position_classes()
+    proba = predict_position_proba_batch(attrs_list)
+    return [
+        {cls: float(p) for cls, p in zip(classes, row)}
+        for row in proba
+    ]
 
-    proba_sharp = _sharpen_proba(proba, gamma=1.5)
-    return {cls: float(p) for cls, p in zip(classes, proba_sharp)}
 
+if __name__ == "__main__":
+    # python ml_model.py → force a rebuild of the persisted artifact
+    reload_position_model(force_retrain=True)
+    print("Model version:", MODEL_VERSION)
@@ -0,0 +1,132 @@
+"""
+Race several opponent data sources concurrently.
+
+Sources are listed in priority order. All of them start at once; the
+resolver returns as soon as the answer can no longer change:
+
+- the highest-priority source answered with a valid result, or
+- every higher-priority source has finished without one, or
+- the preferred source missed its deadline and a lower-priority result is there.
+
+Sources that are still running are ignored (not-yet-started ones are cancelled);
+their threads finish in the background.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# the preferred (first) source gets this long before lower-priority answers are accepted
+PREFERRED_DEADLINE = float(os.getenv("OPPONENT_PREFERRED_DEADLINE", "6"))
+# hard limit for the whole race
+RESOLVE_TIMEOUT = float(os.getenv("OPPONENT_RESOLVE_TIMEOUT", "45"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("OPPONENT_SOURCE_WORKERS", "12")),
+    thread_name_prefix="opponent-source",
+)
+
+_stats_lock = threading.Lock()
+_wins: Dict[str, int] = {}
+
+
+def is_valid_team(team: Any) -> bool:
+    if not isinstance(team, dict) or not team.get("name"):
+        return False
+    try:
+        return all(int(team[k]) >= 0 for k in ("rank", "goals_for", "goals_against", "matches"))
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def _timed(fn: Callable, query: str):
+    t0 = time.perf_counter()
+    try:
+        return fn(query), None, time.perf_counter() - t0
+    except Exception as e:
+        return None, repr(e), time.perf_counter() - t0
+
+
+def resolve_first_good(
+    sources: list,
+    query: str,
+    preferred_deadline: float = PREFERRED_DEADLINE,
+    timeout: float = RESOLVE_TIMEOUT,
+) -> Tuple[Optional[Dict[str, Any]], dict]:
+    """
+    sources: [(name, fn(query) -> team dict | None), ...] in priority order.
+    Returns (team or None, report). report = {"winner", "elapsed", "sources": {name: {...}}}.
+    """
+    start = time.perf_counter()
+    futures = {_executor.submit(_timed, fn, query): i for i, (_, fn) in enumerate(sources)}
+    names = [name for name, _ in sources]
+
+    results: Dict[int, Optional[dict]] = {}
+    report_sources = {name: {"status": "running", "seconds": None} for name in names}
+    pending = set(futures)
+    winner = None
+
+    def pick() -> Optional[int]:
+        elapsed = time.perf_counter() - start
+        for i in range(len(sources)):
+            if i in results:
+                if results[i] is not None:
+                    return i
+                continue  # finished without a result → next priority may win
+            # source i still running: lower priorities have to wait for it,
+            # except when the preferred source missed its deadline
+            if i == 0 and elapsed >= preferred_deadline:
+                continue
+            return None
+        return None
+
+    while pending:
+        remaining = timeout - (time.perf_counter() - start)
+        if remaining <= 0:
+            break
+        # wake up at the preferred deadline even if nothing finished
+        until_deadline = preferred_deadline - (time.perf_counter() - start)
+        wait_for = min(remaining, until_deadline) if until_deadline > 0 else remaining
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for fut in done:
+            i = futures[fut]
+            team, error, seconds = fut.result()
+            valid = is_valid_team(team)
+            results[i] = team if valid else None
+            report_sources[names[i]] = {
+                "status": "ok" if valid else ("error" if error else "empty"),
+                "seconds": round(seconds, 3),
+                **({"error": error} if error else {}),
+            }
+
+        winner = pick()
+        if winner is not None:
+            break
+
+    if winner is None:
+        # timeout or everything done: take whatever valid result exists, by priority
+        winner = next((i for i in range(len(sources)) if results.get(i) is not None), None)
+
+    for fut in pending:
+        if fut.cancel():
+            report_sources[names[futures[fut]]]["status"] = "cancelled"
+        else:
+            report_sources[names[futures[fut]]]["status"] = "ignored"
+
+    report = {
+        "winner": names[winner] if winner is not None else None,
+        "elapsed": round(time.perf_counter() - start, 3),
+        "sources": report_sources,
+    }
+    if winner is not None:
+        with _stats_lock:
+            _wins[names[winner]] = _wins.get(names[winner], 0) + 1
+
+    return (dict(results[winner]) if winner is not None else None), report
+
+
+def resolver_stats() -> dict:
+    with _stats_lock:
+        return {"wins": dict(_wins)}
@@ -0,0 +1,178 @@
+import math
+
+import numpy as np
+
+from forest_engine import CompiledForest
+
+
+class PositionTable:
+    """
+    Position model restricted to the inputs the UI can produce:
+    every free feature is an integer in [grid_min, grid_max], the fixed
+    features (FK Accuracy, Long shots) are pinned to their neutral value.
+
+    The full grid has ~10^11 cells, far too many for a dense table of top-K
+    positions. Instead the forest is partially evaluated on the grid:
+    splits on fixed features and splits that the integer bounds on the path
+    already decide are removed, identical sub-trees and leaves are shared
+    across all trees (a reduced decision diagram). The result is exact for
+    on-grid inputs, a few MB, and needs NumPy only.
+    """
+
+    def __init__(self, forest: CompiledForest, meta: dict):
+        self.forest = forest
+        self.meta = meta
+        self.model_version = meta.get("model_version")
+        self.feature_cols = list(meta["feature_cols"])
+        self.grid_min = int(meta["grid_min"])
+        self.grid_max = int(meta["grid_max"])
+        self.fixed = {self.feature_cols.index(k): float(v) for k, v in meta["fixed"].items()}
+        self.classes_ = forest.classes_
+
+    @classmethod
+    def build(cls, rf, feature_cols: list, fixed: dict, grid_min: int = 1, grid_max: int = 10,
+              model_version: str | None = None) -> "PositionTable":
+        fixed_idx = {feature_cols.index(k): float(v) for k, v in fixed.items()}
+        n_features = len(feature_cols)
+
+        leaf_ids = {}
+        leaf_values = []
+        node_ids = {}
+        nodes = []  # (feature, cut, left_ref, right_ref); refs: ("L", i) or ("N", i)
+
+        def intern_leaf(values):
+            key = values.tobytes()
+            if key not in leaf_ids:
+                leaf_ids[key] = ("L", len(leaf_values))
+                leaf_values.append(values)
+            return leaf_ids[key]
+
+        def intern_node(f, cut, left_ref, right_ref):
+            key = (f, cut, left_ref, right_ref)
+            if key not in node_ids:
+                node_ids[key] = ("N", len(nodes))
+                nodes.append(key)
+            return node_ids[key]
+
+        roots = []
+        for est in rf.estimators_:
+            t = est.tree_
+            children_left = t.children_left
+            children_right = t.children_right
+            feature = t.feature
+            threshold = t.threshold
+            values = np.asarray(t.value[:, 0, :], dtype=np.float64)
+            lo = [grid_min] * n_features
+            hi = [grid_max] * n_features
+
+            def visit(n):
+                if children_left[n] == -1:
+                    v = values[n]
+                    s = v.sum()
+                    return intern_leaf(v / s if s > 0 else v)
+
+                f = int(feature[n])
+                th = float(threshold[n])
+                if f in fixed_idx:
+                    return visit(children_left[n] if fixed_idx[f] <= th else children_right[n])
+
+                # integer x: x <= th  ⇔  x <= floor(th)
+                cut = math.floor(th)
+                if cut >= hi[f]:
+                    return visit(children_left[n])
+                if cut < lo[f]:
+                    return visit(children_right[n])
+
+                old = hi[f]
+                hi[f] = cut
+                left_ref = visit(children_left[n])
+                hi[f] = old
+
+                old = lo[f]
+                lo[f] = cut + 1
+                right_ref = visit(children_right[n])
+                lo[f] = old
+
+                if left_ref == right_ref:
+                    return left_ref
+                return intern_node(f, cut, left_ref, right_ref)
+
+            roots.append(visit(0))
+
+        forest = cls._to_compiled_forest(nodes, leaf_values, roots, rf.classes_)
+        meta = {
+            "model_version": model_version,
+            "feature_cols": list(feature_cols),
+            "fixed": {k: float(v) for k, v in fixed.items()},
+            "grid_min": grid_min,
+            "grid_max": grid_max,
+        }
+        return cls(forest, meta)
+
+    @staticmethod
+    def _to_compiled_forest(nodes, leaf_values, roots, classes) -> CompiledForest:
+        """Inner nodes get ids 0..N-1, leaves N..N+M-1 (pointing to themselves)."""
+        n_inner = len(nodes)
+        n_total = n_inner + len(leaf_values)
+
+        def ref_id(ref):
+            kind, i = ref
+            return i if kind == "N" else n_inner + i
+
+        feature = np.zeros(n_total, dtype=np.intp)
+        threshold = np.zeros(n_total, dtype=np.float64)
+        left = np.arange(n_total, dtype=np.int32)
+        right = np.arange(n_total, dtype=np.int32)
+        leaf_index = np.full(n_total, -1, dtype=np.int32)
+        leaf_index[n_inner:] = np.arange(len(leaf_values), dtype=np.int32)
+
+        for i, (f, cut, left_ref, right_ref) in enumerate(nodes):
+            feature[i] = f
+            threshold[i] = cut
+            left[i] = ref_id(left_ref)
+            right[i] = ref_id(right_ref)
+
+        # children are interned before their parents → one forward pass gives the height
+        height = np.zeros(n_total, dtype=np.int32)
+        for i in range(n_inner):
+            height[i] = 1 + max(height[left[i]], height[right[i]])
+
+        root_ids = np.asarray([ref_id(r) for r in roots], dtype=np.int32)
+        return CompiledForest(
+            feature=feature,
+            threshold=threshold,
+            left=left,
+            right=right,
+            leaf_index=leaf_index,
+            leaf_values=np.asarray(leaf_values, dtype=np.float64).reshape(-1, len(classes)),
+            roots=root_ids,
+            max_depth=int(height[root_ids].max(initial=0)),
+            classes=classes,
+        )
+
+    def save(self, path: str):
+        self.forest.save(path, **self.meta)
+
+    @classmethod
+    def load(cls, path: str) -> "PositionTable":
+        forest, meta = CompiledForest.load(path)
+        return cls(forest, meta)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.forest.feature)
+
+    def covers(self, X: np.ndarray) -> np.ndarray:
+        """Per row: True if the input lies on the precomputed grid."""
+        X = np.atleast_2d(X)
+        free = [j for j in range(X.shape[1]) if j not in self.fixed]
+        Xf = X[:, free]
+        ok = (Xf == np.round(Xf)).all(axis=1)
+        ok &= ((Xf >= self.grid_min) & (Xf <= self.grid_max)).all(axis=1)
+        for j, v in self.fixed.items():
+            ok &= X[:, j] == v
+        return ok
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Only valid for rows where covers(X) is True."""
+        return self.forest.predict_proba(X)
@@ -1,14 +1,15 @@
+import time
+from contextlib import contextmanager
+
 import pandas as pd
 import numpy as np
-import re
+
+from data_sources import read_table, refresh_source
 
 INPUT_FILE = "formation_attributes_cleaned.xlsx"
 OUTPUT_FILE = "formation_attributes_numeric.xlsx"
 
-# 1. Datei laden
-df = pd.read_excel(INPUT_FILE)
-
-# 2. Relevante Attribut-Spalten (GENAU wie in deiner Excel)
+# Relevante Attribut-Spalten (GENAU wie in deiner Excel)
 attribute_cols = [
     "Sprint speed",
     "Stamina",
@@ -25,45 +26,9 @@ attribute_cols = [
     "Tackling",
 ]
 
-# 3. Allgemeine String-Cleanups (Zeilenumbrüche, Spaces)
-for col in df.columns:
-    if df[col].dtype == object:
-        df[col] = (
-            df[col]
-            .astype(str)
-            .str.replace("\r", " ", regex=False)
-            .str.replace("\n", " ", regex=False)
-            .str.strip()
-        )
+INVALID_POSITIONS = {"SUB", "RES", "", "NAN", "NONE"}
 
-# 4. Position & Also possible Positions aufbereiten
-df["Position"] = df["Position"].astype(str).str.strip().str.upper()
-df["Also possible Positions"] = df["Also possible Positions"].astype(str).str.strip().str.upper()
-
-def derive_position(row):
-    pos = row["Position"]
-    also = row["Also possible Positions"]
-
-    # Falls Position SUB/RES → aus Also possible Positions ableiten
-    if pos in {"SUB", "RES"}:
-        # Split nach Leerzeichen / Komma / Slash
-        tokens = re.split(r"[,\s/]+", also)
-        for t in tokens:
-            t = t.strip().upper()
-            if t and t not in {"SUB", "RES"}:
-                return t
-        # falls nichts Brauchbares → bleibt SUB/RES (wird später gefiltert)
-        return pos
-    else:
-        return pos
-
-df["Position"] = df.apply(derive_position, axis=1)
-
-# 5. Positionen filtern, die wirklich unbrauchbar sind
-invalid_positions = {"SUB", "RES", "", "NAN", "NONE"}
-df = df[~df["Position"].isin(invalid_positions)]
-
-# 5b. Feine Positionscodes auf grobe Rollen mappen
+# Feine Positionscodes auf grobe Rollen mappen
 POSITION_NORMALIZATION = {
     # Innenverteidiger / Libero → CB
     "LCB": "CB",
@@ -98,39 +63,121 @@ POSITION_NORMALIZATION = {
     "RWB": "RB",
 }
 
-df["Position"] = df["Position"].replace(POSITION_NORMALIZATION)
+# erstes Token (Trenner: Leerzeichen / Komma / Slash), das nicht SUB/RES ist
+_FIRST_REAL_POSITION = r"(?:^|[,\s/])(?!(?:SUB|RES)(?:[,\s/]|$))([^,\s/]+)"
 
-# 5c. GK komplett rauswerfen (kein Keeper-Modell nötig)
-df = df[df["Position"] != "GK"]
 
-# 6. Attribute in echte Zahlen umwandeln
-#    z.B. "78 Ball control" → 78.0
-for col in attribute_cols:
-    df[col] = (
-        df[col]
-        .astype(str)
-        .str.extract(r"(\d+)", expand=False)
-        .astype(float)
+def _map_stacked(frame: pd.DataFrame, fn) -> pd.DataFrame:
+    """Apply one Series function to all columns at once (columns stacked into one Series)."""
+    values = frame.to_numpy(dtype=object).ravel(order="F")
+    out = fn(pd.Series(values))
+    return pd.DataFrame(
+        out.to_numpy().reshape(frame.shape, order="F"),
+        index=frame.index,
+        columns=frame.columns,
     )
 
-# 7. Fehlende Attribute mit Median auffüllen (statt Zeilen zu löschen)
-for col in attribute_cols:
-    if df[col].isna().any():
-        median_val = df[col].median()
-        df[col] = df[col].fillna(median_val)
 
-# Sicherheit: Position darf nicht leer sein
-df = df.dropna(subset=["Position"])
+def _first_number(s: pd.Series) -> pd.Series:
+    """Erste Ziffernfolge als float; reine Zahlen ohne Regex (Großteil der Zellen)."""
+    plain = s.str.isdecimal()
+    out = pd.Series(np.nan, index=s.index)
+    out[plain] = s[plain].astype(float)
+    rest = ~plain
+    if rest.any():
+        out[rest] = s[rest].str.extract(r"(\d+)", expand=False).astype(float)
+    return out
+
+
+@contextmanager
+def _stage(timings: dict, name: str):
+    t0 = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - t0
+
+
+def clean_formation_attributes(df: pd.DataFrame, timings: dict | None = None) -> pd.DataFrame:
+    """
+    Rohdaten (formation_attributes_cleaned.xlsx) → numerische Trainingsdaten.
+    timings (optional) wird mit der Dauer pro Stufe in Sekunden befüllt.
+    """
+    timings = {} if timings is None else timings
+    df = df.copy()
+
+    # 1. Allgemeine String-Cleanups (Zeilenumbrüche, Spaces) – alle Text-Spalten gestapelt,
+    #    eine Python-Schleife über die Werte (kein vektorisierter Durchgang)
+    with _stage(timings, "strings"):
+        obj_cols = [c for c in df.columns if df[c].dtype == object]
+        if obj_cols:
+            cleaned = _map_stacked(
+                df[obj_cols].astype(str),
+                # .str.replace/.str.strip wären drei elementweise Schleifen – so ist es eine
+                lambda s: pd.Series([v.replace("\r", " ").replace("\n", " ").strip() for v in s]),
+            )
+            for col in obj_cols:
+                df[col] = cleaned[col].astype(object)
+
+    # 2. Position & Also possible Positions aufbereiten
+    #    Falls Position SUB/RES → erste brauchbare Position aus Also possible Positions
+    with _stage(timings, "positions"):
+        df["Position"] = df["Position"].astype(str).str.strip().str.upper()
+        df["Also possible Positions"] = df["Also possible Positions"].astype(str).str.strip().str.upper()
+
+        is_sub = df["Position"].isin({"SUB", "RES"})
+        fallback = df.loc[is_sub, "Also possible Positions"].str.extract(_FIRST_REAL_POSITION, expand=False)
+        df.loc[is_sub, "Position"] = fallback.fillna(df.loc[is_sub, "Position"])
+
+    # 3. Unbrauchbare Positionen filtern, Codes normalisieren, GK raus
+    with _stage(timings, "filter"):
+        df = df[~df["Position"].isin(INVALID_POSITIONS)]
+        df["Position"] = df["Position"].replace(POSITION_NORMALIZATION)
+        df = df[df["Position"] != "GK"]
+
+    # 4. Attribute in echte Zahlen umwandeln ("78 Ball control" → 78.0), alle Spalten auf einmal
+    with _stage(timings, "numbers"):
+        numbers = _map_stacked(
+            df[attribute_cols].astype(str),
+            _first_number,
+        )
+        for col in attribute_cols:
+            df[col] = numbers[col].astype(float)
+
+    # 5. Fehlende Attribute mit Median auffüllen, Position darf nicht leer sein, Clip auf 0–99
+    with _stage(timings, "fill_clip"):
+        df[attribute_cols] = df[attribute_cols].fillna(df[attribute_cols].median())
+        df = df.dropna(subset=["Position"])
+        df[attribute_cols] = df[attribute_cols].clip(lower=0, upper=99)
+
+    return df
+
+
+def main():
+    timings = {}
+
+    t0 = time.perf_counter()
+    df_raw = read_table(INPUT_FILE)
+    timings["load"] = time.perf_counter() - t0
+
+    df = clean_formation_attributes(df_raw, timings)
+
+    # Kontrolle
+    print("Rows after cleaning:", len(df))
+    print(df[["Position"] + attribute_cols].head())
+    print(df[attribute_cols].dtypes)
+
+    # Bereinigte Datei speichern
+    t0 = time.perf_counter()
+    df.to_excel(OUTPUT_FILE, index=False)
+    timings["save"] = time.perf_counter() - t0
+    print(f"✅ Saved cleaned numeric data to: {OUTPUT_FILE}")
+
+    # keep the binary copy in sync (otherwise readers fall back to Excel)
+    refresh_source(OUTPUT_FILE)
 
-# 8. Clip auf sinnvollen Bereich 0–99
-for col in attribute_cols:
-    df[col] = df[col].clip(lower=0, upper=99)
+    print("Timings:")
+    for name, seconds in timings.items():
+        print(f"  {name:<10} {seconds * 1000:8.1f} ms")
 
-# 9. Kontrolle
-print("Rows after cleaning:", len(df))
-print(df[["Position"] + attribute_cols].head())
-print(df[attribute_cols].dtypes)
 
-# 10. Bereinigte Datei speichern
-df.to_excel(OUTPUT_FILE, index=False)
-print(f"✅ Saved cleaned numeric data to: {OUTPUT_FILE}")
+if __name__ == "__main__":
+    main()
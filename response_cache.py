@@ -0,0 +1,150 @@
+"""
+SQLite cache for paid OpenAI lookups (opponent stats).
+
+The opponent prompts only depend on the team name, so answers are cached per
+(query, model, prompt version) for OPENAI_CACHE_TTL seconds. The query only
+loses case and extra whitespace: normalize_team_name also drops characters like
+"+", and "Senioren 30+" is a different team than "Senioren 30".
+Concurrent identical lookups in this process are coalesced: one call goes out,
+the other callers wait for its result (single flight).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+from db_tuning import apply_sqlite_pragmas
+
+OPENAI_CACHE_PATH = os.environ.get(
+    "OPENAI_CACHE_PATH",
+    os.path.join(os.environ.get("DATA_DIR", "/tmp"), "openai_cache.db"),
+)
+OPENAI_CACHE_TTL = int(os.environ.get("OPENAI_CACHE_TTL", str(12 * 3600)))
+# followers never wait longer than the leader's call may take
+COALESCE_TIMEOUT = 120
+
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a query: lowercase, whitespace collapsed, nothing else removed."""
+    return " ".join((query or "").lower().split())
+
+
+class ResponseCache:
+    def __init__(self, path: str = OPENAI_CACHE_PATH, ttl: int = OPENAI_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            apply_sqlite_pragmas(conn)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS openai_cache ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " prompt_version TEXT NOT NULL,"
+                " query_norm TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, prompt_version: str, query: str) -> str:
+        raw = f"{model}\x1f{prompt_version}\x1f{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value, created_at FROM openai_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, prompt_version: str, query: str, value: Any):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO openai_cache (key, model, prompt_version, query_norm, value, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version, normalize_query(query), json.dumps(value), now),
+            )
+            conn.execute("DELETE FROM openai_cache WHERE created_at < ?", (now - self.ttl,))
+
+    def get_or_compute(self, model: str, prompt_version: str, query: str, compute: Callable[[str], Any]) -> Any:
+        """
+        Cached value, or compute(query) – once per key even under concurrent calls.
+        None results (not found / API error) are not cached.
+        """
+        key = self.make_key(model, prompt_version, query)
+
+        cached = self.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            value = fut.result(timeout=COALESCE_TIMEOUT)
+            return json.loads(value) if value is not None else None
+
+        value = None
+        try:
+            # a leader that finished between our get() and taking the slot has already stored the value
+            value = self.get(key)
+            with self._lock:
+                if value is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if value is None:
+                value = compute(query)
+                if value is not None:
+                    self.put(key, model, prompt_version, query, value)
+        finally:
+            # followers get their own copy (callers annotate the dict)
+            fut.set_result(json.dumps(value) if value is not None else None)
+            with self._lock:
+                self._inflight.pop(key, None)
+        return value
+
+    def info(self) -> dict:
+        size = self._conn().execute("SELECT COUNT(*) FROM openai_cache").fetchone()[0]
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "size": size,
+                "ttl": self.ttl,
+                "in_flight": len(self._inflight),
+            }
+
+
+openai_cache = ResponseCache()
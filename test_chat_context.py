@@ -0,0 +1,58 @@
+from chat_context import (
+    SUMMARY_PREFIX,
+    build_history,
+    count_tokens,
+    message_tokens,
+    prompt_tokens,
+    split_for_summary,
+    truncate_history,
+)
+
+
+def _msg(role, n_chars):
+    return {"role": role, "content": "x" * n_chars}
+
+
+def test_count_tokens_empty_and_growing():
+    assert count_tokens("") == 0
+    assert count_tokens(None) == 0
+    assert count_tokens("a" * 400) > count_tokens("a" * 40)
+
+
+def test_truncate_keeps_newest_within_budget():
+    history = [_msg("user", 40), _msg("assistant", 400), _msg("user", 40), _msg("assistant", 40)]
+    budget = sum(message_tokens(m) for m in history[-2:])
+    assert truncate_history(history, budget=budget) == history[-2:]
+    assert truncate_history(history, budget=10_000) == history
+
+
+def test_truncate_never_starts_with_an_answer():
+    history = [_msg("user", 4000), _msg("assistant", 40), _msg("user", 40), _msg("assistant", 40)]
+    budget = sum(message_tokens(m) for m in history[1:])
+    # the orphaned answer is dropped, its question did not fit
+    assert truncate_history(history, budget=budget) == history[2:]
+    assert truncate_history(history, budget=1) == []
+
+
+def test_split_for_summary_below_and_above_trigger():
+    history = [_msg("user", 400), _msg("assistant", 400), _msg("user", 40), _msg("assistant", 40)]
+    total = sum(message_tokens(m) for m in history)
+    assert split_for_summary(history, trigger=total) == ([], history)
+
+    keep = message_tokens(history[2]) + message_tokens(history[3])
+    to_fold, recent = split_for_summary(history, trigger=total - 1, keep_recent=keep)
+    assert to_fold == history[:2]
+    assert recent == history[2:]
+
+
+def test_build_history_puts_summary_first_and_respects_budget():
+    recent = [dict(_msg("user", 400), id=7), dict(_msg("assistant", 400), id=8),
+              dict(_msg("user", 40), id=9), dict(_msg("assistant", 40), id=10)]
+    history = build_history("Team X ist Dritter.", recent, fixed_tokens=100, budget=100 + 60)
+
+    assert history[0] == {"role": "system", "content": SUMMARY_PREFIX + "Team X ist Dritter."}
+    # only the last exchange fits; ids stay out of the prompt
+    assert history[1:] == [_msg("user", 40), _msg("assistant", 40)]
+    assert prompt_tokens(history) <= 60 + 3
+
+    assert build_history("", recent[2:], fixed_tokens=0) == [_msg("user", 40), _msg("assistant", 40)]
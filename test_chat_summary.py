@@ -0,0 +1,137 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+import chat_context
+from app import ChatMessage, ChatSummary, app, db
+
+QUESTION = "Wie stelle ich die Viererkette auf? " * 3
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    """Short fold trigger, no OpenAI: the stream answers "Antwort", summaries are recorded."""
+    events = []
+    release = threading.Event()
+    release.set()
+
+    def fake_stream(q, history=None):
+        events.append("stream")
+        yield "Ant"
+        yield "wort"
+
+    def fake_summarize(previous, messages):
+        release.wait(5)
+        events.append("summary")
+        return f"{previous}+{len(messages)}"
+
+    monkeypatch.setattr(app_module, "chat_free_stream", fake_stream)
+    monkeypatch.setattr(app_module, "summarize_chat", fake_summarize)
+    # fold as soon as there is more than one exchange
+    exchange = chat_context.message_tokens({"role": "user", "content": QUESTION}) + \
+        chat_context.message_tokens({"role": "assistant", "content": "Antwort"})
+    monkeypatch.setattr(app_module, "split_for_summary", lambda messages: chat_context.split_for_summary(
+        messages, trigger=exchange, keep_recent=exchange))
+    app.config["TESTING"] = True
+    with app.app_context():
+        ChatMessage.query.delete()
+        ChatSummary.query.delete()
+        db.session.commit()
+    return events, release
+
+
+def _ask(client, q):
+    return client.post("/chat/stream", data={"q": q}).get_data(as_text=True)
+
+
+def _summary():
+    with app.app_context():
+        summary = db.session.get(ChatSummary, "anon:chat1")
+        return (summary.content, summary.upto_message_id) if summary else None
+
+
+def _wait_for_folds():
+    app_module._chat_summary_executor.submit(lambda: None).result(5)
+    while app_module._chat_summary_inflight:
+        threading.Event().wait(0.01)
+
+
+def test_summary_is_folded_after_the_answer_not_before(chat):
+    events, release = chat
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["chat_id"] = "chat1"
+
+    assert "event: done" in _ask(client, QUESTION)
+    _wait_for_folds()
+    assert _summary() is None  # one short exchange: nothing to fold
+
+    # the fold hangs: the second answer still streams completely
+    release.clear()
+    body = _ask(client, QUESTION)
+    assert "event: token" in body and "event: done" in body
+    assert events == ["stream", "stream"]
+
+    release.set()
+    _wait_for_folds()
+    assert events == ["stream", "stream", "summary"]
+    content, upto = _summary()
+    assert content.startswith("+") and upto > 0
+
+    # the next prompt starts from the stored summary
+    with app.app_context():
+        history = app_module.chat_prompt_history("anon:chat1", "noch eine Frage")
+    assert history[0]["role"] == "system" and content in history[0]["content"]
+
+
+def test_first_summary_insert_race_becomes_an_update(chat, monkeypatch):
+    with app.app_context():
+        real_get = db.session.get
+
+        def get_while_another_request_inserts(model, key):
+            row = real_get(model, key)
+            if model is ChatSummary and row is None:
+                with db.engine.begin() as conn:  # the other request wins the insert
+                    conn.execute(ChatSummary.__table__.insert().values(
+                        owner_key=key, content="other", upto_message_id=3, updated_at=app_module.datetime.utcnow()))
+            return row
+
+        monkeypatch.setattr(db.session, "get", get_while_another_request_inserts)
+        app_module._store_chat_summary("anon:chat1", "mine", 7)
+        monkeypatch.undo()
+        db.session.remove()
+
+    assert _summary() == ("mine", 7)
+
+
+def test_summary_never_moves_back(chat):
+    with app.app_context():
+        app_module._store_chat_summary("anon:chat1", "further", 9)
+        app_module._store_chat_summary("anon:chat1", "older", 4)
+        db.session.remove()
+    assert _summary() == ("further", 9)
+
+
+def test_idle_anonymous_chats_are_pruned(chat):
+    old = datetime.utcnow() - timedelta(days=app_module.CHAT_ANON_RETENTION_DAYS + 1)
+    with app.app_context():
+        for owner, created_at in [
+            ("anon:idle", old), ("anon:idle", old),
+            ("anon:active", old), ("anon:active", datetime.utcnow()),  # still writing
+            ("coach:1", old),
+        ]:
+            db.session.add(ChatMessage(owner_key=owner, role="user", content="Hallo", created_at=created_at))
+        for owner in ("anon:idle", "anon:active", "coach:1"):
+            db.session.add(ChatSummary(owner_key=owner, content="…", upto_message_id=1))
+        db.session.commit()
+
+        assert app_module.run_housekeeping()["anonymous_chats"] == 1
+
+        owners = {m.owner_key for m in ChatMessage.query.all()}
+        assert owners == {"anon:active", "coach:1"}
+        assert ChatMessage.query.filter_by(owner_key="anon:active").count() == 2
+        assert {s.owner_key for s in ChatSummary.query.all()} == {"anon:active", "coach:1"}
+        assert app_module.prune_anonymous_chats() == 0
+        db.session.remove()
@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+from difflib import SequenceMatcher
+
+import pytest
+
+import club_directory as cd
+from club_directory import ClubDirectory, ClubTableCache, _ClubIndex
+from fvrz_scraper import normalize_team_name
+
+CLUBS = [(100 + i, name) for i, name in enumerate([
+    "FC Zürich", "FC Küsnacht", "SC Young Fellows Juventus", "FC Winterthur", "FC Wettswil-Bonstetten",
+    "FC Uster", "SV Höngg", "FC Thalwil", "FC Horgen", "FC Wädenswil", "FC Zürich-Affoltern", "FC Witikon",
+])]
+
+
+def _page(clubs):
+    return "".join(f'<a href="/desktopdefault.aspx/tabid-1186/v-{vid}/">{name}</a>' for vid, name in clubs)
+
+
+class _Response:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeFvrz:
+    """Answers like FVRZ: 200 with ETag, 304 for a matching If-None-Match."""
+
+    def __init__(self, clubs=CLUBS, etag='"v1"'):
+        self.clubs = clubs
+        self.etag = etag
+        self.calls = []
+        self.fail = False
+        self.gate = None  # threading.Event: block the request until set
+
+    def __call__(self, url, headers=None):
+        self.calls.append(dict(headers or {}))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise ConnectionError("fvrz down")
+        if headers and headers.get("If-None-Match") == self.etag:
+            return _Response(304)
+        return _Response(200, _page(self.clubs), {"ETag": self.etag})
+
+
+@pytest.fixture
+def fvrz(monkeypatch):
+    fake = FakeFvrz()
+    monkeypatch.setattr(cd, "http_get", fake)
+    return fake
+
+
+def _directory(tmp_path, ttl=3600):
+    return ClubDirectory(url="https://fvrz.test/clubs", path=str(tmp_path / "clubs.json"), ttl=ttl)
+
+
+def _expire(directory):
+    directory._meta["checked_at"] = time.time() - directory.ttl - 1
+
+
+@pytest.mark.parametrize("query", ["fc zürich", "küsnacht 2", "young fellows", "wädenswil a", "zurich affoltern", "uster"])
+def test_trigram_index_finds_the_same_club_as_a_full_scan(query):
+    index = _ClubIndex(CLUBS)
+    qn = normalize_team_name(query)
+
+    scores = [SequenceMatcher(None, qn, index.norms[i]).ratio() for i in range(len(CLUBS))]
+    best = max(range(len(CLUBS)), key=lambda i: (scores[i], -i))
+    assert index.best_match(qn) == (CLUBS[best], pytest.approx(scores[best]))
+
+
+def test_fetch_once_within_ttl_and_from_disk(tmp_path, fvrz):
+    directory = _directory(tmp_path)
+    assert directory.lookup("FC Zürich") == (100, "FC Zürich")
+    assert directory.lookup("FC Uster 2") == (105, "FC Uster")
+    assert len(fvrz.calls) == 1 and fvrz.calls[0] == {}
+
+    # a new process starts from the disk copy, within the TTL without asking FVRZ
+    assert json.load(open(tmp_path / "clubs.json"))["etag"] == '"v1"'
+    assert _directory(tmp_path).lookup("FC Horgen") == (108, "FC Horgen")
+    assert len(fvrz.calls) == 1
+
+
+def test_revalidates_with_etag_after_ttl(tmp_path, fvrz):
+    directory = _directory(tmp_path)
+    directory.lookup("FC Zürich")
+
+    _expire(directory)
+    assert directory.lookup("FC Horgen") == (108, "FC Horgen")
+    assert fvrz.calls[-1] == {"If-None-Match": '"v1"'}
+    assert directory.info()["not_modified"] == 1
+
+    fvrz.clubs, fvrz.etag = CLUBS + [(999, "FC Neu")], '"v2"'
+    _expire(directory)
+    assert directory.lookup("FC Neu") == (999, "FC Neu")
+    assert directory.info()["fetches"] == 2 and directory.info()["etag"] == '"v2"'
+
+
+def test_keeps_the_known_list_when_fvrz_is_down(tmp_path, fvrz):
+    directory = _directory(tmp_path)
+    directory.lookup("FC Zürich")
+
+    fvrz.fail = True
+    _expire(directory)
+    assert directory.lookup("FC Horgen") == (108, "FC Horgen")
+    directory.lookup("FC Uster")  # checked_at renewed: no second attempt right away
+    assert len(fvrz.calls) == 2
+    assert directory.info()["errors"] == 1
+
+
+def test_lookups_do_not_wait_for_a_revalidation(tmp_path, fvrz):
+    directory = _directory(tmp_path)
+    directory.lookup("FC Zürich")
+
+    fvrz.gate = threading.Event()
+    _expire(directory)
+    refresher = threading.Thread(target=directory.lookup, args=("FC Uster",))
+    refresher.start()
+    while len(fvrz.calls) < 2:
+        time.sleep(0.001)
+
+    # FVRZ hangs: other threads search the known list, info() answers, nobody asks FVRZ again
+    started = time.time()
+    assert directory.lookup("FC Horgen") == (108, "FC Horgen")
+    assert directory.info()["clubs"] == len(CLUBS)
+    assert time.time() - started < 1
+    assert len(fvrz.calls) == 2
+
+    fvrz.gate.set()
+    refresher.join()
+    assert directory.info()["not_modified"] == 1
+
+
+def test_cold_start_fetches_once_for_concurrent_lookups(tmp_path, fvrz):
+    directory = _directory(tmp_path)
+    fvrz.gate = threading.Event()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(directory.lookup("FC Zürich"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    fvrz.gate.set()
+    for t in threads:
+        t.join()
+    assert results == [(100, "FC Zürich")] * 5
+    assert len(fvrz.calls) == 1
+    assert directory.info()["lookups"] == 5
+
+
+def test_table_cache_lru_eviction():
+    cache = ClubTableCache(ttl=3600, maxsize=2)
+    cache.put(1, ["a"])
+    cache.put(2, ["b"])
+    assert cache.get(1)[0] == ["a"]  # 1 is now the most recent
+    cache.put(3, ["c"])
+
+    assert cache.get(2) is None
+    assert cache.get(1)[0] == ["a"] and cache.get(3)[0] == ["c"]
+    assert cache.info() == {"hits": 3, "misses": 1, "hit_rate": 0.75, "size": 2, "maxsize": 2, "ttl": 3600}
+
+
+def test_table_cache_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cd.time, "time", lambda: now[0])
+    cache = ClubTableCache(ttl=60, maxsize=10)
+    cache.put(1, ["a"])
+
+    now[0] += 30
+    rows, age = cache.get(1)
+    assert rows == ["a"] and age == 30
+
+    now[0] += 30
+    assert cache.get(1) is None
+    assert cache.info()["size"] == 0
+
+
+def test_table_cache_disabled_with_size_zero():
+    cache = ClubTableCache(ttl=60, maxsize=0)
+    cache.put(1, ["a"])
+    assert cache.get(1) is None
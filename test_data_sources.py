@@ -0,0 +1,156 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_sources
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Empty DATA_CACHE_DIR + a small workbook; counts every pd.read_excel / sha256 call."""
+    cache_dir = tmp_path / "data_cache"
+    monkeypatch.setattr(data_sources, "DATA_CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(data_sources, "MANIFEST_PATH", str(cache_dir / "manifest.json"))
+    monkeypatch.setattr(data_sources, "_manifest", None)
+    monkeypatch.setattr(data_sources, "_manifest_mtime", None)
+    monkeypatch.setattr(data_sources, "_fresh_cache", {})
+
+    calls = {"read_excel": 0, "sha256": 0}
+    read_excel, sha256_file = pd.read_excel, data_sources._sha256_file
+
+    def counting_read_excel(*args, **kwargs):
+        calls["read_excel"] += 1
+        return read_excel(*args, **kwargs)
+
+    def counting_sha256(path):
+        calls["sha256"] += 1
+        return sha256_file(path)
+
+    monkeypatch.setattr(pd, "read_excel", counting_read_excel)
+    monkeypatch.setattr(data_sources, "_sha256_file", counting_sha256)
+
+    source = str(tmp_path / "trainings.xlsx")
+    pd.DataFrame({"Part": [1, 2], "Setup": ["Rondo", "Abschluss"]}).to_excel(source, index=False)
+    return source, calls
+
+
+def _entry(source):
+    return data_sources.load_manifest()["sources"][source]
+
+
+def test_fresh_binary_copy_is_used(cache):
+    source, calls = cache
+    data_sources.convert_all([source])
+    assert _entry(source)["format"] == "npz"
+    calls["read_excel"] = 0
+
+    df = data_sources.read_table(source)
+
+    assert calls["read_excel"] == 0
+    assert df["Setup"].tolist() == ["Rondo", "Abschluss"]
+    assert df["Part"].tolist() == [1, 2]
+
+
+def test_changed_source_falls_back_to_excel_and_rewrites_the_copy(cache):
+    source, calls = cache
+    data_sources.convert_all([source])
+    old_sha = _entry(source)["sha256"]
+    pd.DataFrame({"Part": [1, 2, 3], "Setup": ["Rondo", "Abschluss", "Spielform"]}).to_excel(source, index=False)
+    calls["read_excel"] = 0
+
+    df = data_sources.read_table(source)
+    assert calls["read_excel"] == 1
+    assert df["Setup"].tolist() == ["Rondo", "Abschluss", "Spielform"]
+
+    entry = _entry(source)
+    assert entry["sha256"] != old_sha
+    assert entry["rows"] == 3
+
+    # the rewritten copy serves the next read
+    pd.testing.assert_frame_equal(data_sources.read_table(source), df)
+    assert calls["read_excel"] == 1
+
+
+def test_touched_source_with_same_content_is_not_rebuilt(cache):
+    source, calls = cache
+    data_sources.convert_all([source])
+    entry = _entry(source)
+    calls["read_excel"] = calls["sha256"] = 0
+
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    for _ in range(3):
+        data_sources.read_table(source)
+
+    assert calls["read_excel"] == 0
+    assert calls["sha256"] == 1  # hashed once per (mtime, size)
+    assert _entry(source)["converted_at"] == entry["converted_at"]
+
+
+def test_npz_round_trip_keeps_dtypes_and_nans(tmp_path):
+    df = pd.DataFrame({
+        "i": np.array([1, 2, 3], dtype="int64"),
+        "f": [1.5, np.nan, 3.0],
+        "u": np.array([1, 2, 3], dtype="uint8"),
+        "b": [True, False, True],
+        "s": ["a", "ä", ""],
+    })
+    assert data_sources._npz_compatible(df)
+
+    path = str(tmp_path / "t.npz")
+    data_sources._write_npz(df, path)
+    back = data_sources._read_npz(path)
+
+    pd.testing.assert_frame_equal(back, df)
+    assert back["f"].isna().tolist() == [False, True, False]
+
+
+def test_mixed_object_column_goes_to_pickle_with_nans(cache):
+    source, calls = cache
+    pd.DataFrame({"Part": [1, 2], "Setup": ["Rondo", None]}).to_excel(source, index=False)
+    data_sources.convert_all([source])
+    assert _entry(source)["format"] == "pkl"
+    calls["read_excel"] = 0
+
+    df = data_sources.read_table(source)
+
+    assert calls["read_excel"] == 0
+    assert df["Setup"].iloc[0] == "Rondo"
+    assert pd.isna(df["Setup"].iloc[1])
+
+
+@pytest.mark.parametrize("damage", ["garbage", "missing"])
+def test_corrupt_or_missing_binary_falls_back_to_excel(cache, damage):
+    source, calls = cache
+    data_sources.convert_all([source])
+    binary = _entry(source)["binary"]
+    if damage == "garbage":
+        with open(binary, "wb") as f:
+            f.write(b"not a zip file")
+    else:
+        os.remove(binary)
+    calls["read_excel"] = 0
+
+    df = data_sources.read_table(source)
+    assert calls["read_excel"] == 1
+    assert df["Setup"].tolist() == ["Rondo", "Abschluss"]
+
+    # the copy was rewritten
+    data_sources.read_table(source)
+    assert calls["read_excel"] == 1
+
+
+def test_read_only_cache_still_reads_excel(cache, monkeypatch):
+    source, calls = cache
+    data_sources.convert_all([source])
+    pd.DataFrame({"Part": [9], "Setup": ["Neu"]}).to_excel(source, index=False)
+
+    def fail(*args, **kwargs):
+        raise PermissionError("read-only")
+
+    monkeypatch.setattr(data_sources, "_atomic_write", fail)
+
+    assert data_sources.read_table(source)["Setup"].tolist() == ["Neu"]
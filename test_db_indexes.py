@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import case, func, text
+
+from app import Coach, Feedback, FeedbackVote, Player, Training, app, db, migrate_db
+
+
+@pytest.fixture
+def ctx():
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+def _plan(query) -> str:
+    stmt = getattr(query, "statement", query)
+    sql = str(stmt.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    rows = db.session.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_player_list_uses_index_without_sort(ctx):
+    plan = _plan(Player.query.filter_by(coach_id=1).order_by(Player.last_name, Player.first_name))
+    assert "ix_player_coach_name" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_training_list_uses_index_without_sort(ctx):
+    plan = _plan(Training.query.filter_by(coach_id=1).order_by(Training.created_at.desc()))
+    assert "ix_training_coach_created" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_vote_sums_and_my_votes_read_only_the_index(ctx):
+    sums = db.session.query(
+        FeedbackVote.feedback_id,
+        func.sum(case((FeedbackVote.value == 1, 1), else_=0)),
+        func.sum(case((FeedbackVote.value == -1, 1), else_=0)),
+    ).group_by(FeedbackVote.feedback_id)
+    plan = _plan(sums)
+    assert "COVERING INDEX ix_feedback_vote_feedback_value" in plan
+    assert "TEMP B-TREE" not in plan
+
+    mine = db.session.query(FeedbackVote.feedback_id, FeedbackVote.value).filter(FeedbackVote.coach_id == 1)
+    assert "COVERING INDEX ix_feedback_vote_coach" in _plan(mine)
+
+
+def test_feedback_lookups_use_indexes(ctx):
+    assert "ix_feedback_created_at" in _plan(Feedback.query.order_by(Feedback.created_at.desc()))
+    assert "ix_feedback_coach_id" in _plan(Feedback.query.filter_by(coach_id=1))
+
+
+def test_coach_email_lookup_is_case_insensitive_and_indexed(ctx):
+    assert "ix_coach_email_lower" in _plan(Coach.query.filter(func.lower(Coach.email) == "max@example.ch"))
+
+
+def test_migrate_adds_indexes_to_existing_database(ctx):
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_player_coach_name"))
+        conn.execute(text("DROP INDEX ix_coach_email_lower"))
+
+    migrate_db()
+
+    names = {row[0] for row in db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert {"ix_player_coach_name", "ix_coach_email_lower"} <= names
@@ -0,0 +1,193 @@
+import socket
+import threading
+import time
+
+import requests
+from mailchimp_transactional.api_client import ApiClientError
+
+import email_outbox as outbox_module
+from email_outbox import EmailOutbox
+from email_utils import MandrillTransport
+from mandrill_stub import start_stub
+
+
+class FakeMandrill:
+    def __init__(self, fail_times=0, error=None, reject=()):
+        self.calls = []
+        self.fail_times = fail_times
+        self.error = error
+        self.reject = set(reject)
+        self._lock = threading.Lock()
+
+    def __call__(self, message, template_name=None):
+        with self._lock:
+            self.calls.append((template_name, message))
+            if self.error is not None:
+                raise self.error
+            if self.fail_times:
+                self.fail_times -= 1
+                raise ApiClientError(text={"status": "error", "name": "GeneralError"}, status_code=500)
+        return [
+            {"email": t["email"], "status": "rejected" if t["email"] in self.reject else "sent",
+             "_id": f"id-{t['email']}", "reject_reason": "hard-bounce" if t["email"] in self.reject else None}
+            for t in message["to"]
+        ]
+
+
+def _transport_sender(transport):
+    def send(message, template_name=None):
+        return transport.send(message)
+    return send
+
+
+def _outbox(tmp_path, sender, batch_size=50):
+    return EmailOutbox(path=str(tmp_path / "outbox.db"), sender=sender, is_configured=lambda: True,
+                       batch_size=batch_size)
+
+
+def _welcome(outbox, n, **kw):
+    for i in range(n):
+        outbox.enqueue(f"coach{i}@example.ch", "Willkommen", "Hallo {{{name}}}", "<p>Hallo {{name}}</p>",
+                       merge_vars={"name": f"Coach {i}"}, **kw)
+
+
+def _statuses(outbox):
+    return outbox.info()["statuses"]
+
+
+def test_identical_content_is_batched_with_per_recipient_merge_vars(tmp_path):
+    mandrill = FakeMandrill()
+    outbox = _outbox(tmp_path, mandrill, batch_size=50)
+    _welcome(outbox, 120)
+    outbox.enqueue("coach1@example.ch", "Passwort", "Link {{{reset_url}}}", merge_vars={"reset_url": "x"})
+
+    assert outbox.drain() == 121
+    # 120 welcome mails in chunks of 50 + the reset mail on its own
+    assert sorted(len(m["to"]) for _, m in mandrill.calls) == [1, 20, 50, 50]
+    _, message = mandrill.calls[0]
+    assert message["preserve_recipients"] is False
+    assert message["merge_vars"][0] == {"rcpt": "coach0@example.ch", "vars": [{"name": "name", "content": "Coach 0"}]}
+    assert _statuses(outbox) == {"sent": 121}
+
+
+def test_same_address_is_never_twice_in_one_call(tmp_path):
+    mandrill = FakeMandrill()
+    outbox = _outbox(tmp_path, mandrill)
+    for url in ("a", "b"):
+        outbox.enqueue("coach@example.ch", "Passwort", "Link {{{reset_url}}}", merge_vars={"reset_url": url})
+    outbox.drain()
+    assert [len(m["to"]) for _, m in mandrill.calls] == [1, 1]
+
+
+def test_idempotency_key_enqueue_and_concurrent_drains(tmp_path):
+    mandrill = FakeMandrill()
+    outbox = _outbox(tmp_path, mandrill, batch_size=5)
+    for _ in range(3):
+        _welcome(outbox, 20)  # double submits: same content → same key
+    outbox.enqueue("x@example.ch", "A", "a", idempotency_key="welcome:1")
+    outbox.enqueue("x@example.ch", "B", "b", idempotency_key="welcome:1")
+
+    threads = [threading.Thread(target=outbox.drain) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    recipients = [t["email"] for _, m in mandrill.calls for t in m["to"]]
+    assert len(recipients) == 21 == len(set(recipients))
+    assert [m["subject"] for _, m in mandrill.calls if m["to"][0]["email"] == "x@example.ch"] == ["A"]
+
+
+def test_api_errors_wait_for_backoff_then_retry(tmp_path, monkeypatch):
+    mandrill = FakeMandrill(fail_times=1)
+    outbox = _outbox(tmp_path, mandrill)
+    _welcome(outbox, 3)
+
+    outbox.drain()
+    outbox.drain()  # not due yet
+    assert _statuses(outbox) == {"pending": 3}
+    assert len(mandrill.calls) == 1
+
+    monkeypatch.setattr(outbox_module, "EMAIL_OUTBOX_BACKOFF", 0.0)
+    mandrill.fail_times = 2
+    _welcome(outbox, 4)
+    outbox.drain()
+    assert _statuses(outbox) == {"pending": 3, "sent": 1}
+
+
+def test_backoff_grows_and_gives_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(outbox_module, "EMAIL_OUTBOX_MAX_ATTEMPTS", 2)
+    assert outbox_module.backoff_delay(3) > outbox_module.backoff_delay(1) * 2
+
+    monkeypatch.setattr(outbox_module, "EMAIL_OUTBOX_BACKOFF", 0.0)
+    outbox = _outbox(tmp_path, FakeMandrill(fail_times=5))
+    _welcome(outbox, 1)
+    outbox.drain()
+    outbox.drain()
+    assert _statuses(outbox) == {"failed": 1}
+
+
+def test_rejected_and_ambiguous_failures_are_not_resent(tmp_path):
+    mandrill = FakeMandrill(reject={"coach1@example.ch"})
+    outbox = _outbox(tmp_path, mandrill)
+    _welcome(outbox, 2)
+    outbox.drain()
+    assert _statuses(outbox) == {"failed": 1, "sent": 1}
+
+    # the request reached the stub, the answer did not come back in time
+    stub = start_stub(latency=0.5)
+    try:
+        transport = MandrillTransport("key", stub.api_url)
+        transport.client.api_client.set_timeout(0.1)
+        outbox = _outbox(tmp_path / "read-timeout", _transport_sender(transport))
+        _welcome(outbox, 2)
+        outbox.drain()
+        outbox.drain()
+    finally:
+        stub.stop()
+    assert _statuses(outbox) == {"unknown": 2}
+
+
+def test_connect_errors_are_retried_with_backoff(tmp_path):
+    with socket.socket() as s:  # a port nobody listens on
+        s.bind(("127.0.0.1", 0))
+        closed_port = s.getsockname()[1]
+    outbox = _outbox(tmp_path, _transport_sender(MandrillTransport("key", f"http://127.0.0.1:{closed_port}/api/1.3")))
+    _welcome(outbox, 2)
+    outbox.drain()
+    assert _statuses(outbox) == {"pending": 2}
+    conn = outbox._conn()
+    assert conn.execute("SELECT MIN(attempts), MIN(next_attempt_at) > ? FROM email_outbox", (time.time(),)).fetchone() == (1, 1)
+
+    conn.execute("UPDATE email_outbox SET next_attempt_at = 0")  # backoff over
+    conn.commit()
+    outbox.sender = mandrill = FakeMandrill()
+    outbox.drain()
+    assert len(mandrill.calls) == 1
+    assert _statuses(outbox) == {"sent": 2}
+
+
+def test_request_not_sent_classification():
+    assert outbox_module.request_not_sent(requests.exceptions.ConnectTimeout())
+    assert not outbox_module.request_not_sent(requests.exceptions.ReadTimeout())
+    assert not outbox_module.request_not_sent(requests.exceptions.ConnectionError("Connection aborted."))
+    assert not outbox_module.request_not_sent(TimeoutError("read timed out"))
+
+
+def test_done_rows_drop_merge_vars_and_are_pruned(tmp_path):
+    outbox = _outbox(tmp_path, FakeMandrill(reject={"coach1@example.ch"}))
+    outbox.enqueue("coach0@example.ch", "Passwort", "Link {{{reset_url}}}", merge_vars={"reset_url": "https://x/token"})
+    outbox.enqueue("coach1@example.ch", "Passwort", "Link {{{reset_url}}}", merge_vars={"reset_url": "https://x/other"})
+    outbox.enqueue("coach2@example.ch", "Später", "b")
+    conn = outbox._conn()
+    conn.execute("UPDATE email_outbox SET next_attempt_at = next_attempt_at + 3600 WHERE to_email = 'coach2@example.ch'")
+    conn.commit()
+    outbox.drain()
+
+    assert {row[0] for row in conn.execute("SELECT merge_vars FROM email_outbox WHERE status != 'pending'")} == {"{}"}
+
+    assert outbox.prune(keep_days=1) == 0
+    conn.execute("UPDATE email_outbox SET created_at = created_at - 2 * 86400")
+    conn.commit()
+    assert outbox.prune(keep_days=1) == 2
+    assert _statuses(outbox) == {"pending": 1}
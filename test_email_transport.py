@@ -0,0 +1,46 @@
+import pytest
+from mailchimp_transactional.api_client import ApiClientError
+
+import email_utils
+from email_utils import LogTransport, MandrillTransport, send_batch, send_email, send_email_template, set_transport
+from mandrill_stub import start_stub
+
+
+@pytest.fixture
+def stub():
+    server = start_stub()
+    set_transport(MandrillTransport("stub-key", server.api_url))
+    yield server
+    set_transport(None)
+    server.stop()
+
+
+def test_send_email_and_template_through_stub(stub):
+    assert send_email("coach@example.ch", "Hallo", "Text")
+    assert send_email_template("coach@example.ch", "registration_welcome", {"name": "Max"})
+    assert stub.stats.as_dict() == {"calls": 2, "errors": 0, "recipients": 2, "templates": 1}
+
+
+def test_stub_errors_surface_as_api_client_error(stub):
+    stub.error_rate = 1.0
+    assert send_email("coach@example.ch", "Hallo", "Text") is False
+    with pytest.raises(ApiClientError) as exc:
+        send_batch({"to": [{"email": "a@example.ch", "type": "to"}], "subject": "x", "text": "x"})
+    assert exc.value.status_code == 500
+    assert exc.value.text["name"] == "GeneralError"
+
+
+def test_batch_returns_one_result_per_recipient(stub):
+    to = [{"email": f"c{i}@example.ch", "type": "to"} for i in range(5)]
+    results = send_batch({"to": to, "preserve_recipients": False, "subject": "x", "text": "x"})
+    assert [r["email"] for r in results] == [t["email"] for t in to]
+    assert {r["status"] for r in results} == {"sent"}
+
+
+def test_log_transport_sends_nothing():
+    set_transport(LogTransport())
+    try:
+        assert send_email("coach@example.ch", "Hallo", "Text")
+        assert email_utils.mail_configured()
+    finally:
+        set_transport(None)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import ml_model
+from forest_engine import CompiledForest
+from position_table import PositionTable
+
+
+def _random_attrs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    ints = rng.integers(1, 11, size=(n, len(ml_model.FEATURE_COLS))).astype(float)
+    floats = rng.uniform(1.0, 10.0, size=(n, len(ml_model.FEATURE_COLS)))
+    return np.vstack([ints, floats])
+
+
+def test_parity_on_small_forest():
+    rng = np.random.default_rng(1)
+    X = rng.uniform(1.0, 10.0, size=(400, 5))
+    y = np.where(X[:, 0] + rng.normal(size=400) > 5.5, "ST", np.where(X[:, 1] > 4, "CM", "CB"))
+
+    rf = RandomForestClassifier(n_estimators=20, min_samples_leaf=2, random_state=0).fit(X, y)
+    cf = CompiledForest.from_sklearn(rf)
+
+    X_test = rng.uniform(0.0, 11.0, size=(300, 5))
+    assert list(cf.classes_) == list(rf.classes_)
+    np.testing.assert_allclose(cf.predict_proba(X_test), rf.predict_proba(X_test), rtol=0, atol=1e-12)
+
+
+def test_parity_with_position_model():
+    model = ml_model.get_position_model()
+    if model is None:
+        pytest.skip("no trained model artifact")
+
+    rf = model.named_steps["rf"]
+    cf = CompiledForest.from_sklearn(rf)
+
+    X = _random_attrs(100)
+    expected = model.predict_proba(pd.DataFrame(X, columns=ml_model.FEATURE_COLS))
+    np.testing.assert_allclose(cf.predict_proba(X), expected, rtol=0, atol=1e-12)
+
+    # single row, as used by recommend_position_from_attributes
+    np.testing.assert_allclose(cf.predict_proba(X[:1]), expected[:1], rtol=0, atol=1e-12)
+
+
+def test_position_table_exact_on_grid():
+    rng = np.random.default_rng(2)
+    X = rng.uniform(1.0, 10.0, size=(400, 4))
+    y = np.where(X[:, 0] > 5.2, "ST", np.where(X[:, 2] > 3.7, "CM", "CB"))
+    rf = RandomForestClassifier(n_estimators=15, min_samples_leaf=2, random_state=0).fit(X, y)
+
+    table = PositionTable.build(rf, ["a", "b", "c", "d"], {"d": 5.0}, grid_min=1, grid_max=10)
+
+    X_grid = rng.integers(1, 11, size=(300, 4)).astype(float)
+    X_grid[:, 3] = 5.0
+    assert table.covers(X_grid).all()
+    np.testing.assert_allclose(table.predict_proba(X_grid), rf.predict_proba(X_grid), rtol=0, atol=1e-12)
+
+    off_grid = np.array([[1.5, 2, 3, 5], [1, 2, 3, 4], [0, 2, 3, 5], [1, 2, 11, 5]], dtype=float)
+    assert not table.covers(off_grid).any()
@@ -0,0 +1,113 @@
+"""
+Golden-file tests for the FVRZ table extraction engine (fvrz_scraper).
+
+Regenerate the .rows.json files after an intended parser change with
+    UPDATE_GOLDEN=1 python -m pytest test_fvrz_parser.py
+"""
+import dataclasses
+import json
+import os
+
+import pytest
+
+from fvrz_scraper import find_team_row, normalize_team_name, parse_rank_goals_matches, parse_table_rows
+
+FIXTURES = "fixtures"
+PAGES = [
+    "fvrz_matchcenter_club.html",        # matchcenter.fvrz.ch, <table> rows
+    "fvrz_club_matchcenter_text.html",   # www.fvrz.ch club page, ranking without <table>
+]
+
+
+def _read(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_rows_match_golden_file(page):
+    rows = [dataclasses.asdict(r) for r in parse_table_rows(_read(page))]
+    golden_path = os.path.join(FIXTURES, page.replace(".html", ".rows.json"))
+
+    if os.environ.get("UPDATE_GOLDEN") == "1":
+        with open(golden_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=1)
+
+    with open(golden_path, "r", encoding="utf-8") as f:
+        assert rows == json.load(f)
+
+
+def test_table_page_rows():
+    rows = parse_table_rows(_read("fvrz_matchcenter_club.html"))
+    # 9 league tables à 13 teams; header rows and fixture lists are no ranking rows
+    assert len(rows) == 117
+    assert [r.rank for r in rows[:13]] == list(range(1, 14))
+    assert all(r.wins + r.draws + r.losses == r.matches for r in rows)
+    assert any(r.penalty_points < 0 for r in rows)
+
+
+def test_text_page_rows():
+    rows = parse_table_rows(_read("fvrz_club_matchcenter_text.html"))
+    assert [r.rank for r in rows] == list(range(1, 13))
+    # "3. Liga Gruppe 4" heading must not end up in the first team name
+    assert rows[0].team == "FC Hinwil 1"
+    assert {r.team: r.penalty_points for r in rows if r.penalty_points} == {"FC Uster 2": -3, "SC Zollikon 1": -3}
+
+
+def test_one_parse_answers_many_queries():
+    rows = parse_table_rows(_read("fvrz_club_matchcenter_text.html"))
+    assert find_team_row(rows, "fc wetzikon").team == "FC Wetzikon 1"
+    assert find_team_row(rows, "Hinwil 2").team == "FC Hinwil 2"
+    assert find_team_row(rows, "Dübendorf").team == "FC Dübendorf 2"
+    assert find_team_row(rows, "Grasshoppers") is None
+    assert find_team_row(rows, "") is None
+
+
+def test_first_team_bonus_with_club_name():
+    rows = parse_table_rows(_read("fvrz_matchcenter_club.html"))
+    assert find_team_row(rows, "Hinwil", club_name="FC Hinwil").team == "FC Hinwil 1"
+
+
+def test_parse_rank_goals_matches_result_shape():
+    team = parse_rank_goals_matches(_read("fvrz_club_matchcenter_text.html").decode("utf-8"), "FC Uster 2")
+    assert team == {
+        "name": "FC Uster 2",
+        "rank": 4,
+        "matches": 12,
+        "wins": 5,
+        "draws": 7,
+        "losses": 0,
+        "goals_for": 25,
+        "goals_against": 33,
+        "penalty_points": -3,
+    }
+
+
+def test_normalize_team_name():
+    assert normalize_team_name("  FC  Hinwil 1. Mannschaft ") == "hinwil"
+    assert normalize_team_name("SV Rümlang") == "rümlang"
+    assert normalize_team_name(None) == ""
+
+
+def _latin1(page: str, meta: bool = True) -> bytes:
+    text = _read(page).decode("utf-8")
+    declared = 'charset="iso-8859-1"' if meta else ""
+    text = text.replace('content="text/html; charset=utf-8"', f'content="text/html; {declared}"')
+    text = text.replace('<meta charset="utf-8">', f"<meta {declared}>")
+    return text.encode("iso-8859-1")
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_latin1_page_by_meta_charset(page):
+    expected = [r.team for r in parse_table_rows(_read(page))]
+    assert [r.team for r in parse_table_rows(_latin1(page))] == expected
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_latin1_page_by_http_charset(page):
+    # no <meta> charset: only the Content-Type header of the response tells
+    data = _latin1(page, meta=False)
+    rows = parse_table_rows(data, encoding="ISO-8859-1")
+    assert [r.team for r in rows] == [r.team for r in parse_table_rows(_read(page))]
+    assert any("ü" in r.team for r in rows)
+    assert find_team_row(rows, "Dübendorf 2") is not None
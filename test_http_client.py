@@ -0,0 +1,162 @@
+import http.server
+import threading
+import time
+
+import pytest
+import urllib3.exceptions
+
+from http_client import HostPolicy, HttpClient
+
+
+class _StandIn(http.server.BaseHTTPRequestHandler):
+    """Local stand-in for FVRZ/OpenAI: keep-alive, scripted failures, slow responses."""
+
+    protocol_version = "HTTP/1.1"
+    fail_first = 0
+    fail_status = 503
+    calls = 0
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def _reply(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.calls += 1
+            call = cls.calls
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.2)
+            if self.path.startswith("/flaky") and call <= cls.fail_first:
+                self._reply(503, b"busy")
+            else:
+                self._reply(200, b"ok")
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def do_POST(self):
+        cls = type(self)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        with cls.lock:
+            cls.calls += 1
+            call = cls.calls
+        if self.path.startswith("/slow"):
+            time.sleep(0.2)
+        if self.path.startswith("/flaky") and call <= cls.fail_first:
+            self._reply(cls.fail_status, b"busy")
+        else:
+            self._reply(200, body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _StandIn.calls = _StandIn.active = _StandIn.max_active = _StandIn.fail_first = 0
+    _StandIn.fail_status = 503
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def _client(**policy):
+    return HttpClient(policies={"127.0.0.1": HostPolicy(backoff=0.01, **policy)})
+
+
+def test_keep_alive_reuses_one_connection(server):
+    client = _client()
+    for _ in range(10):
+        assert client.get(server + "/").text == "ok"
+    assert client.post(server + "/echo", data=b"hi").text == "hi"
+
+    m = client.metrics()[server]
+    assert m["requests"] == 11
+    assert m["connections_opened"] == 1
+    assert m["connection_reuse"] == pytest.approx(10 / 11)
+
+
+def test_retries_with_backoff_on_503(server):
+    _StandIn.fail_first = 2
+    client = _client(retries=2)
+    r = client.get(server + "/flaky")
+    assert r.status_code == 200
+    assert _StandIn.calls == 3
+    assert client.metrics()[server]["retries"] == 2
+
+
+def test_retries_are_bounded(server):
+    _StandIn.fail_first = 10
+    client = _client(retries=1)
+    r = client.get(server + "/flaky")
+    assert r.status_code == 503
+    assert _StandIn.calls == 2
+
+
+def test_per_host_timeout(server):
+    client = _client(timeout=0.05, retries=0)
+    with pytest.raises(Exception):
+        client.get(server + "/slow")
+    assert client.metrics()[server]["errors"] == 1
+
+
+def test_concurrency_limit_per_host(server):
+    client = _client(max_concurrency=2)
+    threads = [threading.Thread(target=client.get, args=(server + "/slow",)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert _StandIn.calls == 6
+    assert _StandIn.max_active <= 2
+    assert client.metrics()[server]["connections_opened"] <= 2
+
+
+def test_post_is_resent_only_for_post_retry_statuses(server):
+    _StandIn.fail_first = 1
+    client = _client(retries=2, post_retry_statuses=(429, 503))
+    assert client.post(server + "/flaky", data=b"hi").text == "hi"
+    assert _StandIn.calls == 2
+
+    # a 500 may have been processed (and billed): no second POST
+    _StandIn.calls, _StandIn.fail_first, _StandIn.fail_status = 0, 1, 500
+    assert client.post(server + "/flaky", data=b"hi").status_code == 500
+    assert _StandIn.calls == 1
+
+    # default policy: a POST is never re-sent after a status
+    _StandIn.calls, _StandIn.fail_status = 0, 503
+    assert _client(retries=2).post(server + "/flaky", data=b"hi").status_code == 503
+    assert _StandIn.calls == 1
+
+
+def test_post_read_timeout_is_not_resent(server):
+    client = _client(retries=2, timeout=0.05, post_retry_statuses=(429, 503))
+    with pytest.raises(Exception):
+        client.post(server + "/slow", data=b"hi")
+    time.sleep(0.3)
+    assert _StandIn.calls == 1
+
+
+def test_post_retried_after_connect_errors_but_not_read_errors(server):
+    retry = _client(retries=2, post_retry_statuses=(429, 503))._host(server).adapter.max_retries
+    url = server + "/"
+
+    retry = retry.increment("POST", url, error=urllib3.exceptions.NewConnectionError(None, "refused"))
+    retry = retry.increment("POST", url, error=urllib3.exceptions.ConnectTimeoutError())
+    assert len(retry.history) == 2
+    assert retry.post_statuses == {429, 503}
+    with pytest.raises(urllib3.exceptions.ReadTimeoutError):
+        retry.increment("POST", url, error=urllib3.exceptions.ReadTimeoutError(None, url, "read timed out"))
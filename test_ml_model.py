@@ -0,0 +1,150 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ml_model
+
+
+@pytest.fixture
+def artifact_dir(tmp_path, monkeypatch):
+    """ml_model paths pointed at tmp_path, with a tiny training frame instead of the Excel file."""
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(rng.integers(20, 99, size=(60, len(ml_model.FEATURE_COLS))), columns=ml_model.FEATURE_COLS)
+    frame["Position"] = np.where(frame["Finishing"] > 60, "ST", np.where(frame["Tackling"] > 60, "CB", "CM"))
+
+    training_path = tmp_path / "train.xlsx"
+    training_path.write_bytes(b"training data v1")
+
+    monkeypatch.setattr(ml_model, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(ml_model, "MODEL_PATH", str(tmp_path / "position_model.joblib"))
+    monkeypatch.setattr(ml_model, "MODEL_META_PATH", str(tmp_path / "position_model.json"))
+    monkeypatch.setattr(ml_model, "MODEL_LOCK_PATH", str(tmp_path / "position_model.lock"))
+    monkeypatch.setattr(ml_model, "TRAINING_DATA_PATH", str(training_path))
+    monkeypatch.setattr(ml_model, "RF_PARAMS", {"n_estimators": 3, "random_state": 0, "n_jobs": 1})
+    monkeypatch.setattr(ml_model, "read_table", lambda path: frame.copy())
+
+    trainings = []
+    train = ml_model._train_position_model_from_excel
+
+    def counting_train():
+        trainings.append(threading.current_thread().name)
+        return train()
+
+    monkeypatch.setattr(ml_model, "_train_position_model_from_excel", counting_train)
+    return tmp_path, training_path, trainings
+
+
+def test_current_artifact_is_loaded_without_retraining(artifact_dir):
+    tmp_path, _, trainings = artifact_dir
+    _, meta = ml_model.load_position_model()
+    assert len(trainings) == 1
+    assert meta["trained_at"].endswith("+00:00")
+
+    model, meta_again = ml_model.load_position_model()
+    assert len(trainings) == 1
+    assert meta_again == meta
+    assert list(model.named_steps["rf"].classes_) == meta["classes"]
+
+
+def test_fingerprint_mismatch_rebuilds(artifact_dir):
+    _, training_path, trainings = artifact_dir
+    _, meta = ml_model.load_position_model()
+
+    training_path.write_bytes(b"training data v2")
+    _, meta_new = ml_model.load_position_model()
+
+    assert len(trainings) == 2
+    assert meta_new["fingerprint"] != meta["fingerprint"]
+    assert meta_new["fingerprint"] == ml_model._training_fingerprint()
+
+
+@pytest.mark.skipif(ml_model.fcntl is None, reason="build lock needs fcntl")
+def test_concurrent_loads_build_once_and_atomically(artifact_dir):
+    tmp_path, _, trainings = artifact_dir
+    results = []
+
+    def load():
+        results.append(ml_model.load_position_model()[1]["model_version"])
+
+    threads = [threading.Thread(target=load) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(trainings) == 1
+    assert len(results) == 6 and len(set(results)) == 1
+    # only the final files are left, no half-written tmp files
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def _attrs(n, seed=3):
+    rng = np.random.default_rng(seed)
+    return [dict(zip(ml_model.FEATURE_COLS, map(float, row))) for row in rng.integers(1, 11, size=(n, len(ml_model.FEATURE_COLS)))]
+
+
+needs_model = pytest.mark.skipif(ml_model.get_model_version() is None, reason="no trained model artifact")
+
+
+def test_feature_array_rejects_wrong_shapes():
+    n = len(ml_model.FEATURE_COLS)
+    assert ml_model._prepare_feature_array(np.full((2, n), 12.0)).max() == 10.0
+    for bad in (np.ones(2 * n), np.ones((2, n - 1)), np.ones((2, n + 1)), np.ones((1, 2, n))):
+        with pytest.raises(ValueError):
+            ml_model._prepare_feature_array(bad)
+
+
+@needs_model
+def test_batch_matches_single_row_recommendations():
+    attrs = _attrs(25)
+    proba = ml_model.predict_position_proba_batch(attrs)
+    classes = ml_model.position_classes()
+    assert proba.shape == (25, len(classes))
+
+    for a, row in zip(attrs, proba):
+        top3 = ml_model.recommend_position_from_attributes(a)
+        assert [cls for cls, _ in top3] == [classes[i] for i in np.argsort(-row, kind="stable")[:3]]
+        np.testing.assert_allclose([p for _, p in top3], np.sort(row)[::-1][:3])
+
+
+@needs_model
+def test_empty_input():
+    assert ml_model.predict_position_proba_batch([]).shape == (0, len(ml_model.position_classes()))
+    assert ml_model.predict_position_proba_batch(np.empty((0, len(ml_model.FEATURE_COLS)))).shape[0] == 0
+    assert ml_model.predict_position_proba_all_batch([]) == []
+
+
+@needs_model
+def test_prediction_cache_counts_hits_and_clears_on_reload():
+    ml_model.clear_prediction_cache()
+    attrs = _attrs(5, seed=11)
+
+    first = ml_model.predict_position_proba_batch(attrs)
+    assert ml_model.prediction_cache_info()["misses"] == 5
+    assert ml_model.prediction_cache_info()["hits"] == 0
+
+    again = ml_model.predict_position_proba_batch(attrs[:3])
+    info = ml_model.prediction_cache_info()
+    assert (info["hits"], info["misses"], info["size"]) == (3, 5, 5)
+    np.testing.assert_array_equal(again, first[:3])
+
+    ml_model.reload_position_model()
+    info = ml_model.prediction_cache_info()
+    assert (info["hits"], info["misses"], info["size"]) == (0, 0, 0)
+
+
+def test_rows_without_a_model_are_not_cached(monkeypatch):
+    monkeypatch.setattr(ml_model, "MODEL_VERSION", "test-version")
+    monkeypatch.setattr(ml_model, "MODEL_CLASSES", ["CB", "CM", "ST"])
+    monkeypatch.setattr(ml_model, "position_table", None)
+    monkeypatch.setattr(ml_model, "get_position_model", lambda: None)
+    ml_model.clear_prediction_cache()
+    try:
+        proba = ml_model.predict_position_proba_batch(_attrs(4, seed=5))
+        assert proba.shape == (4, 3) and not proba.any()
+        assert ml_model.prediction_cache_info()["size"] == 0
+    finally:
+        ml_model.clear_prediction_cache()
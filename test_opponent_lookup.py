@@ -0,0 +1,198 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+import app as app_module
+from app import OpponentLookup, app, db, enqueue_opponent_lookup
+
+
+@pytest.fixture
+def resolver(monkeypatch):
+    """resolve_opponent without network: records the queries, answers like the FVRZ source."""
+    calls = []
+
+    def fake_resolve(q):
+        calls.append(q)
+        time.sleep(0.05)
+        return {"name": "FC Test 1", "rank": 3, "matches": 10, "goals_for": 20, "goals_against": 12,
+                "penalty_points": 4, "source": "matchcenter.fvrz.ch",
+                "table_cache": {"hit": True, "fetched_at": time.time() - 600}}
+
+    _drain_lookups()
+    monkeypatch.setattr(app_module, "resolve_opponent", fake_resolve)
+    app.config["TESTING"] = True
+    with app.app_context():
+        OpponentLookup.query.delete()
+        db.session.commit()
+    yield calls
+    _drain_lookups()  # no job of this test may run into the next one
+
+
+def _drain_lookups():
+    """Block until every lookup queued so far has finished: occupy all workers at once."""
+    n = app_module.OPPONENT_LOOKUP_WORKERS
+    barrier = threading.Barrier(n)
+    futures = [app_module._opponent_executor.submit(barrier.wait, 10) for _ in range(n)]
+    for f in futures:
+        f.result(15)
+
+
+def _wait(client, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get(f"/teamformation/spielidee/opponent/status/{job_id}").get_json()
+        if data["done"]:
+            return data
+        time.sleep(0.02)
+    raise AssertionError("job not finished")
+
+
+def _search(client, q):
+    r = client.post("/teamformation/spielidee/opponent/search", data={"opponent_query": q})
+    assert r.status_code == 302
+    return r.headers["Location"].split("job=")[1]
+
+
+def test_same_query_is_queued_once_and_reused_within_ttl(resolver):
+    client = app.test_client()
+    job_id = _search(client, "FC Test")
+    assert _search(client, "  fc test ") == job_id  # in flight: same job
+    assert _wait(client, job_id)["status"] == "done"
+    assert _search(client, "FC Test") == job_id  # done and fresh: reused
+    assert resolver == ["FC Test"]
+
+
+def test_queries_that_only_differ_in_symbols_are_separate_jobs(resolver):
+    client = app.test_client()
+    plus, plain = _search(client, "Senioren 30+"), _search(client, "Senioren 30")
+    assert plus != plain
+    _wait(client, plus)
+    _wait(client, plain)
+    assert sorted(resolver) == ["Senioren 30", "Senioren 30+"]
+
+
+def test_result_older_than_ttl_is_looked_up_again(resolver, monkeypatch):
+    client = app.test_client()
+    first = _search(client, "FC Test")
+    _wait(client, first)
+
+    monkeypatch.setattr(app_module, "OPPONENT_RESULT_TTL", 0)
+    second = _search(client, "FC Test")
+    assert second != first
+    _wait(client, second)
+    assert len(resolver) == 2
+
+
+def test_lost_job_counts_as_failed_and_is_replaced(resolver):
+    old = datetime.utcnow() - timedelta(seconds=app_module.OPPONENT_JOB_TIMEOUT + 5)
+    with app.app_context():
+        db.session.add(OpponentLookup(id="lost", team_query="FC Test", status="running", created_at=old,
+                                      query_norm=app_module.normalize_query("FC Test")))
+        db.session.commit()
+    client = app.test_client()
+
+    assert client.get("/teamformation/spielidee/opponent/status/lost").get_json()["status"] == "error"
+    r = client.get("/teamformation/spielidee/opponent/confirm?job=lost")
+    assert r.status_code == 302 and r.headers["Location"].endswith("/opponent/search")
+
+    with app.app_context():
+        job_id = enqueue_opponent_lookup("FC Test").id
+    assert job_id != "lost"
+    _wait(client, job_id)
+
+
+def test_jobs_past_ttl_are_pruned(resolver):
+    now = datetime.utcnow()
+    keep_for = max(app_module.OPPONENT_RESULT_TTL, app_module.OPPONENT_JOB_TIMEOUT)
+    with app.app_context():
+        for job_id, status, age in [
+            ("old-done", "done", keep_for + 60),
+            ("old-not-found", "not_found", keep_for + 60),
+            ("lost", "running", keep_for + 60),
+            ("fresh", "done", 60),
+        ]:
+            db.session.add(OpponentLookup(id=job_id, team_query="FC Test", query_norm="fc test", status=status,
+                                          created_at=now - timedelta(seconds=age)))
+        db.session.commit()
+
+        assert app_module.run_housekeeping()["opponent_lookups"] == 3
+        assert [j.id for j in OpponentLookup.query.all()] == ["fresh"]
+        assert enqueue_opponent_lookup("FC Test").id == "fresh"  # still reused
+        db.session.remove()
+
+
+def test_status_endpoint(resolver):
+    client = app.test_client()
+    assert client.get("/teamformation/spielidee/opponent/status/nope").status_code == 404
+
+    job_id = _search(client, "FC Test")
+    data = client.get(f"/teamformation/spielidee/opponent/status/{job_id}").get_json()
+    assert data["status"] in ("pending", "running") and data["done"] is False
+    data = _wait(client, job_id)
+    assert data["status"] == "done" and data["elapsed_seconds"] >= 0
+
+
+def test_table_age_is_computed_when_the_page_is_rendered(resolver, monkeypatch):
+    client = app.test_client()
+    job_id = _search(client, "FC Test")
+    _wait(client, job_id)
+
+    page = client.get(f"/teamformation/spielidee/opponent/confirm?job={job_id}").get_data(as_text=True)
+    assert "Stand vor 10 Min (aus dem Cache)" in page
+
+    # the same stored result, rendered half an hour later
+    now = time.time()
+    monkeypatch.setattr(app_module.time, "time", lambda: now + 1800)
+    page = client.get(f"/teamformation/spielidee/opponent/confirm?job={job_id}").get_data(as_text=True)
+    assert "Stand vor 40 Min (aus dem Cache)" in page
+
+
+def test_web_search_goes_through_the_shared_http_client(monkeypatch):
+    sent = []
+
+    class _Answer:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"output": [
+                {"type": "web_search_call", "status": "completed"},
+                {"type": "message", "content": [{"type": "output_text", "text": (
+                    '{"name": "FC Test 1", "league": "3. Liga", "rank": 2, "goals_for": 30,'
+                    ' "goals_against": 10, "matches": 12, "penalty_points": 0}'
+                )}]},
+            ]}
+
+    def fake_post(url, **kwargs):
+        sent.append((url, kwargs["json"]))
+        return _Answer()
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(app_module, "http_post", fake_post)
+    team = app_module._fetch_opponent_stats_with_web_search("FC Test")
+
+    assert sent[0][0] == app_module.OPENAI_RESPONSES_URL
+    assert sent[0][1]["tools"] == [{"type": "web_search"}]
+    assert (team["name"], team["rank"], team["goals_for"]) == ("FC Test 1", 2, 30)
+
+
+@pytest.mark.parametrize("content_type, charset", [
+    ("text/html; charset=ISO-8859-1", "iso-8859-1"),  # header wins
+    ("text/html", "utf-8"),  # no header charset: not requests' ISO-8859-1 default
+])
+def test_club_table_page_is_decoded_with_the_http_charset(monkeypatch, content_type, charset):
+    page = "<table><tr><td>1.</td><td>FC Dübendorf 2</td><td>12</td><td>5</td><td>4</td><td>3</td>" \
+           "<td>25:14</td><td>19</td></tr></table>"
+    response = requests.models.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = content_type
+    response._content = page.encode(charset)
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)  # as the adapter does
+    response.url = "https://www.fvrz.ch/test"
+    monkeypatch.setattr(app_module, "http_get", lambda url: response)
+
+    rows = app_module._fetch_club_table_rows(1)
+    assert [r.team for r in rows] == ["FC Dübendorf 2"]
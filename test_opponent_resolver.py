@@ -0,0 +1,74 @@
+import time
+
+from opponent_resolver import is_valid_team, resolve_first_good
+
+
+def _team(name):
+    return {"name": name, "rank": 1, "goals_for": 10, "goals_against": 4, "matches": 5}
+
+
+def _source(name, delay, result=True, fail=False):
+    def fn(query):
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("upstream down")
+        return _team(name) if result else None
+    return name, fn
+
+
+def test_preferred_source_wins_within_deadline():
+    t0 = time.perf_counter()
+    team, report = resolve_first_good(
+        [_source("fvrz", 0.2), _source("web_search", 0.05), _source("chatgpt", 0.01)],
+        "FC Test", preferred_deadline=1.0,
+    )
+    assert team["name"] == "fvrz"
+    assert report["winner"] == "fvrz"
+    assert time.perf_counter() - t0 < 0.5
+    assert report["sources"]["web_search"]["status"] == "ok"
+
+
+def test_sources_run_concurrently_not_one_after_another():
+    t0 = time.perf_counter()
+    team, report = resolve_first_good(
+        [_source("fvrz", 0.3, result=False), _source("web_search", 0.3), _source("chatgpt", 0.3)],
+        "FC Test", preferred_deadline=1.0,
+    )
+    assert report["winner"] == "web_search"
+    assert time.perf_counter() - t0 < 0.55
+
+
+def test_lower_priority_accepted_after_preferred_deadline():
+    t0 = time.perf_counter()
+    team, report = resolve_first_good(
+        [_source("fvrz", 2.0), _source("web_search", 0.05)],
+        "FC Test", preferred_deadline=0.2,
+    )
+    assert report["winner"] == "web_search"
+    assert 0.2 <= time.perf_counter() - t0 < 0.6
+    assert report["sources"]["fvrz"]["status"] in ("ignored", "cancelled")
+
+
+def test_errors_and_invalid_results_fall_through():
+    team, report = resolve_first_good(
+        [_source("fvrz", 0.01, fail=True), ("web_search", lambda q: {"name": "x", "rank": "?"}), _source("chatgpt", 0.02)],
+        "FC Test", preferred_deadline=1.0,
+    )
+    assert report["winner"] == "chatgpt"
+    assert report["sources"]["fvrz"]["status"] == "error"
+    assert report["sources"]["web_search"]["status"] == "empty"
+
+
+def test_no_result_and_overall_timeout():
+    team, report = resolve_first_good(
+        [_source("fvrz", 0.01, result=False), _source("chatgpt", 1.0)],
+        "FC Test", preferred_deadline=0.05, timeout=0.2,
+    )
+    assert team is None
+    assert report["winner"] is None
+
+
+def test_is_valid_team():
+    assert is_valid_team(_team("a"))
+    assert not is_valid_team(None)
+    assert not is_valid_team({"name": "a", "rank": 1})
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+import app as app_module
+from app import Coach, Player, app, backfill_player_probas, db
+from ml_model import get_model_version
+
+needs_model = pytest.mark.skipif(get_model_version() is None, reason="no trained model artifact")
+
+
+@pytest.fixture
+def coach():
+    app.config["TESTING"] = True
+    with app.app_context():
+        c = Coach(name="Test", email=f"coach{Coach.query.count()}@example.ch", password_hash="x")
+        db.session.add(c)
+        db.session.commit()
+        yield c
+        Player.query.filter_by(coach_id=c.id).delete()
+        db.session.delete(c)
+        db.session.commit()
+        db.session.remove()
+
+
+def _player(coach, i, version="old"):
+    p = Player(coach_id=coach.id, first_name=f"P{i}", last_name="Test", speed=1 + i % 10, finishing=10 - i % 10,
+               position_proba=json.dumps({"XX": 1.0}) if version else None, position_model_version=version)
+    db.session.add(p)
+    return p
+
+
+def _client(coach, **extra):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["coach_id"] = coach.id
+        s.update(extra)
+    return client
+
+
+def test_import_starts_no_background_threads():
+    assert app_module._background_checked is False
+    assert app_module._background_lock_file is None
+    assert app_module.email_outbox._thread is None
+
+
+@needs_model
+def test_saving_attributes_rewrites_stored_probas(coach):
+    p = _player(coach, 1)
+    db.session.commit()
+
+    r = _client(coach).post(f"/players/{p.id}/attributes", data={"speed": "9", "finishing": "9"})
+    assert r.status_code == 302
+
+    db.session.expire_all()
+    p = db.session.get(Player, p.id)
+    assert p.position_model_version == get_model_version()
+    assert "XX" not in p.position_proba_map
+    assert abs(sum(p.position_proba_map.values()) - 1.0) < 1e-6
+
+
+@needs_model
+def test_squad_page_recomputes_rows_of_an_old_model_version(coach):
+    players = [_player(coach, i) for i in range(11)]
+    current = _player(coach, 11, version=get_model_version())
+    db.session.commit()
+    ids = [p.id for p in players + [current]]
+
+    r = _client(coach, formation_selected_player_ids=ids, formation_selected_formation="4-3-3").get(
+        "/teamformation/kader/result"
+    )
+    assert r.status_code == 200
+
+    db.session.expire_all()
+    rows = Player.query.filter(Player.id.in_(ids)).all()
+    assert {p.position_model_version for p in rows} == {get_model_version()}
+    # the row that was already current is left alone
+    assert db.session.get(Player, current.id).position_proba_map == {"XX": 1.0}
+
+
+@needs_model
+def test_backfill_fills_every_row(coach):
+    for i in range(7):
+        _player(coach, i, version=None if i % 2 else "old")
+    db.session.commit()
+
+    assert backfill_player_probas(batch_size=3) >= 7
+
+    rows = Player.query.filter_by(coach_id=coach.id).all()
+    assert all(p.position_proba and p.position_model_version == get_model_version() for p in rows)
+    assert backfill_player_probas() == 0
+
+
+@needs_model
+def test_backfill_cli_command(coach):
+    _player(coach, 1, version=None)
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=["backfill-positions"])
+    assert result.exit_code == 0
+    assert "players updated" in result.output
@@ -0,0 +1,91 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from prepare_data import INVALID_POSITIONS, POSITION_NORMALIZATION, attribute_cols, clean_formation_attributes
+
+
+def _baseline_clean(df: pd.DataFrame) -> pd.DataFrame:
+    """The original row-by-row prepare_data script, as reference."""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = (df[col].astype(str).str.replace("\r", " ", regex=False)
+                       .str.replace("\n", " ", regex=False).str.strip())
+    df["Position"] = df["Position"].astype(str).str.strip().str.upper()
+    df["Also possible Positions"] = df["Also possible Positions"].astype(str).str.strip().str.upper()
+
+    def derive_position(row):
+        pos = row["Position"]
+        if pos in {"SUB", "RES"}:
+            for t in re.split(r"[,\s/]+", row["Also possible Positions"]):
+                t = t.strip().upper()
+                if t and t not in {"SUB", "RES"}:
+                    return t
+        return pos
+
+    df["Position"] = df.apply(derive_position, axis=1)
+    df = df[~df["Position"].isin(INVALID_POSITIONS)]
+    df["Position"] = df["Position"].replace(POSITION_NORMALIZATION)
+    df = df[df["Position"] != "GK"]
+    for col in attribute_cols:
+        df[col] = df[col].astype(str).str.extract(r"(\d+)", expand=False).astype(float)
+    for col in attribute_cols:
+        if df[col].isna().any():
+            df[col] = df[col].fillna(df[col].median())
+    df = df.dropna(subset=["Position"])
+    for col in attribute_cols:
+        df[col] = df[col].clip(lower=0, upper=99)
+    return df
+
+
+ROWS = [
+    # Name, Position, Also possible Positions, first attribute ("Sprint speed")
+    ("Plain", "ST", "", "78"),
+    ("Text", " lcb\n", "CB", "81 Sprint speed"),
+    ("Sub", "SUB", "SUB, LM / CM", "\r\n65"),
+    ("Res", "res", "RES/RWB", "70 (+2)"),
+    ("Sub only", "SUB", "RES SUB", "60"),
+    ("Sub empty", "SUB", np.nan, "60"),
+    ("Keeper", "GK", "", "50"),
+    ("Missing", "CF", "ST", np.nan),
+    ("Word", "RDM", "", "n/a"),
+    ("Big", "RAM", "", "120"),
+]
+
+
+def _fixture() -> pd.DataFrame:
+    rows = []
+    for i, (name, pos, also, first) in enumerate(ROWS):
+        row = {"Name": name, "Position": pos, "Also possible Positions": also, "Club": f" Club\n{i} "}
+        row.update({col: f"{40 + i + j} {col}" for j, col in enumerate(attribute_cols)})
+        row[attribute_cols[0]] = first
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def test_matches_the_baseline_script():
+    pdt.assert_frame_equal(clean_formation_attributes(_fixture()), _baseline_clean(_fixture()))
+
+
+def test_sub_res_fallback_and_numeric_extraction():
+    timings = {}
+    df = clean_formation_attributes(_fixture(), timings).set_index("Name")
+
+    assert set(timings) == {"strings", "positions", "filter", "numbers", "fill_clip"}
+    # SUB/RES take the first real position from "Also possible Positions", then normalized
+    assert df.loc["Sub", "Position"] == "LW"
+    assert df.loc["Res", "Position"] == "RB"
+    assert df.loc["Text", "Position"] == "CB"
+    # no usable fallback and keepers are dropped
+    assert not {"Sub only", "Sub empty", "Keeper"} & set(df.index)
+
+    speed = df["Sprint speed"]
+    assert speed["Plain"] == 78 and speed["Text"] == 81 and speed["Sub"] == 65 and speed["Res"] == 70
+    assert speed["Big"] == 99  # clipped
+    assert speed["Missing"] == speed["Word"] == speed.drop(["Missing", "Word"]).median()
+    assert df.loc["Text", "Tackling"] == 41 + 12
+    assert df.loc["Text", "Club"] == "Club 1"
+    assert all(df[col].dtype == float for col in attribute_cols)
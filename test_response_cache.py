@@ -0,0 +1,118 @@
+import threading
+import time
+
+from response_cache import ResponseCache
+
+
+def _cache(tmp_path, ttl=60):
+    return ResponseCache(path=str(tmp_path / "openai_cache.db"), ttl=ttl)
+
+
+def test_hit_after_first_call_and_query_normalization(tmp_path):
+    cache = _cache(tmp_path)
+    calls = []
+
+    def compute(q):
+        calls.append(q)
+        return {"name": q, "rank": 3}
+
+    assert cache.get_or_compute("gpt-4o-mini", "v1", "FC Wetzikon", compute) == {"name": "FC Wetzikon", "rank": 3}
+    assert cache.get_or_compute("gpt-4o-mini", "v1", "  fc   wetzikon ", compute) == {"name": "FC Wetzikon", "rank": 3}
+    assert calls == ["FC Wetzikon"]
+    assert cache.info()["hits"] == 1
+
+
+def test_symbols_in_the_query_are_part_of_the_key(tmp_path):
+    cache = _cache(tmp_path)
+    calls = []
+
+    def compute(q):
+        calls.append(q)
+        return {"name": q}
+
+    assert cache.get_or_compute("gpt-4o-mini", "v1", "Senioren 30+", compute) == {"name": "Senioren 30+"}
+    assert cache.get_or_compute("gpt-4o-mini", "v1", "Senioren 30", compute) == {"name": "Senioren 30"}
+    assert cache.get_or_compute("gpt-4o-mini", "v1", "FC Zürich", compute) != cache.get_or_compute(
+        "gpt-4o-mini", "v1", "Zürich", compute)
+    assert len(calls) == 4
+
+
+def test_model_and_prompt_version_are_part_of_the_key(tmp_path):
+    cache = _cache(tmp_path)
+    calls = []
+
+    def compute(q):
+        calls.append(q)
+        return {"n": len(calls)}
+
+    cache.get_or_compute("gpt-4o-mini", "v1", "FC Uster", compute)
+    cache.get_or_compute("gpt-4o", "v1", "FC Uster", compute)
+    cache.get_or_compute("gpt-4o-mini", "v2", "FC Uster", compute)
+    assert len(calls) == 3
+
+
+def test_ttl_and_persistence(tmp_path):
+    cache = _cache(tmp_path, ttl=1)
+    cache.get_or_compute("m", "v1", "FC Uster", lambda q: {"rank": 1})
+
+    # new instance (e.g. after restart) reads the same SQLite file
+    again = _cache(tmp_path, ttl=1)
+    assert again.get_or_compute("m", "v1", "FC Uster", lambda q: {"rank": 2}) == {"rank": 1}
+
+    time.sleep(1.1)
+    assert again.get_or_compute("m", "v1", "FC Uster", lambda q: {"rank": 2}) == {"rank": 2}
+
+
+def test_none_is_not_cached(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.get_or_compute("m", "v1", "unbekannt", lambda q: None) is None
+    assert cache.get_or_compute("m", "v1", "unbekannt", lambda q: {"rank": 5}) == {"rank": 5}
+
+
+def test_concurrent_identical_queries_share_one_call(tmp_path):
+    cache = _cache(tmp_path)
+    calls = []
+    results = []
+
+    def compute(q):
+        calls.append(q)
+        time.sleep(0.3)
+        return {"name": q}
+
+    def worker():
+        results.append(cache.get_or_compute("m", "v1", "FC Hinwil", compute))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"name": "FC Hinwil"}] * 8
+    # every caller gets its own dict
+    assert len({id(r) for r in results}) == 8
+    assert cache.info()["coalesced"] == 7
+
+
+def test_leader_rechecks_the_cache_before_computing(tmp_path):
+    cache = _cache(tmp_path)
+    key = cache.make_key("m", "v1", "FC Wald")
+    real_get = cache.get
+    seen = []
+
+    def racing_get(k):
+        # first check misses; another leader finishes before this caller takes the in-flight slot
+        if not seen:
+            seen.append(k)
+            cache.put(key, "m", "v1", "FC Wald", {"rank": 4})
+            return None
+        return real_get(k)
+
+    cache.get = racing_get
+    calls = []
+    assert cache.get_or_compute("m", "v1", "FC Wald", lambda q: calls.append(q) or {"rank": 9}) == {"rank": 4}
+    assert calls == []
+    assert cache.info()["hits"] == 1
+    assert cache.info()["misses"] == 0
+    assert cache.info()["in_flight"] == 0
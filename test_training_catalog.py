@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bench_training_catalog as bench
+from training_catalog import TrainingCatalog
+
+TRAINING_ROWS = [
+    # Players Age, Training Focus, Physically Challenge, Trainingstime, Number of Players, Part
+    ("U10", "Passen", "Medium", "90 min", 12, 3),
+    ("U10", "Passen", "Medium", "90 min", 12, 1),
+    ("U10", "Passen", "Medium", "90 min", 12, 2),
+    ("U10", "Passen", "Light ", "90 min", 12, 1),
+    ("U10", "Passen", "Medium", "60 Minuten", 12, 1),
+    ("U10", "Passen", "Medium", "90 min", 14, 1),
+    (" U12 ", "Abschluss", "Heavy", "75", 14, 2),
+    ("U12", "Abschluss", "heavy", "75", 14, np.nan),
+    ("U12", "Abschluss", "Heavy", "75", 14, 1),
+]
+
+
+def _write_sheet(path, rows=TRAINING_ROWS, tag=""):
+    df = pd.DataFrame(rows, columns=["Players Age", "Training Focus", "Physically Challenge", "Trainingstime",
+                                     "Number of Players", "Part"])
+    df["Equipment"] = [f"Bälle {i}{tag}" for i in range(len(df))]
+    df["Setup"] = "Feld 20x30"
+    df["Instructions"] = [f"Übung {i}" for i in range(len(df))]
+    df["Variations"] = np.nan
+    df["Coaching Points"] = "Kopf hoch"
+    df.to_excel(path, index=False)
+
+
+@pytest.fixture
+def sheet(tmp_path, monkeypatch):
+    path = str(tmp_path / "trainings.xlsx")
+    _write_sheet(path)
+    monkeypatch.setattr(bench, "TRAININGS_EXCEL_PATH", path)  # the old per-request lookup reads this
+    return path
+
+
+QUERIES = [
+    ("U10", "Passen", 90, 12, "medium"),
+    ("U10", "Passen", "90", "12", " MEDIUM "),
+    ("U10", "Passen", 90, 12, "light"),
+    ("U12", "Abschluss", 75, 14, "Heavy"),
+    ("U10", "Passen", 90, 13, "medium"),
+    ("U10", "Passen", None, 12, "medium"),
+    ("U10", None, 90, None, None),
+    (None, None, None, None, None),
+    ("U10", "Passen", "neunzig", 12, "medium"),
+    ("U14", "Passen", 90, 12, "medium"),
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_same_result_as_the_old_per_request_lookup(sheet, query):
+    assert bench._same(TrainingCatalog(sheet).find(*query), bench.find_training_from_excel_pandas(*query))
+
+
+def test_full_query_is_sorted_by_part(sheet):
+    parts = TrainingCatalog(sheet).find("U10", "Passen", 90, 12, "Medium")
+    assert [p["part"] for p in parts] == [1, 2, 3]
+    assert [p["equipment"] for p in parts] == ["Bälle 1", "Bälle 2", "Bälle 0"]
+    assert parts[0]["physically_challenge"] == "medium"
+
+
+def test_partial_query_merges_groups_and_sorts_once(sheet):
+    catalog = TrainingCatalog(sheet)
+    # no duration / physical: the 90- and 60-minute sessions and the light one
+    parts = catalog.find("U10", "Passen", None, 12, None)
+    assert [p["part"] for p in parts] == [1, 1, 1, 2, 3]
+    # U12 with a missing Part: NaN sorts last
+    parts = catalog.find("U12", "Abschluss", 75, 14, None)
+    assert [p["part"] for p in parts][:2] == [1, 2] and pd.isna(parts[2]["part"])
+
+
+def test_players_and_minutes_match_as_numbers(sheet):
+    catalog = TrainingCatalog(sheet)
+    assert len(catalog.find("U10", "Passen", "90", "14", "medium")) == 1
+    assert len(catalog.find("U10", "Passen", 60, 12, "medium")) == 1  # "60 Minuten"
+    assert catalog.find("U10", "Passen", 90, 15, "medium") == []
+
+
+def test_results_are_copies(sheet):
+    catalog = TrainingCatalog(sheet)
+    catalog.find("U10", "Passen", 90, 12, "medium")[0]["part"] = "changed"
+    assert catalog.find("U10", "Passen", 90, 12, "medium")[0]["part"] == 1
+
+
+def test_reload_after_the_file_changes(sheet):
+    catalog = TrainingCatalog(sheet)
+    assert catalog.find("U10", "Passen", 90, 12, "light")[0]["equipment"] == "Bälle 3"
+    index = catalog.get()
+    assert catalog.get() is index  # unchanged file: no rebuild
+
+    _write_sheet(sheet, TRAINING_ROWS[:4], tag=" neu")
+    st = os.stat(sheet)
+    os.utime(sheet, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert catalog.find("U10", "Passen", 90, 12, "light")[0]["equipment"] == "Bälle 3 neu"
+    assert catalog.find("U12", "Abschluss", 75, 14, "heavy") == []
+
+
+def test_missing_file(tmp_path):
+    assert TrainingCatalog(str(tmp_path / "missing.xlsx")).find("U10", "Passen", 90, 12, "medium") == []
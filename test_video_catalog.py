@@ -0,0 +1,131 @@
+import os
+import re
+
+import pandas as pd
+import pytest
+
+from training_catalog import VIDEO_PHASES, VideoCatalog, _players_match, drive_to_embed_url
+
+
+def _old_find_training_videos(path, age_group, focus, intensity, players_count):
+    """The per-request lookup app.py had before the catalog, as reference."""
+    df = pd.read_excel(path)
+    drive_col = "Google Drive Links "
+    if drive_col not in df.columns and "Google Drive Links" in df.columns:
+        drive_col = "Google Drive Links"
+
+    def clean(x):
+        s = "" if x is None else str(x).strip()
+        return "" if s.lower() == "nan" else s
+
+    for c in ["Spieleralter", "Trainingsschwerpunkt", "Intensität", "Trainingsphase", "Spieleranzahl"]:
+        df[c] = df[c].apply(clean)
+    df[drive_col] = df[drive_col].apply(clean)
+
+    out = {"Aufwärmen": [], "Hauptteil 1": [], "Hauptteil 2": []}
+    try:
+        players_count = int(players_count)
+    except Exception:
+        return out
+
+    df = df[(df["Spieleralter"] == clean(age_group)) & (df["Trainingsschwerpunkt"] == clean(focus))
+            & (df["Intensität"] == clean(intensity)) & (df[drive_col] != "")]
+    for phase in out:
+        phase_df = df[df["Trainingsphase"] == phase]
+        phase_df = phase_df[phase_df["Spieleranzahl"].apply(lambda v: _players_match(v, players_count))]
+        if phase_df.empty:
+            continue
+        drive_link = phase_df.iloc[0][drive_col]
+        m = re.search(r"/file/d/([^/]+)/", drive_link)
+        file_id = m.group(1) if m else None
+        out[phase] = [{
+            "embed_url": drive_to_embed_url(drive_link),
+            "thumbnail_url": f"https://drive.google.com/thumbnail?id={file_id}&sz=w1000" if file_id else "",
+        }]
+    return out
+
+
+VIDEO_ROWS = [
+    # Spieleralter, Trainingsschwerpunkt, Intensität, Trainingsphase, Spieleranzahl, Google Drive Links
+    ("U10", "Passen", "Mittel", "Aufwärmen", "8 to 18", "https://drive.google.com/file/d/AAA/view?usp=sharing"),
+    ("U10", "Passen", "Mittel", "Aufwärmen", "6-10", "https://drive.google.com/file/d/BBB/preview"),
+    ("U10", "Passen", "Mittel", "Hauptteil 1", "10 – 14", "https://drive.google.com/open?id=CCC"),
+    ("U10", "Passen", "Mittel", "Hauptteil 1", 12, "https://drive.google.com/uc?id=DDD&export=download"),
+    ("U10", "Passen", "Mittel", "Hauptteil 2", "12", "https://drive.google.com/d/EEE"),
+    ("U10", "Passen", "Mittel", "Hauptteil 2", "8 to 18", None),
+    (" U10 ", "Passen ", "Mittel", "Hauptteil 2", "ab 16 Spieler", "https://drive.google.com/file/d/FFF/view"),
+    ("U10", "Passen", "Hoch", "Aufwärmen", "8 to 18", "https://drive.google.com/file/d/GGG/view"),
+    ("U12", "Abschluss", "Mittel", "Aufwärmen", None, "https://drive.google.com/file/d/HHH/view"),
+    ("U12", "Abschluss", "Mittel", "Hauptteil 1", "viele", "https://drive.google.com/file/d/III/view"),
+]
+
+
+def _write_sheet(path, rows=VIDEO_ROWS, drive_col="Google Drive Links "):
+    pd.DataFrame(rows, columns=["Spieleralter", "Trainingsschwerpunkt", "Intensität", "Trainingsphase",
+                                "Spieleranzahl", drive_col]).to_excel(path, index=False)
+
+
+@pytest.fixture
+def sheet(tmp_path):
+    path = str(tmp_path / "trainings_videos.xlsx")
+    _write_sheet(path)
+    return path
+
+
+QUERIES = [
+    ("U10", "Passen", "Mittel", n) for n in (6, 8, 10, 12, 14, 16, 18, 19, "12", "zwölf")
+] + [
+    ("U10", "Passen", "Hoch", 12),
+    (" U10", "Passen ", " Mittel ", "16"),
+    ("U12", "Abschluss", "Mittel", 10),
+    ("U14", "Passen", "Mittel", 12),
+    (None, None, None, 12),
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_same_result_as_the_old_per_request_lookup(sheet, query):
+    assert VideoCatalog(sheet).find(*query) == _old_find_training_videos(sheet, *query)
+
+
+def test_drive_link_variants(sheet):
+    catalog = VideoCatalog(sheet)
+    videos = catalog.find("U10", "Passen", "Mittel", 12)
+    assert videos["Aufwärmen"] == [{"embed_url": "https://drive.google.com/file/d/AAA/preview",
+                                    "thumbnail_url": "https://drive.google.com/thumbnail?id=AAA&sz=w1000"}]
+    # open?id= / uc?id=: embeddable, but no thumbnail (only /file/d/ links carry one)
+    assert videos["Hauptteil 1"] == [{"embed_url": "https://drive.google.com/file/d/CCC/preview", "thumbnail_url": ""}]
+    # unknown format: the link itself
+    assert videos["Hauptteil 2"] == [{"embed_url": "https://drive.google.com/d/EEE", "thumbnail_url": ""}]
+
+    # first matching row in Excel order wins; rows without link are skipped
+    assert catalog.find("U10", "Passen", "Mittel", 8)["Aufwärmen"][0]["embed_url"].endswith("/AAA/preview")
+    assert catalog.find("U10", "Passen", "Mittel", 6)["Aufwärmen"][0]["embed_url"].endswith("/BBB/preview")
+    assert catalog.find("U10", "Passen", "Mittel", 17)["Hauptteil 2"] == []
+    assert catalog.find("U10", "Passen", "Mittel", "zwölf") == {phase: [] for phase in VIDEO_PHASES}
+
+
+def test_drive_column_without_trailing_space(tmp_path):
+    path = str(tmp_path / "videos.xlsx")
+    _write_sheet(path, drive_col="Google Drive Links")
+    assert VideoCatalog(path).find("U10", "Passen", "Hoch", 12)["Aufwärmen"][0]["embed_url"].endswith("/GGG/preview")
+
+
+def test_mtime_change_rebuilds_the_index(sheet):
+    catalog = VideoCatalog(sheet)
+    assert catalog.find("U10", "Passen", "Hoch", 12)["Aufwärmen"][0]["embed_url"].endswith("/GGG/preview")
+    index = catalog.get()
+    assert catalog.get() is index
+
+    rows = [r[:5] + ("https://drive.google.com/file/d/NEW/view",) if r[2] == "Hoch" else r for r in VIDEO_ROWS]
+    _write_sheet(sheet, rows)
+    st = os.stat(sheet)
+    os.utime(sheet, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert catalog.find("U10", "Passen", "Hoch", 12)["Aufwärmen"][0]["embed_url"].endswith("/NEW/preview")
+    assert catalog.get() is not index
+
+
+def test_missing_file(tmp_path):
+    assert VideoCatalog(str(tmp_path / "missing.xlsx")).find("U10", "Passen", "Mittel", 12) == {
+        phase: [] for phase in VIDEO_PHASES
+    }
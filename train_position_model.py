@@ -5,10 +5,12 @@ from sklearn.metrics import classification_report
 from sklearn.pipeline import Pipeline
 import joblib
 
+from data_sources import read_table
+
 # -----------------------------------
 # 1. Daten laden
 # -----------------------------------
-df = pd.read_excel("formation_attributes_numeric.xlsx")
+df = read_table("formation_attributes_numeric.xlsx")
 
 # 2. Positions-Mapping
 position_map = {
@@ -0,0 +1,360 @@
+import os
+import re
+import threading
+import urllib.parse
+from typing import Optional
+
+import pandas as pd
+
+from data_sources import read_table
+
+TRAININGS_EXCEL_PATH = "trainings.xlsx"
+VIDEO_EXCEL_PATH = "trainings_videos.xlsx"
+
+VIDEO_PHASES = ("Aufwärmen", "Hauptteil 1", "Hauptteil 2")
+
+
+def _parse_players_range(value):
+    """
+    Supports:
+    - int / float (e.g. 12)
+    - strings like "8 to 18", "12  to 18", "8-18"
+    Returns (min_players, max_players) or (None, None) if unknown.
+    """
+    if value is None:
+        return (None, None)
+
+    # numeric cell
+    try:
+        if isinstance(value, (int, float)) and not pd.isna(value):
+            n = int(value)
+            return (n, n)
+    except Exception:
+        pass
+
+    s = str(value).strip().lower()
+    if not s or s == "nan":
+        return (None, None)
+
+    # normalize separators
+    s = s.replace("–", "-").replace("—", "-")
+    s = re.sub(r"\s+", " ", s)
+
+    # "8 to 18" / "8 - 18"
+    m = re.search(r"(\d+)\s*(to|-)\s*(\d+)", s)
+    if m:
+        return (int(m.group(1)), int(m.group(3)))
+
+    # single number in string
+    m2 = re.search(r"(\d+)", s)
+    if m2:
+        n = int(m2.group(1))
+        return (n, n)
+
+    return (None, None)
+
+
+def _players_match(row_players_value, selected_players_count: int) -> bool:
+    lo, hi = _parse_players_range(row_players_value)
+    if lo is None or hi is None:
+        return False
+    return lo <= selected_players_count <= hi
+
+
+def _drive_file_id(drive_link: str) -> Optional[str]:
+    if not drive_link:
+        return None
+
+    link = str(drive_link).strip()
+
+    # covers:
+    # /file/d/<ID>/view
+    # /file/d/<ID>/preview
+    m = re.search(r"/file/d/([^/]+)/", link)
+    if m:
+        return m.group(1)
+
+    # covers:
+    # .../d/<ID>/... (some shared formats)
+    m = re.search(r"/d/([^/]+)", link)
+    if m:
+        return m.group(1)
+
+    # covers:
+    # open?id=<ID>
+    # uc?id=<ID>
+    try:
+        parsed = urllib.parse.urlparse(link)
+        qs = urllib.parse.parse_qs(parsed.query)
+        if "id" in qs and qs["id"]:
+            return qs["id"][0]
+    except Exception:
+        pass
+
+    return None
+
+
+def drive_to_embed_url(drive_link: str) -> str:
+    """
+    Convert various Google Drive link formats into an embeddable preview URL.
+    Works for:
+      - https://drive.google.com/file/d/<ID>/view?...
+      - https://drive.google.com/open?id=<ID>
+      - https://drive.google.com/uc?id=<ID>&export=download
+    Returns: https://drive.google.com/file/d/<ID>/preview
+    """
+    if not drive_link:
+        return ""
+
+    link = str(drive_link).strip()
+
+    # file/d/<id>/...
+    m = re.search(r"/file/d/([^/]+)/", link)
+    if m:
+        file_id = m.group(1)
+        return f"https://drive.google.com/file/d/{file_id}/preview"
+
+    # ?id=<id>
+    try:
+        parsed = urllib.parse.urlparse(link)
+        qs = urllib.parse.parse_qs(parsed.query)
+        if "id" in qs and qs["id"]:
+            file_id = qs["id"][0]
+            return f"https://drive.google.com/file/d/{file_id}/preview"
+    except Exception:
+        pass
+
+    # fallback: return original (might still work)
+    return link
+
+
+class _ExcelCatalog:
+    """
+    Excel sheet parsed and indexed once per process.
+    Every lookup does a cheap os.stat(); the index is rebuilt when the file's mtime changes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _build(self, df: pd.DataFrame):
+        raise NotImplementedError
+
+    def _read(self) -> pd.DataFrame:
+        return read_table(self.path)
+
+    def get(self):
+        """Current index, or None if the file does not exist."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._index = self._build(self._read())
+                    self._mtime = mtime
+                    print(f"📚 Catalog loaded: {self.path}")
+        return self._index
+
+
+def _clean_cell(x) -> str:
+    s = "" if x is None else str(x).strip()
+    return "" if s.lower() == "nan" else s
+
+
+class VideoCatalog(_ExcelCatalog):
+    """
+    trainings_videos.xlsx indexed by (Spieleralter, Trainingsschwerpunkt, Intensität, Trainingsphase).
+    Each entry keeps Excel row order and carries pre-parsed player bounds and ready-made URLs.
+    """
+
+    def _build(self, df: pd.DataFrame) -> dict:
+        drive_col = "Google Drive Links "
+        if drive_col not in df.columns and "Google Drive Links" in df.columns:
+            drive_col = "Google Drive Links"
+
+        index = {}
+        for age, focus, intensity, phase, players, drive_link in zip(
+            df["Spieleralter"].map(_clean_cell),
+            df["Trainingsschwerpunkt"].map(_clean_cell),
+            df["Intensität"].map(_clean_cell),
+            df["Trainingsphase"].map(_clean_cell),
+            df["Spieleranzahl"].map(_clean_cell),
+            df[drive_col].map(_clean_cell),
+        ):
+            if not drive_link:
+                continue
+
+            lo, hi = _parse_players_range(players)
+            if lo is None or hi is None:
+                continue
+
+            m = re.search(r"/file/d/([^/]+)/", drive_link)
+            file_id = m.group(1) if m else None
+
+            index.setdefault((age, focus, intensity, phase), []).append((
+                lo,
+                hi,
+                drive_to_embed_url(drive_link),
+                f"https://drive.google.com/thumbnail?id={file_id}&sz=w1000" if file_id else "",
+            ))
+        return index
+
+    def find(self, age_group, focus, intensity, players_count) -> dict:
+        out = {phase: [] for phase in VIDEO_PHASES}
+
+        index = self.get()
+        if index is None:
+            return out
+
+        try:
+            players_count = int(players_count)
+        except Exception:
+            return out
+
+        key = (_clean_cell(age_group), _clean_cell(focus), _clean_cell(intensity))
+        for phase in VIDEO_PHASES:
+            # deterministic: always the first matching row in Excel for that phase
+            for lo, hi, embed_url, thumbnail_url in index.get(key + (phase,), ()):
+                if lo <= players_count <= hi:
+                    out[phase] = [{"embed_url": embed_url, "thumbnail_url": thumbnail_url}]
+                    break
+        return out
+
+
+def _optional_int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _sort_positions_by_part(positions, part_num) -> list:
+    """Same order as DataFrame.sort_values("Part_num") on those rows (quicksort, NaN last)."""
+    order = pd.Series([part_num[i] for i in positions]).sort_values().index
+    return [positions[i] for i in order]
+
+
+class TrainingCatalog(_ExcelCatalog):
+    """
+    trainings.xlsx preprocessed once: strings stripped, minutes extracted from
+    Trainingstime, player counts coerced, each row materialized as a training-part dict.
+    Rows are grouped by (age group, focus, physical, minutes, players), every group
+    already sorted by Part. Lookups with all five values are a single dict hit.
+    """
+
+    def _build(self, df: pd.DataFrame) -> dict:
+        age = df["Players Age"].astype(str).str.strip()
+        focus = df["Training Focus"].astype(str).str.strip()
+
+        has_physical = "Physically Challenge" in df.columns
+        if has_physical:
+            physical = df["Physically Challenge"].astype(str).str.strip().str.lower()
+        else:
+            physical = pd.Series(None, index=df.index, dtype=object)
+
+        if "Part" in df.columns:
+            part_num = pd.to_numeric(df["Part"], errors="coerce")
+        else:
+            part_num = pd.Series(0, index=df.index)
+
+        if "Trainingstime" in df.columns:
+            minutes = pd.to_numeric(df["Trainingstime"].astype(str).str.extract(r"(\d+)")[0], errors="coerce")
+        else:
+            minutes = pd.Series(float("nan"), index=df.index)
+
+        if "Number of Players" in df.columns:
+            players = pd.to_numeric(df["Number of Players"], errors="coerce")
+        else:
+            players = pd.Series(float("nan"), index=df.index)
+
+        def key_num(v):
+            return None if pd.isna(v) else float(v)
+
+        rows = []
+        for _, row in df.iterrows():
+            rows.append({
+                "part": row.get("Part", ""),
+                "physically_challenge": row.get("Physically Challenge", ""),
+                "equipment": row.get("Equipment", ""),
+                "setup": row.get("Setup", ""),
+                "instructions": row.get("Instructions", ""),
+                "variations": row.get("Variations", ""),
+                "coaching_points": row.get("Coaching Points", ""),
+            })
+        if has_physical:
+            # the old code lower-cased the column before reading it into the result
+            for r, p in zip(rows, physical):
+                r["physically_challenge"] = p
+
+        keys = list(zip(age, focus, physical, map(key_num, minutes), map(key_num, players)))
+        part_num = part_num.tolist()
+
+        positions_by_key = {}
+        for i, key in enumerate(keys):
+            positions_by_key.setdefault(key, []).append(i)
+
+        groups = {
+            key: tuple(rows[i] for i in _sort_positions_by_part(positions, part_num))
+            for key, positions in positions_by_key.items()
+        }
+        return {
+            "rows": rows,
+            "part_num": part_num,
+            "positions_by_key": positions_by_key,
+            "groups": groups,
+            "has_physical": has_physical,
+        }
+
+    def find(self, age_group, focus, duration, players_count, physical) -> list:
+        index = self.get()
+        if index is None:
+            return []
+
+        age_group_str = str(age_group).strip() if age_group else None
+        focus_str = str(focus).strip() if focus else None
+        physical_str = str(physical).strip().lower() if physical else None
+        if not index["has_physical"]:
+            physical_str = None
+        duration_int = _optional_int(duration)
+        players_int = _optional_int(players_count)
+
+        query = (
+            age_group_str,
+            focus_str,
+            physical_str,
+            float(duration_int) if duration_int is not None else None,
+            float(players_int) if players_int is not None else None,
+        )
+
+        if all(q is not None for q in query):
+            parts = index["groups"].get(query, ())
+        else:
+            # partial query (some filters not set): merge the matching groups, then sort once
+            positions = sorted(
+                i
+                for key, key_positions in index["positions_by_key"].items()
+                if all(q is None or q == k for q, k in zip(query, key))
+                for i in key_positions
+            )
+            rows = index["rows"]
+            parts = [rows[i] for i in _sort_positions_by_part(positions, index["part_num"])]
+
+        return [dict(p) for p in parts]
+
+
+video_catalog = VideoCatalog(VIDEO_EXCEL_PATH)
+training_catalog = TrainingCatalog(TRAININGS_EXCEL_PATH)
+
+
+def find_training_videos_from_excel(age_group, focus, intensity, players_count):
+    return video_catalog.find(age_group, focus, intensity, players_count)
+
+
+def find_training_from_excel(age_group, focus, duration, players_count, physical):
+    return training_catalog.find(age_group, focus, duration, players_count, physical)